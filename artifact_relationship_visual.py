@@ -1,36 +1,168 @@
+import json
+import multiprocessing
+import os
 import textwrap
+import threading
+import time
 import tkinter as tk
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import parse_qs
 
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
+from flask import Response, jsonify, request
 import plotly.graph_objects as go
-from data_processing import load_data, process_data, find_processes_with_no_destination, find_artifacts_with_no_source
+import plotly.io as pio
+from data_processing import load_and_process, write_analysis_report
+from figure_serialization import compact_figure, install_response_compression, mark_figure_ready, payload_stats, use_fast_json_engine
+from level_of_detail import (DETAIL_ARTIFACT, DETAIL_PRACTICE, PracticeBundles, aggregate_practice_bundles, choose_detail_level,
+                             create_bundle_elements, has_x_range_change, visible_x_range)
+from viewport import ViewportIndex
+from figure_cache import FigureCache, FigureKey, figure_cache_key, warm_figure_cache, warm_set_keys
+from model_registry import ModelProxy, ModelRegistry, active_model, find_workbooks
+from model_snapshot import load_or_build_model
+from stage_metrics import LATENCY_BUCKETS, Histogram, StageMetrics, render_counters
+from profiling import RequestProfiler
+from render_cache import RenderCache, cache_key, model_fingerprint, source_fingerprint
+from query_api import (QueryError, build_query_index, list_practices, paginate, parse_direction, parse_page, practice_neighbors,
+                       practice_relationships, process_neighbors, subgraph)
+from request_generations import RequestGenerations, StaleRequest, abandon_if_superseded, debounce
+from relationship_index import build_relationship_index
+from export_queue import JOB_DONE, JOB_FAILED, JOB_PENDING, ExportQueue
+from export_service import EXPORT_FORMATS
+from settings import (CLIENTSIDE_FILTERING, FIGURE_CACHE_WARM_SET, FIGURE_CACHE_MAX_MB, FIGURE_CACHE_WORKERS,
+                      FIGURE_PRECISION, GZIP_MIN_BYTES, GZIP_LEVEL, REPORT_PAYLOAD_METRICS,
+                      LOD_ELEMENT_BUDGET, LOD_MAX_BUNDLES, VIEWPORT_MARGIN, VIEWPORT_LAYOUT_CACHE_SIZE,
+                      EXPORT_WORKERS, EXPORT_QUEUE_SIZE, EXPORT_RESULT_TTL, EXPORT_DIR, MODEL_DIR, MODEL_CACHE_MB, MODEL_SNAPSHOT_DIR, METRICS_JSON_LOG,
+                      PROFILE_DIR, PROFILE_SAMPLE_MS, PROFILE_MIN_MS, GRAPH_DEBOUNCE_MS,
+                      RENDER_CACHE_PATH, RENDER_CACHE_MB)
 
 BOX_HEIGHT = 100
 PRACTICE_Y_TOP = 0.9
 PROCESS_Y_TOP = 0.65
 PROCESS_Y_BOTTOM = 0.2
 PRACTICE_Y_BOTTOM = 0.05
-# Initialize Dash application
-app = dash.Dash(__name__)
+# Initial x-range of the unfiltered full view
+DEFAULT_FULL_VIEW_RANGE = (0.42, 0.58)
+# Image scales offered by 'Export current view'
+EXPORT_SCALES = (1, 2, 3, 4)
+# Initialize Dash application; the real layout replaces the loading page once the model is ready, so its
+# callbacks are registered before their components exist
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
 
-# Global variable to store the processed graphics data
-graphics_data: Dict = None
+# Encode callback responses with orjson, gzip them and record their size and encode time
+use_fast_json_engine()
+install_response_compression(app.server, GZIP_MIN_BYTES, GZIP_LEVEL, report=REPORT_PAYLOAD_METRICS)
+
+# Processed models by name: the one main() loaded plus workbooks in UM_MODEL_DIR, loaded when first asked for
+model_registry = ModelRegistry(MODEL_CACHE_MB * 1_000_000, lambda workbook: load_model(workbook), on_evict=lambda name: forget_model(name))
+model_registry.add_sources(find_workbooks(MODEL_DIR))
+
+# The processed graphics data of the model the current callback is drawing
+graphics_data: Dict = ModelProxy(model_registry)
+
+# Pre-rendered single-practice views, filled by the warm-up stage in main()
+figure_cache = FigureCache(FIGURE_CACHE_MAX_MB * 1_000_000)
+
+# Rendered views shared with the other server workers and with later runs, through a SQLite file on this host
+render_cache = RenderCache(RENDER_CACHE_PATH, RENDER_CACHE_MB * 1_000_000) if RENDER_CACHE_PATH else None
+# Figures drawn by callbacks are encoded and written to the render cache on this thread, after the response has gone
+render_cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render-cache-writer') if render_cache is not None else None
+# Views in the render cache are only reused by the drawing code that rendered them
+RENDER_CODE_VERSION = source_fingerprint(os.path.join(os.path.dirname(os.path.abspath(__file__)), module)
+                                         for module in ('artifact_relationship_visual.py', 'level_of_detail.py', 'viewport.py', 'figure_serialization.py'))
+
+# Indexes kept with a model (and in its snapshot) are rebuilt when the code or row positions they come from change
+DERIVED_INDEX_VERSION = cache_key(source_fingerprint(os.path.join(os.path.dirname(os.path.abspath(__file__)), module)
+                                                     for module in ('relationship_index.py', 'level_of_detail.py', 'query_api.py', 'render_cache.py')),
+                                  PRACTICE_Y_TOP, PROCESS_Y_TOP, PROCESS_Y_BOTTOM, PRACTICE_Y_BOTTOM)[:16]
+
+# Laid-out and x-indexed full views, most recently used last, so pan and zoom skip filtering and positioning
+full_view_layouts: 'OrderedDict[Tuple, Dict]' = OrderedDict()
+full_view_layouts_lock = threading.Lock()
+
+# Latest graph update per browser session; older updates still drawing give up after their current stage
+request_generations = RequestGenerations()
+
+# Per-stage timings and element counts of every figure update_graph builds, served at /metrics
+stage_metrics = StageMetrics(json_log=METRICS_JSON_LOG)
+
+# Writes a cProfile and sampled-stack profile of each graph update and export to UM_PROFILE_DIR, when it is set
+request_profiler = RequestProfiler(PROFILE_DIR, PROFILE_SAMPLE_MS / 1000, PROFILE_MIN_MS / 1000)
+
+# Response times of the JSON query API, by endpoint and status, served at /metrics
+query_seconds = Histogram('um_api_request_seconds', "Time to answer a query API request.", LATENCY_BUCKETS, ('endpoint', 'status'))
+query_seconds_lock = threading.Lock()
+
+# Progress of the model load main() runs in the background, shown on the loading page and at /health
+startup_status = {'stage': "Starting", 'error': None, 'ready': False}
+
+# Renders 'Export current view' jobs off the callback threads
+export_queue = ExportQueue(EXPORT_WORKERS, EXPORT_QUEUE_SIZE, EXPORT_RESULT_TTL, EXPORT_DIR, profiler=request_profiler)
 
 def wrap_text(text: str, max_line_length: int) -> str:
     wrapped_lines = textwrap.wrap(text, width=max_line_length)
     return '<br>'.join(wrapped_lines)
 
+def get_relationship_index() -> Dict:
+    """Compact relationship index for clientside filtering, built once per model and kept with the graphics data."""
+    if 'relationship_index' not in graphics_data:
+        row_positions = dict(practice_top=PRACTICE_Y_TOP, process_top=PROCESS_Y_TOP,
+                             process_bottom=PROCESS_Y_BOTTOM, practice_bottom=PRACTICE_Y_BOTTOM)
+        graphics_data['relationship_index'] = build_relationship_index(graphics_data, row_positions)
+    return graphics_data['relationship_index']
+
+def get_query_index() -> Dict:
+    """Adjacency lists behind the query API, built once per model and kept with the graphics data."""
+    if 'query_index' not in graphics_data:
+        graphics_data['query_index'] = build_query_index(graphics_data)
+    return graphics_data['query_index']
+
+def get_model_fingerprint() -> str:
+    """Content hash of the model, computed once and kept with the graphics data; it keys the render cache."""
+    if 'fingerprint' not in graphics_data:
+        graphics_data['fingerprint'] = model_fingerprint(graphics_data)
+    return graphics_data['fingerprint']
+
+def practice_options() -> List[Dict]:
+    return [{'label': data['name'], 'value': practice_id} for practice_id, data in graphics_data['practice_top'].items()]
+
 def create_layout():
+    # In clientside mode the whole relationship index is shipped once per model and the browser does the filtering
+    if CLIENTSIDE_FILTERING:
+        relationship_store = dcc.Store(id='relationship-index', data=get_relationship_index())
+    else:
+        relationship_store = dcc.Store(id='relationship-index')
+
+    # The model picker only shows when there is more than one model to pick from
+    model_names = model_registry.names()
     app.layout = html.Div([
+        relationship_store,
+        dcc.Location(id='url', refresh=False),
+        dcc.Store(id='session-id', storage_type='session'),
+
+        html.Div([
+            html.Label("Model", style={'margin-right': '10px', 'color': 'lightblue'}),
+            dcc.Dropdown(
+                id='model-dropdown',
+                options=[{'label': name, 'value': name} for name in model_names],
+                value=model_registry.default_name,
+                clearable=False,
+                style={'width': '300px'}
+            )
+        ], style={'display': 'flex' if len(model_names) > 1 else 'none', 'align-items': 'center', 'margin-bottom': '10px'}),
+
         html.Div([
             html.Label("Select Practice", style={'margin-right': '10px', 'color': 'lightblue', 'display': 'inline-block'}),
             dcc.Dropdown(
                 id='practice-dropdown',
-                options=[{'label': data['name'], 'value': practice_id} for practice_id, data in graphics_data['practice_top'].items()],
+                options=practice_options(),
                 multi=True,  # Allow multiple selections
                 placeholder="Select practices",
                 style={'width': '45%', 'display': 'inline-block', 'verticalAlign': 'middle'}
@@ -61,6 +193,29 @@ def create_layout():
             style={'color': 'lightblue', 'margin-left': '10px'}
         ),
 
+        html.Div([
+            dcc.Dropdown(
+                id='export-format',
+                options=[{'label': fmt.upper(), 'value': fmt} for fmt in EXPORT_FORMATS],
+                value='png',
+                clearable=False,
+                style={'width': '90px'}
+            ),
+            dcc.Dropdown(
+                id='export-scale',
+                options=[{'label': f"{scale}x", 'value': scale} for scale in EXPORT_SCALES],
+                value=2,
+                clearable=False,
+                style={'width': '70px', 'margin-left': '10px'}
+            ),
+            html.Button("Export current view", id='export-button', style={'margin-left': '10px'}),
+            html.Span(id='export-status', style={'color': 'lightblue', 'margin-left': '10px'}),
+            dcc.Store(id='export-view'),
+            dcc.Store(id='export-job'),
+            dcc.Interval(id='export-poll', interval=1000, disabled=True),
+            dcc.Download(id='export-download')
+        ], style={'display': 'flex', 'align-items': 'center', 'margin': '10px 0 0 10px'}),
+
         html.Div(
             dcc.Graph(
                 id='main-graph',
@@ -74,16 +229,55 @@ def create_layout():
 
     return app.layout
 
+GRAPH_INPUTS = [
+    Input('practice-dropdown', 'value'),
+    Input('filter-destination-toggle', 'value'),
+    Input('toggle-artifact-names', 'value'),
+    Input('toggle-practice-only', 'value'),
+    Input('model-dropdown', 'value')
+]
+
+@app.callback(Output('model-dropdown', 'value'), Input('url', 'search'))
+def select_model_from_url(search):
+    # ?model=<name> opens that model
+    requested = parse_qs((search or '').lstrip('?')).get('model')
+    if not requested or requested[0] not in model_registry.names():
+        raise PreventUpdate
+    return requested[0]
+
 @app.callback(
-    Output('main-graph', 'figure'),
-    [
-        Input('practice-dropdown', 'value'),
-        Input('filter-destination-toggle', 'value'),
-        Input('toggle-artifact-names', 'value'),
-        Input('toggle-practice-only', 'value')
-    ]
+    Output('practice-dropdown', 'options'),
+    Output('practice-dropdown', 'value'),
+    Output('relationship-index', 'data'),
+    Input('model-dropdown', 'value'),
+    prevent_initial_call=True
 )
-def update_graph(selected_practices, filter_destination, show_artifact_names, practice_only):
+def switch_model(model_name):
+    # Loads the model on first use; the selection is cleared as practice ids differ between models
+    if model_name not in model_registry.names():
+        raise PreventUpdate
+    with model_registry.use(model_name):
+        return practice_options(), [], get_relationship_index() if CLIENTSIDE_FILTERING else dash.no_update
+
+def update_graph(selected_practices, filter_destination, show_artifact_names, practice_only, model_name, relayout_data=None, session_id=None):
+    if model_name not in model_registry.names():
+        raise PreventUpdate
+    profile_tags = {'label': model_name, 'model': model_name, 'selected_practices': selected_practices, 'filter_destination': filter_destination,
+                    'show_artifact_names': show_artifact_names, 'practice_only': practice_only, 'relayout_data': relayout_data,
+                    'triggered': dash.callback_context.triggered_id}
+    try:
+        with request_generations.track(session_id), request_profiler.profile('update_graph', profile_tags), model_registry.use(model_name):
+            return draw_graph(selected_practices, filter_destination, show_artifact_names, practice_only, model_name, relayout_data)
+    except StaleRequest:
+        # The browser has since asked for a newer view, which is already being drawn
+        raise PreventUpdate
+
+def draw_graph(selected_practices, filter_destination, show_artifact_names, practice_only, model_name, relayout_data):
+
+    # Zoom and pan change what is drawn in the full view, which only sends the elements in the visible window
+    zoom_triggered = dash.callback_context.triggered_id == 'main-graph'
+    if zoom_triggered and ('practice_only' in practice_only or not has_x_range_change(relayout_data)):
+        raise PreventUpdate
 
     filter_destination_enabled = 'filter_destination' in filter_destination
 
@@ -93,11 +287,116 @@ def update_graph(selected_practices, filter_destination, show_artifact_names, pr
     # Determine if the artifact names toggle is checked
     show_names = 'show_names' in show_artifact_names
 
-    # Call the appropriate figure creation function based on the toggles
-    if practice_only_view:
-        return create_practice_only_figure(selected_practices, show_artifact_names=show_names, filter_destination=filter_destination_enabled)
-    else:
-        return create_full_figure(selected_practices, show_artifact_names=show_names, filter_destination=filter_destination_enabled)
+    # Serve pre-rendered views straight from the warm cache (they are drawn for the default window)
+    figure_key = None if zoom_triggered else figure_cache_key(selected_practices, filter_destination_enabled, show_names, practice_only_view, model_name)
+    cached_figure = figure_cache.get(figure_key) if figure_key else None
+    if cached_figure is not None:
+        mark_figure_ready()
+        return json.loads(cached_figure)
+
+    # Then from the render cache, when another worker or an earlier run has drawn this view
+    stored_figure = load_stored_figure(figure_key) if figure_key else None
+    if stored_figure is not None:
+        mark_figure_ready()
+        return json.loads(stored_figure)
+
+    # Let a burst of dropdown changes settle so only the last of them is drawn
+    debounce(GRAPH_DEBOUNCE_MS / 1000)
+
+    view_name = 'practice_only' if practice_only_view else 'full' if selected_practices else 'full_unfiltered'
+    with stage_metrics.figure(view_name, model=model_name, selected=len(selected_practices or []), zoom=zoom_triggered):
+        # Call the appropriate figure creation function based on the toggles
+        if practice_only_view:
+            fig = create_practice_only_figure(selected_practices, show_artifact_names=show_names, filter_destination=filter_destination_enabled)
+        else:
+            # Only zoom events carry the range; any other change returns the full view to its default window
+            default_range = DEFAULT_FULL_VIEW_RANGE if not selected_practices else (0, 1)
+            visible_range = visible_x_range(relayout_data, default_range) if zoom_triggered else None
+            fig = create_full_figure(selected_practices, show_artifact_names=show_names, filter_destination=filter_destination_enabled, visible_range=visible_range)
+        with stage_metrics.stage('compact'):
+            figure = compact_figure(fig, FIGURE_PRECISION)
+        stage_metrics.count('shapes', len(figure['layout'].get('shapes', [])))
+        stage_metrics.count('traces', len(figure['data']))
+    if figure_key:
+        store_figure_later(figure_key, figure)
+    mark_figure_ready()
+    return figure
+
+if CLIENTSIDE_FILTERING:
+    # Filtering runs in assets/relationship_filter.js against the relationship index store
+    app.clientside_callback(
+        ClientsideFunction(namespace='relationships', function_name='filterFigure'),
+        Output('main-graph', 'figure'),
+        GRAPH_INPUTS,
+        [State('relationship-index', 'data')]
+    )
+else:
+    app.callback(Output('main-graph', 'figure'), GRAPH_INPUTS + [Input('main-graph', 'relayoutData')], [State('session-id', 'data')])(update_graph)
+
+# Each browser tab gets a session id (assets/session.js) so its superseded graph updates can be abandoned
+app.clientside_callback(
+    ClientsideFunction(namespace='session', function_name='ensureId'),
+    Output('session-id', 'data'),
+    Input('url', 'pathname'),
+    State('session-id', 'data')
+)
+
+'''***************************** EXPORT CURRENT VIEW *************************************'''
+# The browser reports the visible axis ranges and graph size on click (assets/export_view.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='exports', function_name='currentView'),
+    Output('export-view', 'data'),
+    Input('export-button', 'n_clicks'),
+    prevent_initial_call=True
+)
+
+def current_view_figure(figure: Dict, view: Dict) -> Dict:
+    """The graph's figure as it is on screen: pinned to the visible axis ranges and drawn at the graph's size."""
+    layout = dict(figure.get('layout', {}), width=view['width'], height=view['height'])
+    for axis, visible in view['ranges'].items():
+        if visible:
+            layout[axis] = dict(layout.get(axis, {}), range=visible, autorange=False)
+    return dict(figure, layout=layout)
+
+@app.callback(
+    Output('export-job', 'data'),
+    Output('export-poll', 'disabled'),
+    Output('export-status', 'children'),
+    Input('export-view', 'data'),
+    State('main-graph', 'figure'),
+    State('export-format', 'value'),
+    State('export-scale', 'value'),
+    State('practice-dropdown', 'value'),
+    State('model-dropdown', 'value'),
+    prevent_initial_call=True
+)
+def start_export(view, figure, fmt, scale, selected_practices, model_name):
+    # Only queue the job here; rendering happens in the export queue's renderer processes
+    job_id = export_queue.submit(current_view_figure(figure, view), fmt, scale,
+                                 tags={'label': model_name, 'model': model_name, 'selected_practices': selected_practices, 'view': view})
+    if job_id is None:
+        return dash.no_update, dash.no_update, "Too many exports running, try again shortly"
+    return {'id': job_id, 'format': fmt}, False, f"Exporting {fmt.upper()}..."
+
+@app.callback(
+    Output('export-download', 'data'),
+    Output('export-poll', 'disabled', allow_duplicate=True),
+    Output('export-status', 'children', allow_duplicate=True),
+    Input('export-poll', 'n_intervals'),
+    State('export-job', 'data'),
+    prevent_initial_call=True
+)
+def poll_export(_, job):
+    if not job:
+        raise PreventUpdate
+    status = export_queue.status(job['id'])
+    if status.state == JOB_PENDING:
+        raise PreventUpdate
+    if status.state == JOB_DONE:
+        return dcc.send_bytes(status.image, f"unified_model_view.{job['format']}"), True, ""
+    if status.state == JOB_FAILED:
+        return dash.no_update, True, f"Export failed: {status.error}"
+    return dash.no_update, True, "Export expired, please export again"
 
 '''***************************** CREATE DRAWING FUNCTIONS *************************************'''
 def center_positions(data: Dict[str, Dict], y_position: float, x_spacing: float) -> List[Dict]:
@@ -110,6 +409,8 @@ def center_positions(data: Dict[str, Dict], y_position: float, x_spacing: float)
     start_x = 0.5 - ((num_elements - 1) * x_spacing / 2)
 
     for i, (item_id, item_data) in enumerate(data.items()):
+        # Position a copy so laid-out views that are kept around are not moved by later layouts
+        item_data = dict(item_data)
         item_data['x'] = start_x + i * x_spacing
         item_data['y'] = y_position
         item_data['draw_height'] = item_data['height'] / 1000
@@ -264,11 +565,11 @@ def collect_related_processes(filtered_practices_top: dict, filtered_practices_b
 
     for practice_id in filtered_practices_top.keys():
         # Collect processes associated with the top practices
-        related_processes_top.extend([pdata for pid, pdata in graphics_data['process_top'].items() if pdata['practice_id'] == practice_id])
+        related_processes_top.extend([dict(pdata, id=pid) for pid, pdata in graphics_data['process_top'].items() if pdata['practice_id'] == practice_id])
 
     for practice_id in filtered_practices_bottom.keys():
         # Collect processes associated with the bottom practices
-        related_processes_bottom.extend([pdata for pid, pdata in graphics_data['process_bottom'].items() if pdata['practice_id'] == practice_id])
+        related_processes_bottom.extend([dict(pdata, id=pid) for pid, pdata in graphics_data['process_bottom'].items() if pdata['practice_id'] == practice_id])
 
     return related_processes_top, related_processes_bottom
 
@@ -362,81 +663,29 @@ def analyze_reverse_process_relationships(filtered_processes_bottom: Dict[str, D
 
 
 '''************************** MAIN DRAWING FUNCTION ****************************************'''
-def create_full_figure(selected_practices: List[str], show_artifact_names: bool, filter_destination: bool = False) -> go.Figure:
-    fig = go.Figure()
-
-    if selected_practices:
-        if filter_destination:
-            # New logic: Filtering based on destination practices
-            filtered_practices_top, filtered_practices_bottom = filter_bottom_practices(selected_practices)
-            filtered_processes_top, filtered_processes_bottom = filter_bottom_processes(filtered_practices_bottom)
-        else:
-            # Original logic: Filtering based on source practices
-            filtered_practices_top, filtered_processes_top = filter_top_practices(selected_practices)
-            filtered_processes_bottom = analyze_relationships(filtered_processes_top)
-            filtered_practices_bottom: Dict[str, Dict] = {}
-            for pdata in filtered_processes_bottom.values():
-                practice_id = pdata['practice_id']
-                if practice_id in graphics_data['practice_bottom']:
-                    filtered_practices_bottom[practice_id] = graphics_data['practice_bottom'][practice_id]
-      # Set range to full extent if filtered
-        x_range = [0, 1]
-    else:
-        filtered_practices_top = graphics_data['practice_top']
-        filtered_practices_bottom = graphics_data['practice_bottom']
-        filtered_processes_top = graphics_data['process_top']
-        filtered_processes_bottom = graphics_data['process_bottom']
-        # Set a centered range for the full view
-        x_range = [0.42, 0.58]
-
-    max_elements = max(len(filtered_practices_top), len(filtered_processes_top), len(filtered_processes_bottom), len(filtered_practices_bottom))
-    x_spacing = 1 / (max_elements + 1)
-
-    centered_practice_top = center_positions(filtered_practices_top, PRACTICE_Y_TOP, x_spacing)
-    centered_process_top = center_positions(filtered_processes_top, PROCESS_Y_TOP, x_spacing)
-    centered_process_bottom = center_positions(filtered_processes_bottom, PROCESS_Y_BOTTOM, x_spacing)
-    centered_practice_bottom = center_positions(filtered_practices_bottom, PRACTICE_Y_BOTTOM, x_spacing)
+def create_full_figure(selected_practices: List[str], show_artifact_names: bool, filter_destination: bool = False,
+                       visible_range: Tuple[float, float] = None) -> go.Figure:
+    # The unfiltered view is drawn by the level-of-detail engine
+    if not selected_practices:
+        return create_level_of_detail_figure(visible_range or DEFAULT_FULL_VIEW_RANGE, show_artifact_names, filter_destination)
 
-    shapes = []
-    traces = []
-
-    # Create connections between practices and processes
-    for process_data in centered_process_top:
-        practice_data = next((p for p in centered_practice_top if p['id'] == process_data['practice_id']), None)
-        if practice_data:
-            shapes.append(create_bezier_curve(
-                (practice_data['x'], practice_data['y']),
-                (process_data['x'], process_data['y'] + process_data['draw_height']),
-                practice_data['color']
-            ))
-
-    for process_data in centered_process_bottom:
-        practice_data = next((p for p in centered_practice_bottom if p['id'] == process_data['practice_id']), None)
-        if practice_data:
-            shapes.append(create_bezier_curve(
-                (practice_data['x'], practice_data['y'] + practice_data['draw_height']),
-                (process_data['x'], process_data['y']),
-                practice_data['color']
-            ))
+    fig = go.Figure()
 
-    # Create artifact connections
-    artifact_connections, artifact_annotations = create_artifact_connections(
-        graphics_data['process_to_artifacts'],
-        centered_process_top,
-        centered_process_bottom,
-        show_artifact_names,
-        filter_destination
-    )
-    traces.extend(artifact_connections)
+    # Set range to full extent since it's filtered, unless the user has zoomed or panned
+    x_range = list(visible_range) if visible_range else [0, 1]
+    view = get_full_view_layout(selected_practices, filter_destination)
+    # Superseded updates give up between stages, once a newer selection from their session has arrived
+    abandon_if_superseded('layout')
+    shapes, traces, artifact_table = create_full_view_elements(view, viewport_window(visible_range), DETAIL_ARTIFACT, show_artifact_names, filter_destination)
+    abandon_if_superseded('elements')
+    figure_start = time.perf_counter()
 
     # Add annotations to the figure if show_artifact_names is True
     # Create and add the table if show_artifact_names is True
-    if show_artifact_names:
-        artifact_table = create_artifact_table(graphics_data['process_to_artifacts'], centered_process_top, centered_process_bottom)
+    if artifact_table:
         fig.add_trace(artifact_table)
 
-    # Update the layout to position the table in the top right
-    if show_artifact_names:
+        # Update the layout to position the table in the top right
         fig.update_layout(
             annotations=[dict(
                 #text="Artifacts Table",
@@ -451,24 +700,20 @@ def create_full_figure(selected_practices: List[str], show_artifact_names: bool,
             )]
         )
 
-
-    # Add boxes for practices and processes
-    shapes.extend(create_boxes(centered_practice_top + centered_practice_bottom + centered_process_top + centered_process_bottom, x_spacing))
-
-    # Add text labels for practices and processes
-    for data in centered_practice_top:
-        traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
-    for data in centered_process_top:
-        traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
-    for data in centered_process_bottom:
-        traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
-    for data in centered_practice_bottom:
-        traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
-
     fig.update_layout(shapes=shapes)
     fig.add_traces(traces)
 
-    # Final layout update
+    apply_full_view_layout(fig, x_range)
+    if visible_range:
+        # Only the window is drawn, so pin the range slider to the whole view
+        fig.update_layout(xaxis_rangeslider_range=[0, 1], xaxis_rangeslider_autorange=False)
+    stage_metrics.record_stage('figure', time.perf_counter() - figure_start)
+    abandon_if_superseded('figure')
+
+    return fig
+
+def apply_full_view_layout(fig: go.Figure, x_range: List[float]) -> None:
+    """Final layout update shared by every full-view figure."""
     fig.update_layout(
         title="Interactive Process and Practice Visualization",
         plot_bgcolor='#515151',
@@ -502,20 +747,251 @@ def create_full_figure(selected_practices: List[str], show_artifact_names: bool,
         font=dict(color='lightblue')
     )
 
+def viewport_window(visible_range: Optional[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    """Visible x-range widened by the viewport margin, or None to draw everything."""
+    if visible_range is None:
+        return None
+    # Draw a margin either side of the window so small pans do not uncover empty space
+    margin = (visible_range[1] - visible_range[0]) * VIEWPORT_MARGIN
+    return visible_range[0] - margin, visible_range[1] + margin
+
+'''************************** FULL VIEW LAYOUT AND VIEWPORT CULLING ****************************************'''
+def get_full_view_layout(selected_practices: Optional[List[str]], filter_destination: bool) -> Dict:
+    """Laid-out full view for a selection, reused across the pan and zoom events that follow it."""
+    key = (model_registry.active_name(), tuple(sorted(selected_practices or [])), bool(filter_destination and selected_practices))
+    with full_view_layouts_lock:
+        view = full_view_layouts.get(key)
+        if view is not None:
+            full_view_layouts.move_to_end(key)
+            return view
+
+    view = lay_out_full_view(selected_practices, filter_destination)
+    with full_view_layouts_lock:
+        full_view_layouts[key] = view
+        while len(full_view_layouts) > VIEWPORT_LAYOUT_CACHE_SIZE:
+            full_view_layouts.popitem(last=False)
+    return view
+
+def filter_full_view(selected_practices: Optional[List[str]], filter_destination: bool) -> Tuple[Dict, Dict, Dict, Dict]:
+    """Practices and processes of a full view: top practices, bottom practices, top processes, bottom processes."""
+    if selected_practices:
+        if filter_destination:
+            # New logic: Filtering based on destination practices
+            with stage_metrics.stage('filter'):
+                filtered_practices_top, filtered_practices_bottom = filter_bottom_practices(selected_practices)
+            with stage_metrics.stage('relationships'):
+                filtered_processes_top, filtered_processes_bottom = filter_bottom_processes(filtered_practices_bottom)
+        else:
+            # Original logic: Filtering based on source practices
+            with stage_metrics.stage('filter'):
+                filtered_practices_top, filtered_processes_top = filter_top_practices(selected_practices)
+            with stage_metrics.stage('relationships'):
+                filtered_processes_bottom = analyze_relationships(filtered_processes_top)
+                filtered_practices_bottom: Dict[str, Dict] = {}
+                for pdata in filtered_processes_bottom.values():
+                    practice_id = pdata['practice_id']
+                    if practice_id in graphics_data['practice_bottom']:
+                        filtered_practices_bottom[practice_id] = graphics_data['practice_bottom'][practice_id]
+    else:
+        filtered_practices_top = graphics_data['practice_top']
+        filtered_practices_bottom = graphics_data['practice_bottom']
+        filtered_processes_top = graphics_data['process_top']
+        filtered_processes_bottom = graphics_data['process_bottom']
+    return filtered_practices_top, filtered_practices_bottom, filtered_processes_top, filtered_processes_bottom
+
+def lay_out_full_view(selected_practices: Optional[List[str]], filter_destination: bool) -> Dict:
+    """Filter and position every element of a full view and index each kind of element by its x-extent."""
+    filtered_practices_top, filtered_practices_bottom, filtered_processes_top, filtered_processes_bottom = filter_full_view(selected_practices, filter_destination)
+
+    max_elements = max(len(filtered_practices_top), len(filtered_processes_top), len(filtered_processes_bottom), len(filtered_practices_bottom))
+    x_spacing = 1 / (max_elements + 1)
+
+    with stage_metrics.stage('center_positions'):
+        centered_practice_top = center_positions(filtered_practices_top, PRACTICE_Y_TOP, x_spacing)
+        centered_process_top = center_positions(filtered_processes_top, PROCESS_Y_TOP, x_spacing)
+        centered_process_bottom = center_positions(filtered_processes_bottom, PROCESS_Y_BOTTOM, x_spacing)
+        centered_practice_bottom = center_positions(filtered_practices_bottom, PRACTICE_Y_BOTTOM, x_spacing)
+
+    index_start = time.perf_counter()
+    practice_top_lookup = {p['id']: p for p in centered_practice_top}
+    practice_bottom_lookup = {p['id']: p for p in centered_practice_bottom}
+    process_top_lookup = {p['id']: p for p in centered_process_top}
+    process_bottom_lookup = {p['id']: p for p in centered_process_bottom}
+
+    def box_extents(centered_data: List[Dict]) -> List[Tuple[float, float, Dict]]:
+        return [(data['x'] - x_spacing / 2, data['x'] + x_spacing / 2, data) for data in centered_data]
+
+    # Curves from each practice to its processes, as (practice, process, top row?) entries
+    practice_links = []
+    for process_data in centered_process_top:
+        practice_data = practice_top_lookup.get(process_data['practice_id'])
+        if practice_data:
+            practice_links.append((min(practice_data['x'], process_data['x']), max(practice_data['x'], process_data['x']), (practice_data, process_data, True)))
+    for process_data in centered_process_bottom:
+        practice_data = practice_bottom_lookup.get(process_data['practice_id'])
+        if practice_data:
+            practice_links.append((min(practice_data['x'], process_data['x']), max(practice_data['x'], process_data['x']), (practice_data, process_data, False)))
+
+    connections = []
+    for source_id, destination_id in graphics_data['process_to_artifacts']:
+        source_process = process_top_lookup.get(source_id)
+        destination_process = process_bottom_lookup.get(destination_id)
+        if source_process and destination_process:
+            connections.append((min(source_process['x'], destination_process['x']), max(source_process['x'], destination_process['x']),
+                                (source_id, destination_id)))
+
+    process_draw_height = centered_process_bottom[0]['draw_height'] if centered_process_bottom else 0
+    view = {
+        'x_spacing': x_spacing,
+        'practice_top': ViewportIndex(box_extents(centered_practice_top)),
+        'process_top': ViewportIndex(box_extents(centered_process_top)),
+        'process_bottom': ViewportIndex(box_extents(centered_process_bottom)),
+        'practice_bottom': ViewportIndex(box_extents(centered_practice_bottom)),
+        'practice_links': ViewportIndex(practice_links),
+        'connections': ViewportIndex(connections),
+        'process_top_lookup': process_top_lookup,
+        'process_bottom_lookup': process_bottom_lookup,
+        # Bundle anchors for the coarser levels of detail
+        'practice_top_anchors': {p['id']: (p['x'], p['y']) for p in centered_practice_top},
+        'practice_bottom_anchors': {p['id']: (p['x'], p['y'] + p['draw_height']) for p in centered_practice_bottom},
+        'process_top_anchors': _process_row_anchors(centered_process_top, PROCESS_Y_TOP),
+        'process_bottom_anchors': _process_row_anchors(centered_process_bottom, PROCESS_Y_BOTTOM + process_draw_height),
+    }
+    stage_metrics.record_stage('viewport_index', time.perf_counter() - index_start)
+    return view
+
+def create_full_view_elements(view: Dict, window: Optional[Tuple[float, float]], detail_level: str, show_artifact_names: bool,
+                              filter_destination: bool, label_budget: Optional[int] = None) -> Tuple[List[Dict], List[go.Scatter], Optional[go.Table]]:
+    """Shapes, traces and artifact table for the elements of a laid-out full view that intersect the window."""
+    elements_start = time.perf_counter()
+    shapes = []
+    traces = []
+    artifact_table = None
+
+    practice_top = view['practice_top'].query(window)
+    practice_bottom = view['practice_bottom'].query(window)
+    if detail_level == DETAIL_PRACTICE:
+        process_top, process_bottom = [], []
+    else:
+        process_top = view['process_top'].query(window)
+        process_bottom = view['process_bottom'].query(window)
+
+        # Create connections between practices and processes
+        for practice_data, process_data, top_row in view['practice_links'].query(window):
+            if top_row:
+                shapes.append(create_bezier_curve(
+                    (practice_data['x'], practice_data['y']),
+                    (process_data['x'], process_data['y'] + process_data['draw_height']),
+                    practice_data['color']
+                ))
+            else:
+                shapes.append(create_bezier_curve(
+                    (practice_data['x'], practice_data['y'] + practice_data['draw_height']),
+                    (process_data['x'], process_data['y']),
+                    practice_data['color']
+                ))
+
+    if detail_level == DETAIL_ARTIFACT:
+        # Connections crossing the window bring their far-end processes along to draw towards
+        visible_connections = {pair: graphics_data['process_to_artifacts'][pair] for pair in view['connections'].query(window)}
+        connected_top = list({source_id: view['process_top_lookup'][source_id] for source_id, _ in visible_connections}.values())
+        connected_bottom = list({destination_id: view['process_bottom_lookup'][destination_id] for _, destination_id in visible_connections}.values())
+
+        # Create artifact connections
+        artifact_connections, artifact_annotations = create_artifact_connections(visible_connections, connected_top, connected_bottom,
+                                                                                 show_artifact_names, filter_destination)
+        traces.extend(artifact_connections)
+        if show_artifact_names:
+            artifact_table = create_artifact_table(visible_connections, connected_top, connected_bottom)
+    else:
+        practice_colors = {pid: pdata['color'] for pid, pdata in graphics_data['practice_top'].items()}
+        if detail_level == DETAIL_PRACTICE:
+            source_anchors, destination_anchors = view['practice_top_anchors'], view['practice_bottom_anchors']
+        else:
+            # Bundles run between the middle of each practice's processes
+            source_anchors, destination_anchors = view['process_top_anchors'], view['process_bottom_anchors']
+        bundle_shapes, bundle_traces = create_bundle_elements(get_practice_bundles(), source_anchors, destination_anchors, practice_colors,
+                                                              window or (0, 1), LOD_MAX_BUNDLES, color_by_source=filter_destination)
+        shapes.extend(bundle_shapes)
+        traces.extend(bundle_traces)
+
+    # Add boxes for practices and processes
+    shapes.extend(create_boxes(practice_top + practice_bottom + process_top + process_bottom, view['x_spacing']))
+
+    # Add text labels for practices and processes, while they fit the label budget
+    labelled = practice_top + process_top + process_bottom + practice_bottom
+    if label_budget is None or len(labelled) + len(shapes) + len(traces) <= label_budget:
+        for data in labelled:
+            traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
+
+    stage_metrics.record_stage('elements', time.perf_counter() - elements_start)
+    return shapes, traces, artifact_table
+
+def get_practice_bundles() -> PracticeBundles:
+    """Practice-to-practice interaction counts, aggregated once per model and kept with the graphics data."""
+    if 'practice_bundles' not in graphics_data:
+        graphics_data['practice_bundles'] = aggregate_practice_bundles(graphics_data['process_to_artifacts'], graphics_data['process_top'], graphics_data['process_bottom'])
+    return graphics_data['practice_bundles']
+
+def create_level_of_detail_figure(visible_range: Tuple[float, float], show_artifact_names: bool, filter_destination: bool = False) -> go.Figure:
+    """Draw the unfiltered full view with only as much detail as the visible x-range can afford.
+
+    Elements keep their full-model positions so zooming is continuous. Zoomed out, practices are drawn with
+    bundled, counted interactions between them; zooming in expands to process boxes and finally to the
+    individual artifact connections (and artifact table) of the processes in view.
+    """
+    fig = go.Figure()
+
+    view = get_full_view_layout(None, False)
+    abandon_if_superseded('layout')
+    window = viewport_window(visible_range)
+
+    with stage_metrics.stage('detail_level'):
+        detail_level = choose_detail_level(view['practice_top'].count(window) + view['practice_bottom'].count(window),
+                                           view['process_top'].count(window) + view['process_bottom'].count(window),
+                                           view['connections'].count(window), LOD_ELEMENT_BUDGET)
+
+    shapes, traces, artifact_table = create_full_view_elements(view, window, detail_level, show_artifact_names, filter_destination,
+                                                               label_budget=LOD_ELEMENT_BUDGET)
+    abandon_if_superseded('elements')
+    figure_start = time.perf_counter()
+    if artifact_table:
+        fig.add_trace(artifact_table)
+
+    fig.update_layout(shapes=shapes)
+    fig.add_traces(traces)
+
+    apply_full_view_layout(fig, list(visible_range))
+    # Keep the range slider showing the whole model even though only the window is drawn
+    fig.update_layout(xaxis_rangeslider_range=[0, 1], xaxis_rangeslider_autorange=False)
+    stage_metrics.record_stage('figure', time.perf_counter() - figure_start)
+    abandon_if_superseded('figure')
+
     return fig
 
+def _process_row_anchors(centered_processes: List[Dict], y_position: float) -> Dict[str, Tuple[float, float]]:
+    """Mean x position of each practice's processes in a process row."""
+    positions: Dict[str, List[float]] = {}
+    for process_data in centered_processes:
+        positions.setdefault(process_data['practice_id'], []).append(process_data['x'])
+    return {practice_id: (sum(xs) / len(xs), y_position) for practice_id, xs in positions.items()}
+
 def create_practice_only_figure(selected_practices: List[str], show_artifact_names: bool, filter_destination: bool = False) -> go.Figure:
     fig = go.Figure()
 
     # Filter practices only and identify relationships
-    if filter_destination:
-        # New logic: Filtering based on destination practices
-        filtered_practices_top, filtered_practices_bottom = filter_bottom_practices(selected_practices)
-    else:
-        # Original logic: Filtering based on source practices
-        filtered_practices_top, filtered_practices_bottom = filter_practices_only(selected_practices)
+    with stage_metrics.stage('filter'):
+        if filter_destination:
+            # New logic: Filtering based on destination practices
+            filtered_practices_top, filtered_practices_bottom = filter_bottom_practices(selected_practices)
+        else:
+            # Original logic: Filtering based on source practices
+            filtered_practices_top, filtered_practices_bottom = filter_practices_only(selected_practices)
 
-    practice_relationships = analyze_practice_relationships(filtered_practices_top, filtered_practices_bottom)
+    with stage_metrics.stage('relationships'):
+        practice_relationships = analyze_practice_relationships(filtered_practices_top, filtered_practices_bottom)
+    # Superseded updates give up between stages, once a newer selection from their session has arrived
+    abandon_if_superseded('relationships')
 
     # Set range to full extent since it's filtered
     x_range = [0, 1]
@@ -524,13 +1000,16 @@ def create_practice_only_figure(selected_practices: List[str], show_artifact_nam
     max_elements = max(len(filtered_practices_top), len(filtered_practices_bottom))
     x_spacing = 1 / (max_elements + 1)
 
-    centered_practice_top = center_positions(filtered_practices_top, PRACTICE_Y_TOP, x_spacing)
-    centered_practice_bottom = center_positions(filtered_practices_bottom, PRACTICE_Y_BOTTOM, x_spacing)
+    with stage_metrics.stage('center_positions'):
+        centered_practice_top = center_positions(filtered_practices_top, PRACTICE_Y_TOP, x_spacing)
+        centered_practice_bottom = center_positions(filtered_practices_bottom, PRACTICE_Y_BOTTOM, x_spacing)
 
     # Collect the process data for the artifact table
-    filtered_processes_top, filtered_processes_bottom = collect_related_processes(filtered_practices_top, filtered_practices_bottom)
-
+    with stage_metrics.stage('related_processes'):
+        filtered_processes_top, filtered_processes_bottom = collect_related_processes(filtered_practices_top, filtered_practices_bottom)
+    abandon_if_superseded('related_processes')
 
+    elements_start = time.perf_counter()
     shapes = []
     traces = []
 
@@ -576,7 +1055,10 @@ def create_practice_only_figure(selected_practices: List[str], show_artifact_nam
         traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
     for data in centered_practice_bottom:
         traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
+    stage_metrics.record_stage('elements', time.perf_counter() - elements_start)
+    abandon_if_superseded('elements')
 
+    figure_start = time.perf_counter()
     fig.update_layout(shapes=shapes)
     fig.add_traces(traces)
 
@@ -604,18 +1086,249 @@ def create_practice_only_figure(selected_practices: List[str], show_artifact_nam
         dragmode='zoom',
         font=dict(color='lightblue')
     )
+    stage_metrics.record_stage('figure', time.perf_counter() - figure_start)
+    abandon_if_superseded('figure')
 
     return fig
 
 
-def create_figure(selected_practices: List[str] = None, show_artifact_names: bool = False, practice_only: bool = False) -> go.Figure:
+def create_figure(selected_practices: List[str] = None, show_artifact_names: bool = False, practice_only: bool = False, filter_destination: bool = False) -> go.Figure:
     if practice_only:
-        return  create_practice_only_figure(selected_practices,show_artifact_names)
+        return create_practice_only_figure(selected_practices, show_artifact_names, filter_destination=filter_destination)
     else:
-        return create_full_figure(selected_practices, show_artifact_names)
+        return create_full_figure(selected_practices, show_artifact_names, filter_destination=filter_destination)
 
-def main() -> None:
+'''************************** FIGURE CACHE WARM-UP ****************************************'''
+def init_render_worker(data: Dict) -> None:
+    """Give a warm-up worker process its own copy of the processed model."""
     global graphics_data
+    graphics_data = data
+
+def render_figure_json(key: FigureKey) -> str:
+    """Render one cached view to plotly JSON inside a warm-up worker."""
+    selected_practices, filter_destination, show_artifact_names, practice_only, _ = key
+    fig = create_figure(list(selected_practices), show_artifact_names, practice_only=practice_only, filter_destination=filter_destination)
+    return pio.to_json(compact_figure(fig, FIGURE_PRECISION), validate=False)
+
+'''************************** RENDER CACHE ****************************************'''
+def stored_figure_key(key: FigureKey) -> str:
+    """Render cache key of a view: the model's content and everything else that changes how it is drawn."""
+    selected_practices, filter_destination, show_artifact_names, practice_only, _ = key
+    return cache_key(get_model_fingerprint(), RENDER_CODE_VERSION, FIGURE_PRECISION, LOD_ELEMENT_BUDGET, LOD_MAX_BUNDLES, VIEWPORT_MARGIN,
+                     selected_practices, filter_destination, show_artifact_names, practice_only)
+
+def load_stored_figure(key: FigureKey) -> Optional[str]:
+    """A view's figure JSON from the render cache, if any process has stored it."""
+    if render_cache is None:
+        return None
+    stored = render_cache.get('figure', stored_figure_key(key))
+    return zlib.decompress(stored).decode('utf-8') if stored is not None else None
+
+def store_figure(key: FigureKey, figure_json: str) -> None:
+    if render_cache is not None:
+        render_cache.put('figure', stored_figure_key(key), zlib.compress(figure_json.encode('utf-8'), 1))
+
+def store_figure_later(key: FigureKey, figure: Dict) -> None:
+    """Hand a callback's figure to the render cache writer, which encodes and stores it off the request thread."""
+    if render_cache_writer is None:
+        return
+    # Keyed here, where the request's model is the active one
+    stored_key = stored_figure_key(key)
+    render_cache_writer.submit(lambda: render_cache.put('figure', stored_key, zlib.compress(pio.to_json(figure, validate=False).encode('utf-8'), 1)))
+
+'''************************** MODEL REGISTRY ****************************************'''
+def derive_model_indexes(data: Dict) -> None:
+    """Build the indexes the app keeps with a model up front, so they are saved in its snapshot and sized by the registry."""
+    token = active_model.set(data)
+    try:
+        get_model_fingerprint()
+        get_query_index()
+        get_practice_bundles()
+        get_relationship_index()
+    finally:
+        active_model.reset(token)
+
+def load_model(workbook: str) -> Dict:
+    """Load and process a workbook for the model registry, from its snapshot when the workbook is unchanged.
+
+    The model comes back with its derived indexes (built with it, or mapped from a snapshot of the same
+    DERIVED_INDEX_VERSION), so the registry sizes everything it will hold.
+    """
+    return load_or_build_model(workbook, MODEL_SNAPSHOT_DIR, load_and_process, derive_model_indexes, DERIVED_INDEX_VERSION)[0]
+
+def forget_model(name: str) -> None:
+    """Drop the cached figures and laid-out views of a model the registry has unloaded."""
+    figure_cache.discard(lambda key: key[-1] == name)
+    with full_view_layouts_lock:
+        for key in [key for key in full_view_layouts if key[0] == name]:
+            del full_view_layouts[key]
+
+def install_model(data: Dict, name: str, source: str = None) -> None:
+    """Serve a processed model as the default one: warm the figure cache for it and build the layout."""
+    # Indexes are added before the registry sizes the model, so its memory budget counts them
+    derive_model_indexes(data)
+    model_registry.set_default(name, data, source)
+
+    if FIGURE_CACHE_WARM_SET:
+        report_stage(f"5 - Warming Figure Cache ({', '.join(FIGURE_CACHE_WARM_SET)})")
+        keys = warm_set_keys(data['practice_top'], FIGURE_CACHE_WARM_SET, name)
+        if render_cache is not None:
+            # Views another worker or an earlier run has drawn are loaded rather than drawn again
+            missing = []
+            for key in keys:
+                figure_json = load_stored_figure(key)
+                if figure_json is None:
+                    missing.append(key)
+                else:
+                    figure_cache.put(key, figure_json)
+            print(f"   Loaded {len(keys) - len(missing)}/{len(keys)} figures from the render cache")
+            keys = missing
+        # Spawned, not forked: the server may already be answering requests on other threads
+        warm_figure_cache(figure_cache, keys, render_figure_json, FIGURE_CACHE_WORKERS, initializer=init_render_worker, initargs=(data,),
+                          mp_context=multiprocessing.get_context('spawn'), on_rendered=store_figure)
+
+    report_stage("6 - Drawing Graphic")
+    app.layout = create_layout()
+    startup_status['ready'] = True
+
+'''************************** BACKGROUND STARTUP ****************************************'''
+def report_stage(stage: str) -> None:
+    print(stage)
+    startup_status['stage'] = stage
+
+def create_loading_layout() -> html.Div:
+    """Page served while the model loads; it polls the load and swaps in the real layout when it is ready."""
+    return html.Div(id='page-content', children=html.Div([
+        html.H2("Loading model...", style={'color': 'lightblue'}),
+        html.Div(startup_status['stage'], id='loading-stage', style={'color': 'lightblue'}),
+        dcc.Interval(id='loading-poll', interval=1000)
+    ], style={'backgroundColor': '#515151', 'height': '100vh', 'padding': '20px', 'box-sizing': 'border-box'}))
+
+@app.callback(
+    Output('page-content', 'children'),
+    Output('loading-stage', 'children'),
+    Output('loading-poll', 'disabled'),
+    Input('loading-poll', 'n_intervals'),
+    prevent_initial_call=True
+)
+def poll_startup(_):
+    if startup_status['error']:
+        return dash.no_update, f"Loading failed: {startup_status['error']}", True
+    if startup_status['ready']:
+        return app.layout, dash.no_update, True
+    return dash.no_update, startup_status['stage'], False
+
+@app.server.route('/health')
+def health():
+    # Answers as soon as the server is up, so health checks pass while a big workbook is still loading
+    state = 'failed' if startup_status['error'] else 'ready' if startup_status['ready'] else 'loading'
+    return jsonify(status=state, stage=startup_status['stage'], error=startup_status['error'])
+
+@app.server.route('/metrics')
+def metrics():
+    """Prometheus text exposition of figure stage timings, callback payloads, the figure cache and loaded models."""
+    callbacks = dict(payload_stats.callbacks)
+    text = stage_metrics.render()
+    text += render_counters('um_callback_calls_total', "Dash callback responses sent.", 'counter',
+                            {(('callback', name),): stats['calls'] for name, stats in callbacks.items()})
+    text += render_counters('um_callback_response_bytes_total', "Callback response bytes before compression.", 'counter',
+                            {(('callback', name),): stats['raw_bytes'] for name, stats in callbacks.items()})
+    text += render_counters('um_callback_sent_bytes_total', "Callback response bytes sent.", 'counter',
+                            {(('callback', name),): stats['sent_bytes'] for name, stats in callbacks.items()})
+    text += render_counters('um_callback_encode_seconds_total', "Time spent encoding callback responses.", 'counter',
+                            {(('callback', name),): round(stats['encode_seconds'], 6) for name, stats in callbacks.items()})
+    with query_seconds_lock:
+        text += '\n'.join(query_seconds.render()) + '\n'
+    text += render_counters('um_graph_updates_total', "Graph updates tracked per browser session.", 'counter', {(): request_generations.started})
+    text += render_counters('um_graph_updates_abandoned_total', "Graph updates given up because a newer one arrived, by where they stopped.", 'counter',
+                            {(('at', where),): count for where, count in dict(request_generations.abandoned).items()})
+    text += render_counters('um_figure_cache_requests_total', "Figure cache lookups.", 'counter',
+                            {(('result', 'hit'),): figure_cache.hits, (('result', 'miss'),): figure_cache.misses})
+    text += render_counters('um_figure_cache_bytes', "Serialized figures held in the figure cache.", 'gauge', {(): figure_cache.size_bytes})
+    if render_cache is not None:
+        # Counted in the cache file, so these cover every worker and export run sharing it
+        stored = render_cache.stats()
+        text += render_counters('um_render_cache_requests_total', "Render cache lookups across all processes.", 'counter',
+                                {**{(('kind', kind), ('result', 'hit')): stats['hits'] for kind, stats in stored.items()},
+                                 **{(('kind', kind), ('result', 'miss')): stats['misses'] for kind, stats in stored.items()}})
+        text += render_counters('um_render_cache_bytes', "Rendered views held in the render cache.", 'gauge',
+                                {(('kind', kind),): stats['bytes'] for kind, stats in stored.items()})
+        text += render_counters('um_render_cache_evictions_total', "Render cache entries dropped to stay within its size cap.", 'counter',
+                                {(('kind', kind),): stats['evictions'] for kind, stats in stored.items()})
+    text += render_counters('um_model_registry_bytes', "Approximate size of the loaded models.", 'gauge', {(): model_registry.size_bytes})
+    text += render_counters('um_model_loads_total', "Models loaded on demand.", 'counter', {(): model_registry.loads})
+    text += render_counters('um_model_evictions_total', "Models unloaded to stay within the memory budget.", 'counter', {(): model_registry.evictions})
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+'''************************** QUERY API ****************************************'''
+# The relationship questions the graph answers, as JSON for other tools. Every endpoint takes ?model=<name> (the
+# default model otherwise); list endpoints page with ?offset=&limit=, and ?direction=downstream|upstream picks
+# which way artifacts flow.
+def answer_query(endpoint: str, query) -> Response:
+    """Run a query against the requested model, timing it and turning QueryErrors into JSON error responses."""
+    start = time.perf_counter()
+    model_name = request.args.get('model') or model_registry.default_name
+    try:
+        if not startup_status['ready']:
+            raise QueryError("The model is still loading", status=503)
+        if model_name not in model_registry.names():
+            raise QueryError(f"Unknown model '{model_name}'", status=404)
+        with model_registry.use(model_name):
+            response = jsonify(dict(query(get_query_index()), model=model_name))
+    except QueryError as exc:
+        response = jsonify(error=str(exc))
+        response.status_code = exc.status
+    seconds = time.perf_counter() - start
+    with query_seconds_lock:
+        query_seconds.observe((endpoint, str(response.status_code)), seconds)
+    response.headers['Server-Timing'] = f"query;dur={seconds * 1000:.2f}"
+    return response
+
+@app.server.route('/api/v1/practices')
+def api_practices():
+    return answer_query('practices', lambda index: paginate(list_practices(graphics_data, index), *parse_page(request.args)))
+
+@app.server.route('/api/v1/practices/<practice_id>/neighbors')
+def api_practice_neighbors(practice_id):
+    # Processes consuming the practice's artifacts (downstream) or producing the ones it consumes (upstream)
+    return answer_query('practice_neighbors', lambda index: paginate(
+        practice_neighbors(graphics_data, index, practice_id, parse_direction(request.args)), *parse_page(request.args)))
+
+@app.server.route('/api/v1/practices/<practice_id>/relationships')
+def api_practice_relationships(practice_id):
+    # Practices the practice feeds (downstream) or is fed by (upstream), with interaction counts
+    return answer_query('practice_relationships', lambda index: paginate(
+        practice_relationships(graphics_data, index, practice_id, parse_direction(request.args)), *parse_page(request.args)))
+
+@app.server.route('/api/v1/processes/<process_id>/neighbors')
+def api_process_neighbors(process_id):
+    return answer_query('process_neighbors', lambda index: paginate(
+        process_neighbors(graphics_data, index, process_id, parse_direction(request.args)), *parse_page(request.args)))
+
+@app.server.route('/api/v1/subgraph')
+def api_subgraph():
+    # ?practice=<id> once per selected practice; the connections are paged
+    def query(index):
+        nodes, connections = subgraph(graphics_data, index, request.args.getlist('practice'), parse_direction(request.args))
+        return dict(nodes, connections=paginate(connections, *parse_page(request.args)))
+    return answer_query('subgraph', query)
+
+def load_model_in_background(file_name: str) -> None:
+    """Load, check and process the workbook behind the loading page, then switch to the real layout."""
+    try:
+        # An unchanged workbook is mapped from its snapshot instead of being loaded and processed again
+        start = time.perf_counter()
+        graphics, analysis, from_snapshot = load_or_build_model(file_name, MODEL_SNAPSHOT_DIR, lambda workbook: load_and_process(workbook, report_stage),
+                                                                derive_model_indexes, DERIVED_INDEX_VERSION)
+        if from_snapshot:
+            report_stage(f"1 - Loaded Model Snapshot ({time.perf_counter() - start:.2f}s, workbook unchanged)")
+        write_analysis_report("process_and_artifact_analysis.txt", analysis)
+        install_model(graphics, os.path.splitext(os.path.basename(file_name))[0], file_name)
+    except Exception as exc:
+        startup_status['error'] = f"{type(exc).__name__}: {exc}"
+        print(f"Loading failed: {startup_status['error']}")
+
+def main() -> None:
 
     # Create a Tk root widget, which will act as the file dialog's parent
     root = tk.Tk()
@@ -631,43 +1344,12 @@ def main() -> None:
         print("No file selected. Exiting.")
         return
 
-    # Load and process the data
-    print("1 - Loading Data")
-    practices_df, processes_df, artifacts_df, artifact_interactions_df = load_data(file_name)
-
-    # Open a text file to write the output
-    output_file = open("process_and_artifact_analysis.txt", "w")
-
-    # Load and process the data
-    print("1 - Loading Data")
-    practices_df, processes_df, artifacts_df, artifact_interactions_df = load_data(file_name)
-
-    # Find and print processes with no destination
-    print("2 - Identifying Processes with No Destination")
-    output_file.write("Processes with No Destination:\n")
-    processes_no_destination = find_processes_with_no_destination(processes_df, artifact_interactions_df)
-    for process in processes_no_destination:
-        print(process)
-        output_file.write(process + "\n")
-
-    # Find and print artifacts with no source
-    print("3 - Identifying Artifacts with No Source")
-    output_file.write("\nArtifacts with No Source:\n")
-    artifacts_no_source = find_artifacts_with_no_source(artifact_interactions_df, artifacts_df)
-    for artifact in artifacts_no_source:
-        print(artifact)
-        output_file.write(artifact + "\n")
-
-    # Close the file after writing
-    output_file.close()
-
-    print("4 - Processing Data")
-    graphics_data = process_data(practices_df, processes_df, artifact_interactions_df, artifacts_df)
-    print("5 - Drawing Graphic")
-    app.layout = create_layout()
+    # Serve the loading page straight away and load the model behind it
+    app.layout = create_loading_layout()
+    threading.Thread(target=load_model_in_background, args=(file_name,), name='model-loader', daemon=True).start()
 
     # Run the Dash app
-    app.run_server(debug=False)
+    app.run(debug=False)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,30 @@
+/*
+ * Reads what the main graph is showing right now for 'Export current view'.
+ *
+ * Zooming and panning in the browser do not always reach the server (the practice-only view and clientside filtering
+ * never send them), so the visible axis ranges and the graph's size are taken from plotly's own layout on click.
+ */
+(function () {
+    'use strict';
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        exports: {
+            currentView: function (nClicks) {
+                var plot = document.querySelector('#main-graph .js-plotly-plot');
+                if (!nClicks || !plot || !plot._fullLayout) {
+                    return window.dash_clientside.no_update;
+                }
+                var layout = plot._fullLayout;
+                return {
+                    clicks: nClicks,
+                    width: layout.width,
+                    height: layout.height,
+                    ranges: {
+                        xaxis: layout.xaxis ? layout.xaxis.range.slice() : null,
+                        yaxis: layout.yaxis ? layout.yaxis.range.slice() : null
+                    }
+                };
+            }
+        }
+    });
+})();
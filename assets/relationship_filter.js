@@ -0,0 +1,421 @@
+/*
+ * Clientside filtering for the main graph.
+ *
+ * Mirrors create_full_figure / create_practice_only_figure in artifact_relationship_visual.py, but works from the
+ * compact relationship index shipped once in the 'relationship-index' dcc.Store, so changing the practice
+ * dropdown or the filter toggles never leaves the browser.
+ */
+(function () {
+    'use strict';
+
+    function wrapText(text, maxLineLength) {
+        var words = String(text).split(/\s+/).filter(function (word) { return word.length > 0; });
+        var lines = [];
+        var line = '';
+        words.forEach(function (word) {
+            while (word.length > maxLineLength) {
+                var room = line ? maxLineLength - line.length - 1 : maxLineLength;
+                if (room <= 0) {
+                    lines.push(line);
+                    line = '';
+                    continue;
+                }
+                line = line ? line + ' ' + word.slice(0, room) : word.slice(0, room);
+                word = word.slice(room);
+                lines.push(line);
+                line = '';
+            }
+            if (!word) {
+                return;
+            }
+            if (!line) {
+                line = word;
+            } else if (line.length + 1 + word.length <= maxLineLength) {
+                line += ' ' + word;
+            } else {
+                lines.push(line);
+                line = word;
+            }
+        });
+        if (line) {
+            lines.push(line);
+        }
+        return lines.join('<br>');
+    }
+
+    // Insertion-ordered set of indexes, matching the dict ordering the Python filters rely on
+    function OrderedSet() {
+        this.items = [];
+        this.members = new Set();
+    }
+    OrderedSet.prototype.add = function (value) {
+        if (!this.members.has(value)) {
+            this.members.add(value);
+            this.items.push(value);
+        }
+    };
+    OrderedSet.prototype.has = function (value) {
+        return this.members.has(value);
+    };
+
+    function centerPositions(items, xSpacing) {
+        var positions = new Map();
+        var startX = 0.5 - ((items.length - 1) * xSpacing / 2);
+        items.forEach(function (item, i) {
+            positions.set(item, startX + i * xSpacing);
+        });
+        return positions;
+    }
+
+    function bezierCurve(start, end, color) {
+        var midY = start[1] + (end[1] - start[1]) * 0.5;
+        return {
+            type: 'path',
+            path: 'M ' + start[0] + ',' + start[1] + ' C ' + start[0] + ',' + midY + ' ' + end[0] + ',' + midY +
+                ' ' + end[0] + ',' + end[1],
+            line: {color: color, width: 2},
+            layer: 'below'
+        };
+    }
+
+    function box(x, y, drawHeight, xSpacing, color) {
+        return {
+            type: 'rect',
+            x0: x - xSpacing / 2, x1: x + xSpacing / 2,
+            y0: y, y1: y + drawHeight,
+            line: {color: '#f5f5f5', width: 2},
+            fillcolor: color,
+            layer: 'below'
+        };
+    }
+
+    function textElement(x, y, drawHeight, text) {
+        return {
+            type: 'scatter',
+            x: [x], y: [y + drawHeight / 2],
+            mode: 'text',
+            text: wrapText(text, 15),
+            textposition: 'middle center',
+            textfont: {color: '#000000', size: 12, family: 'Arial', weight: 'bold'},
+            hoverinfo: 'skip',
+            showlegend: false
+        };
+    }
+
+    function artifactTable(index, topProcesses, bottomProcesses) {
+        var edges = index.edges;
+        var names = [], sources = [], destinations = [];
+        edges.source.forEach(function (source, e) {
+            var destination = edges.destination[e];
+            if (topProcesses.has(source) && bottomProcesses.has(destination)) {
+                edges.artifacts[e].forEach(function (artifact) {
+                    names.push(wrapText(index.artifact_names[artifact], 20));
+                    sources.push(wrapText(index.processes.names[source], 20));
+                    destinations.push(wrapText(index.processes.names[destination], 20));
+                });
+            }
+        });
+        return {
+            type: 'table',
+            domain: {x: [0.8, 1], y: [0.5, 1]},
+            header: {
+                values: ['<b>Artifact Name</b>', '<b>Source Process</b>', '<b>Destination Process</b>'],
+                fill: {color: 'black'},
+                align: 'left',
+                font: {color: '#00FF00', size: 10},
+                line: {color: 'darkslategray'}
+            },
+            cells: {
+                values: [names, sources, destinations],
+                fill: {color: 'darkslategray'},
+                align: 'left',
+                font: {color: 'limegreen', size: 9},
+                line: {color: 'darkslategray'},
+                height: 25
+            }
+        };
+    }
+
+    function baseLayout(title, xRange, withRangeSlider) {
+        var xaxis = {showgrid: false, zeroline: false, showticklabels: false, range: xRange};
+        if (withRangeSlider) {
+            xaxis.rangeslider = {
+                visible: true,
+                thickness: 0.05,
+                bgcolor: '#333333',
+                bordercolor: 'lightblue',
+                borderwidth: 5,
+                yaxis: {rangemode: 'fixed'}
+            };
+            xaxis.rangeselector = {visible: true};
+        }
+        return {
+            title: {text: title},
+            plot_bgcolor: '#515151',
+            paper_bgcolor: '#515151',
+            xaxis: xaxis,
+            yaxis: {showgrid: false, zeroline: false, showticklabels: false, range: [0, 1]},
+            hovermode: 'closest',
+            margin: {l: 40, r: 40, t: 100, b: 40},
+            height: 800,
+            showlegend: false,
+            dragmode: 'zoom',
+            font: {color: 'lightblue'}
+        };
+    }
+
+    // Source practices feeding the given destination practices, in interaction order
+    function reversePracticeRelationships(index, practicesBottom) {
+        var edges = index.edges;
+        var processPractice = index.processes.practice;
+        var practicesTop = new OrderedSet();
+        edges.source.forEach(function (source, e) {
+            if (practicesBottom.has(processPractice[edges.destination[e]])) {
+                practicesTop.add(processPractice[source]);
+            }
+        });
+        return practicesTop;
+    }
+
+    function selectedPracticeIndexes(index, selectedPractices) {
+        var selected = new Set(selectedPractices || []);
+        var practices = new OrderedSet();
+        index.practices.ids.forEach(function (practiceId, i) {
+            if (selected.has(practiceId)) {
+                practices.add(i);
+            }
+        });
+        return practices;
+    }
+
+    function fullFigure(index, selectedPractices, showArtifactNames, filterDestination) {
+        var edges = index.edges;
+        var processPractice = index.processes.practice;
+        var rows = index.rows;
+        var practicesTop, practicesBottom, processesTop, processesBottom, xRange;
+
+        if (selectedPractices && selectedPractices.length) {
+            if (filterDestination) {
+                practicesBottom = selectedPracticeIndexes(index, selectedPractices);
+                practicesTop = reversePracticeRelationships(index, practicesBottom);
+                processesBottom = new OrderedSet();
+                processPractice.forEach(function (practice, process) {
+                    if (practicesBottom.has(practice)) {
+                        processesBottom.add(process);
+                    }
+                });
+                processesTop = new OrderedSet();
+                edges.destination.forEach(function (destination, e) {
+                    if (processesBottom.has(destination)) {
+                        processesTop.add(edges.source[e]);
+                    }
+                });
+            } else {
+                practicesTop = selectedPracticeIndexes(index, selectedPractices);
+                processesTop = new OrderedSet();
+                processPractice.forEach(function (practice, process) {
+                    if (practicesTop.has(practice)) {
+                        processesTop.add(process);
+                    }
+                });
+                processesBottom = new OrderedSet();
+                edges.source.forEach(function (source, e) {
+                    if (processesTop.has(source)) {
+                        processesBottom.add(edges.destination[e]);
+                    }
+                });
+                practicesBottom = new OrderedSet();
+                processesBottom.items.forEach(function (process) {
+                    practicesBottom.add(processPractice[process]);
+                });
+            }
+            xRange = [0, 1];
+        } else {
+            practicesTop = new OrderedSet();
+            index.practices.ids.forEach(function (_, i) { practicesTop.add(i); });
+            practicesBottom = practicesTop;
+            processesTop = new OrderedSet();
+            index.processes.ids.forEach(function (_, i) { processesTop.add(i); });
+            processesBottom = processesTop;
+            xRange = [0.42, 0.58];
+        }
+
+        var maxElements = Math.max(practicesTop.items.length, processesTop.items.length,
+            processesBottom.items.length, practicesBottom.items.length);
+        var xSpacing = 1 / (maxElements + 1);
+        var practiceTopX = centerPositions(practicesTop.items, xSpacing);
+        var processTopX = centerPositions(processesTop.items, xSpacing);
+        var processBottomX = centerPositions(processesBottom.items, xSpacing);
+        var practiceBottomX = centerPositions(practicesBottom.items, xSpacing);
+        var practiceHeight = index.practices.draw_height;
+        var processHeight = index.processes.draw_height;
+        var colors = index.practices.colors;
+
+        var shapes = [];
+        var traces = [];
+
+        processesTop.items.forEach(function (process) {
+            var practice = processPractice[process];
+            if (practiceTopX.has(practice)) {
+                shapes.push(bezierCurve([practiceTopX.get(practice), rows.practice_top],
+                    [processTopX.get(process), rows.process_top + processHeight], colors[practice]));
+            }
+        });
+        processesBottom.items.forEach(function (process) {
+            var practice = processPractice[process];
+            if (practiceBottomX.has(practice)) {
+                shapes.push(bezierCurve([practiceBottomX.get(practice), rows.practice_bottom + practiceHeight],
+                    [processBottomX.get(process), rows.process_bottom], colors[practice]));
+            }
+        });
+
+        edges.source.forEach(function (source, e) {
+            var destination = edges.destination[e];
+            if (processTopX.has(source) && processBottomX.has(destination)) {
+                var artifactNames = edges.artifacts[e].map(function (artifact) {
+                    return index.artifact_names[artifact];
+                }).join(', ');
+                var lineColor = filterDestination ? colors[processPractice[source]] : colors[processPractice[destination]];
+                traces.push({
+                    type: 'scatter',
+                    x: [processTopX.get(source), processBottomX.get(destination)],
+                    y: [rows.process_top, rows.process_bottom + processHeight],
+                    mode: 'lines',
+                    line: {color: lineColor, width: 2},
+                    hovertext: 'Artifacts: ' + artifactNames,
+                    hoverinfo: 'text'
+                });
+            }
+        });
+
+        var data = [];
+        if (showArtifactNames) {
+            data.push(artifactTable(index, processesTop, processesBottom));
+        }
+
+        practicesTop.items.forEach(function (practice) {
+            shapes.push(box(practiceTopX.get(practice), rows.practice_top, practiceHeight, xSpacing, colors[practice]));
+        });
+        practicesBottom.items.forEach(function (practice) {
+            shapes.push(box(practiceBottomX.get(practice), rows.practice_bottom, practiceHeight, xSpacing, colors[practice]));
+        });
+        processesTop.items.forEach(function (process) {
+            shapes.push(box(processTopX.get(process), rows.process_top, processHeight, xSpacing,
+                colors[processPractice[process]]));
+        });
+        processesBottom.items.forEach(function (process) {
+            shapes.push(box(processBottomX.get(process), rows.process_bottom, processHeight, xSpacing,
+                colors[processPractice[process]]));
+        });
+
+        practicesTop.items.forEach(function (practice) {
+            traces.push(textElement(practiceTopX.get(practice), rows.practice_top, practiceHeight, index.practices.names[practice]));
+        });
+        processesTop.items.forEach(function (process) {
+            traces.push(textElement(processTopX.get(process), rows.process_top, processHeight, index.processes.names[process]));
+        });
+        processesBottom.items.forEach(function (process) {
+            traces.push(textElement(processBottomX.get(process), rows.process_bottom, processHeight, index.processes.names[process]));
+        });
+        practicesBottom.items.forEach(function (practice) {
+            traces.push(textElement(practiceBottomX.get(practice), rows.practice_bottom, practiceHeight, index.practices.names[practice]));
+        });
+
+        var layout = baseLayout('Interactive Process and Practice Visualization', xRange, true);
+        layout.shapes = shapes;
+        return {data: data.concat(traces), layout: layout};
+    }
+
+    function practiceOnlyFigure(index, selectedPractices, showArtifactNames, filterDestination) {
+        var edges = index.edges;
+        var processPractice = index.processes.practice;
+        var rows = index.rows;
+        var practicesTop, practicesBottom;
+
+        if (filterDestination) {
+            practicesBottom = selectedPracticeIndexes(index, selectedPractices);
+            practicesTop = reversePracticeRelationships(index, practicesBottom);
+        } else {
+            if (selectedPractices && selectedPractices.length) {
+                practicesTop = selectedPracticeIndexes(index, selectedPractices);
+            } else {
+                practicesTop = new OrderedSet();
+                index.practices.ids.forEach(function (_, i) { practicesTop.add(i); });
+            }
+            practicesBottom = new OrderedSet();
+            edges.source.forEach(function (source, e) {
+                if (practicesTop.has(processPractice[source])) {
+                    practicesBottom.add(processPractice[edges.destination[e]]);
+                }
+            });
+        }
+
+        var maxElements = Math.max(practicesTop.items.length, practicesBottom.items.length);
+        var xSpacing = 1 / (maxElements + 1);
+        var practiceTopX = centerPositions(practicesTop.items, xSpacing);
+        var practiceBottomX = centerPositions(practicesBottom.items, xSpacing);
+        var practiceHeight = index.practices.draw_height;
+        var colors = index.practices.colors;
+
+        var shapes = [];
+        var traces = [];
+
+        edges.source.forEach(function (source, e) {
+            var sourcePractice = processPractice[source];
+            var destPractice = processPractice[edges.destination[e]];
+            if (practiceTopX.has(sourcePractice) && practiceBottomX.has(destPractice)) {
+                shapes.push(bezierCurve([practiceTopX.get(sourcePractice), rows.practice_top],
+                    [practiceBottomX.get(destPractice), rows.practice_bottom + practiceHeight], colors[sourcePractice]));
+            }
+        });
+
+        var data = [];
+        if (showArtifactNames) {
+            var processesTop = new OrderedSet();
+            var processesBottom = new OrderedSet();
+            processPractice.forEach(function (practice, process) {
+                if (practicesTop.has(practice)) {
+                    processesTop.add(process);
+                }
+                if (practicesBottom.has(practice)) {
+                    processesBottom.add(process);
+                }
+            });
+            data.push(artifactTable(index, processesTop, processesBottom));
+        }
+
+        practicesTop.items.forEach(function (practice) {
+            shapes.push(box(practiceTopX.get(practice), rows.practice_top, practiceHeight, xSpacing, colors[practice]));
+        });
+        practicesBottom.items.forEach(function (practice) {
+            shapes.push(box(practiceBottomX.get(practice), rows.practice_bottom, practiceHeight, xSpacing, colors[practice]));
+        });
+        practicesTop.items.forEach(function (practice) {
+            traces.push(textElement(practiceTopX.get(practice), rows.practice_top, practiceHeight, index.practices.names[practice]));
+        });
+        practicesBottom.items.forEach(function (practice) {
+            traces.push(textElement(practiceBottomX.get(practice), rows.practice_bottom, practiceHeight, index.practices.names[practice]));
+        });
+
+        var layout = baseLayout('Practice Relationship Visualization', [0, 1], false);
+        layout.shapes = shapes;
+        return {data: data.concat(traces), layout: layout};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        relationships: {
+            filterFigure: function (selectedPractices, filterDestination, showArtifactNames, practiceOnly, modelName, index) {
+                // The model only matters through the index, which is replaced when the model changes
+                if (!index) {
+                    return window.dash_clientside.no_update;
+                }
+                var filterDestinationEnabled = (filterDestination || []).indexOf('filter_destination') !== -1;
+                var showNames = (showArtifactNames || []).indexOf('show_names') !== -1;
+                if ((practiceOnly || []).indexOf('practice_only') !== -1) {
+                    return practiceOnlyFigure(index, selectedPractices, showNames, filterDestinationEnabled);
+                }
+                return fullFigure(index, selectedPractices, showNames, filterDestinationEnabled);
+            }
+        }
+    });
+})();
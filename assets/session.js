@@ -0,0 +1,24 @@
+/*
+ * Gives each browser tab an id for the lifetime of its session.
+ *
+ * update_graph sends it with every request so the server can abandon renders of a selection the user has already
+ * moved on from (see request_generations.py).
+ */
+(function () {
+    'use strict';
+
+    function newSessionId() {
+        if (window.crypto && window.crypto.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        return Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        session: {
+            ensureId: function (pathname, current) {
+                return current || newSessionId();
+            }
+        }
+    });
+})();
@@ -1,7 +1,7 @@
 import colorsys
 import random
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import pandas as pd
 
@@ -254,6 +254,41 @@ def find_artifacts_with_no_source(process_interactions_df: pd.DataFrame, artifac
     return no_source_artifacts
 
 
+def load_and_process(file_name: str, report: Optional[Callable[[str], None]] = None) -> Tuple[dict, Dict[str, List[str]]]:
+    """Load, check and process a workbook: its graphics data, and its processes with no destination and artifacts
+    with no source. Steps and findings are passed to report (quiet when it is None)."""
+    if report:
+        report("1 - Loading Data")
+    practices_df, processes_df, artifacts_df, artifact_interactions_df = load_data(file_name)
+
+    if report:
+        report("2 - Identifying Processes with No Destination")
+    processes_no_destination = find_processes_with_no_destination(processes_df, artifact_interactions_df)
+    for process in processes_no_destination if report else ():
+        print(process)
+
+    if report:
+        report("3 - Identifying Artifacts with No Source")
+    artifacts_no_source = find_artifacts_with_no_source(artifact_interactions_df, artifacts_df)
+    for artifact in artifacts_no_source if report else ():
+        print(artifact)
+
+    if report:
+        report("4 - Processing Data")
+    graphics_data = process_data(practices_df, processes_df, artifact_interactions_df, artifacts_df)
+    return graphics_data, {'processes_no_destination': processes_no_destination, 'artifacts_no_source': artifacts_no_source}
+
+def write_analysis_report(path: str, analysis: Dict[str, List[str]]) -> None:
+    """Write the processes with no destination and artifacts with no source found by load_and_process."""
+    with open(path, "w") as output_file:
+        output_file.write("Processes with No Destination:\n")
+        for process in analysis.get('processes_no_destination', []):
+            output_file.write(process + "\n")
+        output_file.write("\nArtifacts with No Source:\n")
+        for artifact in analysis.get('artifacts_no_source', []):
+            output_file.write(artifact + "\n")
+
+
 if __name__ == "__main__":
     file_name = 'UnifiedModel.xlsx'
     practices_df, processes_df, artifacts_df, artifact_interactions_df = load_data(file_name)
@@ -0,0 +1,126 @@
+import codecs
+import html
+import io
+import math
+import re
+import zipfile
+from typing import Dict, Iterable, List, Tuple
+
+from matplotlib.backends.backend_pdf import Name, PdfPages, Reference, pdfRepr
+from matplotlib.figure import Figure
+
+from native_renderer import PIXELS_PER_INCH, POINTS_PER_PIXEL, draw_scene
+
+BUNDLE_FORMATS = ('pdf', 'svg')
+TOC_LINES_PER_PAGE = 30
+
+
+def toc_page_count(entries: int) -> int:
+    return max(1, math.ceil(entries / TOC_LINES_PER_PAGE))
+
+
+def draw_toc_page(title: str, lines: List[Tuple[str, int]], style: Dict) -> Figure:
+    """One table-of-contents page in the figures' page size and colours: entry titles with their page numbers."""
+    width, height = style['width'], style['height']
+    fig = Figure(figsize=(width / PIXELS_PER_INCH, height / PIXELS_PER_INCH), dpi=PIXELS_PER_INCH, facecolor=style['background'])
+    fig.text(0.05, 1 - 50 / height, title, ha='left', va='center', color=style['font_color'], fontsize=17 * POINTS_PER_PIXEL)
+    line_height = (height - 140) / TOC_LINES_PER_PAGE / height
+    for i, (entry, page) in enumerate(lines):
+        y = 1 - 110 / height - i * line_height
+        fig.text(0.08, y, entry, ha='left', va='center', color=style['font_color'], fontsize=12 * POINTS_PER_PIXEL)
+        fig.text(0.92, y, str(page), ha='right', va='center', color=style['font_color'], fontsize=12 * POINTS_PER_PIXEL)
+    return fig
+
+
+def write_pdf_bundle(path: str, titles: List[str], scenes: Iterable[Dict], style: Dict, document_title: str) -> int:
+    """Stream one page per scene into a single PDF, after contents pages listing titles (one per scene, same order).
+
+    Each page is written and dropped before the next scene is drawn, so memory does not grow with the number of
+    practices. The contents and every figure page are also bookmarked in the PDF outline, so readers can jump
+    between them. Returns the number of pages written.
+    """
+    toc_pages = toc_page_count(len(titles))
+    entries = [(title, toc_pages + i + 1) for i, title in enumerate(titles)]
+    pages = 0
+    with PdfPages(path, metadata={'Title': document_title}) as pdf:
+        for start in range(0, max(1, len(entries)), TOC_LINES_PER_PAGE):
+            heading = "Contents" if start == 0 else "Contents (continued)"
+            pdf.savefig(draw_toc_page(heading, entries[start:start + TOC_LINES_PER_PAGE], style), facecolor=style['background'])
+            pages += 1
+        for scene in scenes:
+            pdf.savefig(draw_scene(scene), facecolor=scene['background'])
+            pages += 1
+    add_pdf_outline(path, [("Contents", 0)] + [(title, page - 1) for title, page in entries])
+    return pages
+
+
+def add_pdf_outline(path: str, bookmarks: List[Tuple[str, int]]) -> None:
+    """Append an outline of (title, 0-based page index) bookmarks to a finished matplotlib PDF.
+
+    matplotlib writes no outline, so a new catalog and the outline items are added as an incremental update,
+    leaving the pages already written untouched.
+    """
+    with open(path, 'rb') as pdf_file:
+        data = pdf_file.read()
+    trailer = data[data.rindex(b'trailer'):]
+    size = int(re.search(rb'/Size (\d+)', trailer).group(1))
+    root = int(re.search(rb'/Root (\d+) 0 R', trailer).group(1))
+    info = re.search(rb'/Info (\d+) 0 R', trailer)
+    previous_xref = int(re.search(rb'startxref\s+(\d+)', trailer).group(1))
+
+    def read_object(object_id: int) -> bytes:
+        return re.search(rb'(?m)^%d 0 obj\s*(<<.*?>>)' % object_id, data, re.S).group(1)
+
+    pages = int(re.search(rb'/Pages (\d+) 0 R', read_object(root)).group(1))
+    kids = re.search(rb'/Kids \[([^\]]*)\]', read_object(pages)).group(1)
+    page_refs = [Reference(int(object_id)) for object_id in re.findall(rb'(\d+) 0 R', kids)]
+    bookmarks = [(title, page) for title, page in bookmarks if 0 <= page < len(page_refs)]
+    if not bookmarks:
+        return
+
+    outline = Reference(size)
+    items = [Reference(size + 1 + i) for i in range(len(bookmarks))]
+    objects = [(root, {'Type': Name('Catalog'), 'Pages': Reference(pages), 'Outlines': outline, 'PageMode': Name('UseOutlines')}),
+               (outline.id, {'Type': Name('Outlines'), 'First': items[0], 'Last': items[-1], 'Count': len(items)})]
+    for i, (title, page) in enumerate(bookmarks):
+        item = {'Title': codecs.BOM_UTF16_BE + title.encode('utf-16-be'), 'Parent': outline, 'Dest': [page_refs[page], Name('Fit')]}
+        if i > 0:
+            item['Prev'] = items[i - 1]
+        if i < len(items) - 1:
+            item['Next'] = items[i + 1]
+        objects.append((items[i].id, item))
+
+    update = io.BytesIO()
+    offsets = {}
+    for object_id, contents in objects:
+        offsets[object_id] = len(data) + update.tell()
+        update.write(b'%d 0 obj\n%s\nendobj\n' % (object_id, pdfRepr(contents)))
+    xref = len(data) + update.tell()
+    # Subsections for the free list head, the replaced catalog and the new objects, which follow the old ones
+    update.write(b'xref\n0 1\n0000000000 65535 f \n%d 1\n%010d 00000 n \n%d %d\n' % (root, offsets[root], size, len(objects) - 1))
+    for object_id in range(size, size + len(objects) - 1):
+        update.write(b'%010d 00000 n \n' % offsets[object_id])
+    new_trailer = {'Size': size + len(objects) - 1, 'Root': Reference(root), 'Prev': previous_xref}
+    if info:
+        new_trailer['Info'] = Reference(int(info.group(1)))
+    update.write(b'trailer\n%s\nstartxref\n%d\n%%%%EOF\n' % (pdfRepr(new_trailer), xref))
+    with open(path, 'ab') as pdf_file:
+        pdf_file.write(update.getvalue())
+
+
+def write_svg_bundle(path: str, entries: List[Tuple[str, str]], scenes: Iterable[Dict], document_title: str) -> int:
+    """Stream one SVG per scene into a zip, with an index.html contents page linking to each.
+
+    entries are (title, file name) pairs, one per scene in the same order. Returns the number of SVGs written.
+    """
+    written = 0
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        links = '\n'.join(f'<li><a href="{html.escape(file_name)}">{html.escape(title)}</a></li>' for title, file_name in entries)
+        bundle.writestr('index.html', f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{html.escape(document_title)}</title></head>\n'
+                                      f'<body><h1>{html.escape(document_title)}</h1>\n<ol>\n{links}\n</ol></body></html>\n')
+        for (title, file_name), scene in zip(entries, scenes):
+            buffer = io.BytesIO()
+            draw_scene(scene).savefig(buffer, format='svg', facecolor=scene['background'])
+            bundle.writestr(file_name, buffer.getvalue())
+            written += 1
+    return written
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Tuple
+
+MANIFEST_FILE = "export_manifest.json"
+# Bump when the drawing code changes in a way the scene content does not capture, to rebuild every image once
+MANIFEST_VERSION = 1
+
+
+def scene_fingerprint(scene: Dict, fmt: str, scale: float, backend: str) -> str:
+    """Content hash of everything that ends up in one image: the drawn practices, curves, labels and page style."""
+    drawn = {
+        'version': MANIFEST_VERSION,
+        'format': fmt,
+        'scale': scale,
+        'backend': backend,
+        'title': scene['title'],
+        'x_spacing': scene['x_spacing'],
+        'boxes': [[box['id'], box['name'], box['color'], box['x'], box['y'], box['draw_height']] for box in scene['boxes']],
+        'curves': scene['curves'],
+        'labels': scene['labels'],
+        'style': [scene['width'], scene['height'], scene['margin'], scene['background'], scene['font_color']],
+    }
+    encoded = json.dumps(drawn, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def load_manifest(save_dir: str, file_name: str = MANIFEST_FILE) -> Dict[str, str]:
+    """Image file name -> fingerprint of the scene it was rendered from; empty when there is no usable manifest."""
+    try:
+        with open(os.path.join(save_dir, file_name), encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return dict(manifest.get('images', {}))
+
+
+def save_manifest(save_dir: str, images: Dict[str, str], file_name: str = MANIFEST_FILE) -> None:
+    """Write the manifest atomically so an interrupted export never leaves it half written."""
+    path = os.path.join(save_dir, file_name)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump({'version': MANIFEST_VERSION, 'images': dict(sorted(images.items()))}, manifest_file, indent=1)
+    os.replace(temp_path, path)
+
+
+def is_up_to_date(manifest: Dict[str, str], save_dir: str, file_name: str, fingerprint: str) -> bool:
+    return manifest.get(file_name) == fingerprint and os.path.exists(os.path.join(save_dir, file_name))
+
+
+def prune_manifest(manifest: Dict[str, str], save_dir: str, expected_files: Iterable[str], formats: Iterable[str]) -> Tuple[Dict[str, str], int]:
+    """Drop the entries of images this export no longer writes, so the manifest only lists the current model.
+
+    Images of a format being exported that are no longer expected belong to practices removed from the workbook
+    and are deleted; images of formats not exported this time are left alone. Returns the pruned manifest and the
+    number of images deleted.
+    """
+    expected = set(expected_files)
+    extensions = tuple(f".{fmt}" for fmt in formats)
+    kept = {}
+    deleted = 0
+    for file_name, fingerprint in manifest.items():
+        if file_name in expected:
+            kept[file_name] = fingerprint
+        elif file_name.endswith(extensions):
+            try:
+                os.remove(os.path.join(save_dir, file_name))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+    return kept, deleted
@@ -0,0 +1,130 @@
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Dict, NamedTuple, Optional
+
+from export_service import RenderService
+from profiling import RequestProfiler
+
+JOB_PENDING = 'pending'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_UNKNOWN = 'unknown'
+
+# Job ids come back from the browser, so only well-formed ones are turned into file names
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class ExportStatus(NamedTuple):
+    state: str
+    image: Optional[bytes] = None
+    error: Optional[str] = None
+
+
+class ExportQueue:
+    """Renders figure exports for the web app on a bounded pool of background renderer processes.
+
+    submit() never blocks a request thread: it refuses the job when the queue is full. A collector thread writes
+    finished images to result_dir until they are fetched with status(), so a job can be polled from any server
+    worker process sharing that directory; results nobody fetches expire after result_ttl seconds. The renderer
+    pool is started on the first export, not with the app. Given an enabled profiler, each render is profiled.
+    """
+
+    def __init__(self, workers: int, capacity: int, result_ttl: float, result_dir: str, profiler: RequestProfiler = None):
+        self.workers = workers
+        self.capacity = capacity
+        self.result_ttl = result_ttl
+        self.result_dir = result_dir
+        self.profiler = profiler
+        self._service: Optional[RenderService] = None
+        self._lock = threading.Lock()
+        # Render service job id -> export job id while rendering (service ids restart with the service)
+        self._rendering: Dict[int, str] = {}
+
+    def _path(self, job_id: str, state: str) -> str:
+        return os.path.join(self.result_dir, f"{job_id}.{state}")
+
+    def _write(self, job_id: str, state: str, data: bytes) -> None:
+        temp_path = self._path(job_id, state) + '.tmp'
+        with open(temp_path, 'wb') as result_file:
+            result_file.write(data)
+        os.replace(temp_path, self._path(job_id, state))
+
+    def _ensure_started(self) -> RenderService:
+        if self._service is None:
+            os.makedirs(self.result_dir, exist_ok=True)
+            self._service = RenderService(self.workers, queue_size=self.capacity, start_method='spawn', profiler=self.profiler)
+            self._service.start()
+            threading.Thread(target=self._collect, name='export-collector', daemon=True).start()
+        return self._service
+
+    def submit(self, figure: Dict, fmt: str, scale: float, tags: Dict = None) -> Optional[str]:
+        """Queue a figure for rendering and return its job id, or None when the queue is full; tags label its profile."""
+        with self._lock:
+            if len(self._rendering) >= self.capacity:
+                return None
+            service = self._ensure_started()
+            job_id = uuid.uuid4().hex
+            self._write(job_id, JOB_PENDING, b'')
+            # Never blocks: the render queue holds at most as many jobs as are rendering here
+            self._rendering[service.submit(figure, None, fmt, scale, tags=dict(tags or {}, export_job=job_id))] = job_id
+            return job_id
+
+    def status(self, job_id: str) -> ExportStatus:
+        """Where a job is; a finished job's image or error is handed over once and then forgotten."""
+        if not isinstance(job_id, str) or not JOB_ID_PATTERN.fullmatch(job_id):
+            return ExportStatus(JOB_UNKNOWN)
+        for state in (JOB_DONE, JOB_FAILED):
+            try:
+                with open(self._path(job_id, state), 'rb') as result_file:
+                    data = result_file.read()
+                os.remove(self._path(job_id, state))
+            except FileNotFoundError:
+                continue
+            return ExportStatus(JOB_DONE, image=data) if state == JOB_DONE else ExportStatus(JOB_FAILED, error=data.decode('utf-8'))
+        if os.path.exists(self._path(job_id, JOB_PENDING)):
+            return ExportStatus(JOB_PENDING)
+        return ExportStatus(JOB_UNKNOWN)
+
+    def _finish(self, job_id: str, image: Optional[bytes], error: Optional[str]) -> None:
+        if error:
+            self._write(job_id, JOB_FAILED, error.encode('utf-8'))
+        else:
+            self._write(job_id, JOB_DONE, image)
+        try:
+            os.remove(self._path(job_id, JOB_PENDING))
+        except FileNotFoundError:
+            pass
+
+    def _remove_expired(self) -> None:
+        # Also clears the markers of jobs whose server worker died mid-render
+        now = time.time()
+        for entry in os.scandir(self.result_dir):
+            try:
+                if now - entry.stat().st_mtime > self.result_ttl:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _collect(self) -> None:
+        while True:
+            try:
+                result = self._service.get_result(timeout=min(self.result_ttl, 30))
+            except TimeoutError:
+                result = None
+            except RuntimeError as exc:
+                # Every renderer died: fail what is pending so no one waits forever, and restart on the next export
+                with self._lock:
+                    for job_id in self._rendering.values():
+                        self._finish(job_id, None, str(exc))
+                    self._rendering.clear()
+                    self._service.close()
+                    self._service = None
+                return
+
+            with self._lock:
+                if result is not None:
+                    self._finish(self._rendering.pop(result.job_id), result.image, result.error)
+            self._remove_expired()
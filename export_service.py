@@ -0,0 +1,312 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from profiling import RequestProfiler
+
+EXPORT_FORMATS = ('png', 'svg', 'pdf')
+# plotly renders figure dicts through kaleido; matplotlib draws practice scenes with Agg (see native_renderer)
+RENDER_BACKENDS = ('plotly', 'matplotlib')
+
+
+class RenderResult(NamedTuple):
+    job_id: int
+    path: Optional[str]
+    format: str
+    render_seconds: float
+    total_seconds: float
+    error: Optional[str]
+    image: Optional[bytes]
+
+
+def start_persistent_renderer() -> None:
+    """Warm up this process's renderer and keep one headless browser open for the rest of its life.
+
+    Kaleido 1.x launches a browser for every image unless its sync server is started; 0.x keeps its own
+    renderer subprocess once the first image has been drawn.
+    """
+    # A renderer that cannot start is reported by the first job that needs it. The one-shot render also
+    # checks a browser is available before the sync server is started, which otherwise waits forever for one.
+    try:
+        go.Figure().to_image(format='png', width=10, height=10)
+    except Exception:
+        return
+    try:
+        import kaleido
+        if hasattr(kaleido, 'start_sync_server'):
+            kaleido.start_sync_server(silence_warnings=True)
+    except ImportError:
+        pass
+
+
+def stop_persistent_renderer() -> None:
+    try:
+        import kaleido
+        if hasattr(kaleido, 'stop_sync_server'):
+            kaleido.stop_sync_server(silence_warnings=True)
+    except ImportError:
+        pass
+
+
+def load_scene_renderer() -> Callable[[Dict, str, float], bytes]:
+    """Import the matplotlib backend, explaining what to install when it is missing."""
+    try:
+        from native_renderer import render_scene
+    except ImportError as exc:
+        raise ImportError(f"The matplotlib render backend needs matplotlib installed ({exc})") from exc
+    return render_scene
+
+
+def _render_plotly_figure(figure: Dict, fmt: str, scale: float) -> bytes:
+    return pio.to_image(figure, format=fmt, scale=scale, validate=False)
+
+
+def load_plotly_scene_builder() -> Callable[[Dict], Dict]:
+    """Import the plotly drawing of practice scenes, so renderers can build figures from scenes themselves."""
+    from practice_to_practice_image_generator import create_scene_figure
+    return lambda scene: create_scene_figure(scene).to_dict()
+
+
+def _render_worker(jobs: multiprocessing.Queue, results: multiprocessing.Queue, backend: str, profiler: Optional[RequestProfiler] = None,
+                   scenes: bool = False) -> None:
+    """Render figure specs from the job queue until told to stop; None is the stop signal.
+
+    A ('ready', pid) message follows the warm-up. Each job is announced with a ('started', job_id, pid) message
+    before it is drawn and answered with a ('done', job_id, seconds, error, image) message, so the service can fail
+    the job of a renderer that dies.
+    """
+    profiler = profiler or RequestProfiler(None)
+    build_figure = None
+    if backend == 'matplotlib':
+        render = load_scene_renderer()
+    else:
+        start_persistent_renderer()
+        render = _render_plotly_figure
+        if scenes:
+            build_figure = load_plotly_scene_builder()
+    results.put(('ready', os.getpid()))
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, figure, path, fmt, scale, tags = job
+        results.put(('started', job_id, os.getpid()))
+        start = time.perf_counter()
+        try:
+            profile_tags = dict(tags or {}, path=path, format=fmt, scale=scale, backend=backend)
+            profile_tags.setdefault('label', os.path.splitext(os.path.basename(path))[0] if path else job_id)
+            if build_figure is not None:
+                with profiler.profile('figure', profile_tags):
+                    figure = build_figure(figure)
+            with profiler.profile('render', profile_tags):
+                image = render(figure, fmt, scale)
+            if path:
+                with open(path, 'wb') as image_file:
+                    image_file.write(image)
+                image = None
+            results.put(('done', job_id, time.perf_counter() - start, None, image))
+        except Exception as exc:
+            message = ' '.join(str(exc).split())
+            results.put(('done', job_id, time.perf_counter() - start, f"{type(exc).__name__}: {message}", None))
+    if backend != 'matplotlib':
+        stop_persistent_renderer()
+
+
+class RenderService:
+    """A pool of long-lived renderer processes fed figure specs over a queue.
+
+    Renderers are started once and reused for every PNG, SVG or PDF in the batch, so per-image cost is the
+    drawing alone. Jobs either write to a path or hand the image bytes back with their result. With the plotly
+    backend a spec is a plotly figure dict, or a practice scene when scenes is set (the renderers then build the
+    figure, so figure construction is spread over them too); with the matplotlib backend it is always a practice
+    scene. Given an enabled profiler, every render is profiled, labelled with the tags it was submitted with. A job
+    whose renderer process dies while drawing it comes back as a failed result, and so does every outstanding job
+    once no renderer is left to draw it.
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = None, backend: str = 'plotly', start_method: str = None,
+                 profiler: RequestProfiler = None, scenes: bool = False):
+        if backend not in RENDER_BACKENDS:
+            raise ValueError(f"Unknown render backend '{backend}', expected one of {', '.join(RENDER_BACKENDS)}")
+        if backend == 'matplotlib':
+            # Fail here rather than in every renderer process
+            load_scene_renderer()
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        # Services started from a threaded server should use 'spawn', as forking a threaded process can deadlock
+        context = multiprocessing.get_context(start_method)
+        # A bounded job queue keeps at most a few figure specs per renderer in memory
+        self._jobs = context.Queue(maxsize=queue_size or self.workers * 4)
+        self._results = context.Queue()
+        self._processes = [context.Process(target=_render_worker, args=(self._jobs, self._results, backend, profiler, scenes), daemon=True)
+                           for _ in range(self.workers)]
+        self._submitted: Dict[int, tuple] = {}
+        # Renderer pid -> the job it is drawing
+        self._running: Dict[int, int] = {}
+        # Renderers that finished warming up, and those already found dead
+        self._ready = set()
+        self._dead = set()
+        # Highest job id a renderer has announced; the queue is FIFO, so every older job has been taken from it
+        self._last_started = -1
+        # Renderers that died idle as far as the service knows, each of which may have taken a job it never announced
+        self._unannounced_losses = 0
+        self._next_job_id = 0
+        self._lock = threading.Lock()
+        self.render_latencies: List[float] = []
+        self.total_latencies: List[float] = []
+
+    def __enter__(self) -> 'RenderService':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> None:
+        for process in self._processes:
+            process.start()
+
+    def close(self) -> None:
+        """Let the renderers finish queued jobs, then stop them."""
+        for process in self._processes:
+            if process.is_alive():
+                try:
+                    self._jobs.put(None, timeout=5)
+                except queue.Full:
+                    break
+        # Jobs no renderer will take must not keep this process from exiting
+        self._jobs.cancel_join_thread()
+        for process in self._processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._submitted)
+
+    def submit(self, figure: Dict, path: Optional[str] = None, fmt: str = 'png', scale: float = 2, tags: Dict = None) -> int:
+        """Queue a figure spec (plotly figure dict or practice scene, per backend) for rendering, blocking while the job queue is full.
+
+        Once every renderer has exited the job is not queued; get_result returns it as failed.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+        with self._lock:
+            job_id = self._next_job_id
+            self._next_job_id += 1
+            self._submitted[job_id] = (path, fmt, time.perf_counter())
+        while any(process.is_alive() for process in self._processes):
+            try:
+                self._jobs.put((job_id, figure, path, fmt, scale, tags), timeout=1)
+                break
+            except queue.Full:
+                continue
+        return job_id
+
+    def get_result(self, timeout: float = None) -> RenderResult:
+        """Wait for the next finished job, in completion order. Raises RuntimeError when no job is outstanding and every renderer has exited."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            try:
+                # Once every renderer has exited only their last messages are left to read
+                message = self._results.get(timeout=1 if any(process.is_alive() for process in self._processes) else 0)
+            except queue.Empty:
+                lost = self._lost_job()
+                if lost is not None:
+                    return lost
+                if not self.pending and not any(process.is_alive() for process in self._processes):
+                    raise RuntimeError("All renderer processes have exited")
+                if deadline is not None and time.perf_counter() > deadline:
+                    raise TimeoutError("No render finished in time")
+                continue
+            if message[0] == 'ready':
+                self._ready.add(message[1])
+                continue
+            if message[0] == 'started':
+                _, job_id, pid = message
+                self._running[pid] = job_id
+                self._last_started = max(self._last_started, job_id)
+                continue
+            _, job_id, render_seconds, error, image = message
+            for pid, running_job in list(self._running.items()):
+                if running_job == job_id:
+                    del self._running[pid]
+            with self._lock:
+                if job_id not in self._submitted:
+                    # Already failed when its renderer was found dead
+                    continue
+                path, fmt, submitted_at = self._submitted.pop(job_id)
+                total_seconds = time.perf_counter() - submitted_at
+                if error is None:
+                    self.render_latencies.append(render_seconds)
+                    self.total_latencies.append(total_seconds)
+            return RenderResult(job_id, path, fmt, render_seconds, total_seconds, error, image)
+
+    def _lost_job(self) -> Optional[RenderResult]:
+        """Fail a job no renderer will finish, once the results queue has gone quiet.
+
+        That is the job a dead renderer was drawing, a job a renderer took from the queue but died before announcing,
+        or, when no renderer is alive, any outstanding job. Jobs still queued are left for the live renderers.
+        """
+        for process in self._processes:
+            if process.is_alive() or process.pid in self._dead:
+                continue
+            self._dead.add(process.pid)
+            job_id = self._running.pop(process.pid, None)
+            if job_id is None:
+                # Renderers only take jobs once warmed up
+                if process.pid in self._ready:
+                    self._unannounced_losses += 1
+                continue
+            failed = self._fail(job_id, f"Renderer process exited with code {process.exitcode} while drawing this image")
+            if failed is not None:
+                return failed
+
+        live = [process for process in self._processes if process.is_alive()]
+        with self._lock:
+            running = set(self._running.values())
+            unannounced = sorted(job_id for job_id in self._submitted if job_id not in running)
+        if not live:
+            for job_id in unannounced:
+                return self._fail(job_id, "No renderer process left to draw this image")
+            return None
+        if self._unannounced_losses and unannounced:
+            # The oldest unannounced job was taken from the queue if a newer one has been announced, or if every live
+            # renderer is warmed up and idle (it would otherwise have been taken by now)
+            idle = all(process.pid in self._ready and process.pid not in self._running for process in live)
+            if unannounced[0] < self._last_started or idle:
+                self._unannounced_losses -= 1
+                return self._fail(unannounced[0], "Renderer process exited after taking this image from the queue")
+        return None
+
+    def _fail(self, job_id: int, error: str) -> Optional[RenderResult]:
+        with self._lock:
+            if job_id not in self._submitted:
+                return None
+            path, fmt, submitted_at = self._submitted.pop(job_id)
+        return RenderResult(job_id, path, fmt, 0.0, time.perf_counter() - submitted_at, error, None)
+
+    def latency_summary(self) -> Dict[str, float]:
+        """Per-image latency percentiles: time spent drawing, and time from submit to result."""
+        with self._lock:
+            render, total = sorted(self.render_latencies), sorted(self.total_latencies)
+
+        def percentile(values: List[float], fraction: float) -> float:
+            return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+        return {
+            'images': len(render),
+            'render_p50': percentile(render, 0.5),
+            'render_p95': percentile(render, 0.95),
+            'render_max': render[-1] if render else 0.0,
+            'total_p50': percentile(total, 0.5),
+            'total_p95': percentile(total, 0.95),
+        }
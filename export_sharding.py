@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from export_manifest import MANIFEST_FILE, load_manifest, save_manifest
+from export_service import EXPORT_FORMATS
+
+
+class ExportModel(NamedTuple):
+    name: str
+    workbook: str
+    output_dir: str
+
+
+class ExportJob(NamedTuple):
+    models: List[ExportModel]
+    formats: List[str]
+    backend: str
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse a 'i/N' shard spec (0 <= i < N)."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard spec '{spec}' must look like i/N, e.g. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard spec '{spec}' needs 0 <= i < N")
+    return index, count
+
+
+def shard_of(practice_id: str, shard_count: int) -> int:
+    """Stable shard of a practice: the same on every host, Python version and run (unlike hash())."""
+    digest = hashlib.sha1(str(practice_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def select_shard(practice_ids: Iterable[str], shard: Optional[Tuple[int, int]]) -> List[str]:
+    if shard is None:
+        return list(practice_ids)
+    index, count = shard
+    return [practice_id for practice_id in practice_ids if shard_of(practice_id, count) == index]
+
+
+def shard_manifest_file(shard: Optional[Tuple[int, int]]) -> str:
+    """Each shard keeps its own manifest so hosts sharing an output directory never overwrite each other's."""
+    if shard is None:
+        return MANIFEST_FILE
+    index, count = shard
+    return MANIFEST_FILE.replace(".json", f".shard-{index}-of-{count}.json")
+
+
+def load_job(path: str) -> ExportJob:
+    """Read a job manifest listing the models to export; relative paths are taken from the job file's directory.
+
+    {"formats": ["png"], "backend": "plotly",
+     "models": [{"name": "core", "workbook": "core.xlsx", "output_dir": "images/core"}, ...]}
+    """
+    with open(path, encoding='utf-8') as job_file:
+        job = json.load(job_file)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    models = []
+    for entry in job.get('models', []):
+        workbook = os.path.join(base_dir, entry['workbook'])
+        name = entry.get('name') or os.path.splitext(os.path.basename(workbook))[0]
+        models.append(ExportModel(name, workbook, os.path.join(base_dir, entry.get('output_dir', name))))
+    if not models:
+        raise ValueError(f"Job manifest {path} lists no models")
+    formats = list(job.get('formats', ['png']))
+    unknown = sorted(set(formats) - set(EXPORT_FORMATS))
+    if unknown:
+        raise ValueError(f"Job manifest {path} asks for unsupported format(s) {', '.join(unknown)}, expected {', '.join(EXPORT_FORMATS)}")
+    return ExportJob(models, formats, job.get('backend', 'plotly'))
+
+
+def merge_shards(save_dir: str, expected_files: Dict[str, str], shard_count: int) -> Dict[int, List[str]]:
+    """Fold the shard manifests of save_dir into its main manifest and check every expected image is there.
+
+    expected_files maps each image file name to the practice it belongs to. Returns the missing images by shard
+    (empty when the export is complete); the merged manifest only lists expected images that are present, so
+    entries of practices no longer in the model are dropped.
+    """
+    merged = load_manifest(save_dir, MANIFEST_FILE)
+    for index in range(shard_count):
+        merged.update(load_manifest(save_dir, shard_manifest_file((index, shard_count))))
+    merged = {file_name: fingerprint for file_name, fingerprint in merged.items() if file_name in expected_files}
+
+    missing: Dict[int, List[str]] = {}
+    for file_name, practice_id in expected_files.items():
+        path = os.path.join(save_dir, file_name)
+        if file_name not in merged or not os.path.isfile(path) or os.path.getsize(path) == 0:
+            merged.pop(file_name, None)
+            missing.setdefault(shard_of(practice_id, shard_count), []).append(file_name)
+
+    save_manifest(save_dir, merged, MANIFEST_FILE)
+    return missing
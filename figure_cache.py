@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# (selected practices, filter destination, show artifact names, practice only, model name)
+FigureKey = Tuple[Tuple[str, ...], bool, bool, bool, str]
+
+WARM_VIEW_KINDS = ('practice_only', 'full')
+
+
+def figure_cache_key(selected_practices: Optional[List[str]], filter_destination: bool, show_artifact_names: bool, practice_only: bool, model: str = '') -> FigureKey:
+    """Build the cache key for a view; selection order does not change the figure, so it is normalised away."""
+    return tuple(sorted(selected_practices or [])), bool(filter_destination), bool(show_artifact_names), bool(practice_only), model or ''
+
+
+class FigureCache:
+    """Memory-capped store of serialized figures that update_graph can serve without rebuilding."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self._figures: Dict[FigureKey, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: FigureKey) -> Optional[str]:
+        with self._lock:
+            figure_json = self._figures.get(key)
+            if figure_json is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return figure_json
+
+    def put(self, key: FigureKey, figure_json: str) -> bool:
+        """Store a serialized figure, refusing it if it would take the cache over its memory cap."""
+        size = len(figure_json)
+        with self._lock:
+            if key in self._figures:
+                return True
+            if self.size_bytes + size > self.max_bytes:
+                self.rejected += 1
+                return False
+            self._figures[key] = figure_json
+            self.size_bytes += size
+            return True
+
+    def discard(self, predicate: Callable[[FigureKey], bool]) -> int:
+        """Drop every figure whose key matches, e.g. all views of a model that was unloaded; returns how many."""
+        with self._lock:
+            keys = [key for key in self._figures if predicate(key)]
+            for key in keys:
+                self.size_bytes -= len(self._figures.pop(key))
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._figures)
+
+
+def warm_set_keys(practice_ids: Iterable[str], view_kinds: Iterable[str], model: str = '') -> List[FigureKey]:
+    """List the single-practice views (source and destination) for each requested view kind."""
+    view_kinds = list(view_kinds)
+    unknown = [kind for kind in view_kinds if kind not in WARM_VIEW_KINDS]
+    if unknown:
+        raise ValueError(f"Unknown figure cache view kind(s): {', '.join(unknown)}")
+
+    keys = []
+    for practice_id in practice_ids:
+        for kind in view_kinds:
+            for filter_destination in (False, True):
+                keys.append(figure_cache_key([practice_id], filter_destination, False, kind == 'practice_only', model))
+    return keys
+
+
+def warm_figure_cache(cache: FigureCache, keys: List[FigureKey], render: Callable[[FigureKey], str],
+                      workers: int, initializer: Callable = None, initargs: tuple = (), mp_context=None,
+                      on_rendered: Callable[[FigureKey, str], None] = None) -> None:
+    """Render the given views in a process pool and load their JSON into the cache, reporting progress.
+
+    on_rendered is handed each rendered view as well, e.g. to keep it beyond this process.
+    """
+    if not keys:
+        return
+
+    start = time.perf_counter()
+    completed = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=initializer, initargs=initargs) as executor:
+        futures = {executor.submit(render, key): key for key in keys}
+        for future in as_completed(futures):
+            completed += 1
+            key = futures[future]
+            try:
+                figure_json = future.result()
+                cache.put(key, figure_json)
+                if on_rendered:
+                    on_rendered(key, figure_json)
+            except Exception as exc:
+                print(f"   Could not pre-render {key}: {exc}")
+            if completed % 10 == 0 or completed == len(keys):
+                print(f"   Warmed {completed}/{len(keys)} figures ({cache.size_bytes / 1_000_000:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+    if cache.rejected:
+        print(f"   {cache.rejected} figures skipped: cache is at its {cache.max_bytes / 1_000_000:.0f} MB cap")
@@ -0,0 +1,179 @@
+import gzip
+import re
+import threading
+import time
+from typing import Any, Dict, List, Union
+
+import plotly.graph_objects as go
+import plotly.io as pio
+from flask import Flask, g, has_request_context, request
+
+# Values plotly.js would use anyway when the property is left out
+DEFAULT_TRACE_PROPERTIES: Dict[str, Dict[str, Any]] = {
+    'scatter': {'textposition': 'middle center', 'visible': True},
+}
+DEFAULT_SHAPE_PROPERTIES: Dict[str, Any] = {'visible': True, 'xref': 'x', 'yref': 'y'}
+DEFAULT_LINE_WIDTH = 2
+
+# Per-element keys that are never hoisted into the figure template
+ELEMENT_DATA_KEYS = {'x', 'y', 'x0', 'x1', 'y0', 'y1', 'path', 'text', 'hovertext', 'uid', 'cells', 'header', 'domain'}
+
+NUMBER_PATTERN = re.compile(r'-?\d+\.\d+(?:[eE][-+]?\d+)?')
+
+
+def use_fast_json_engine() -> str:
+    """Switch plotly (and therefore Dash) to the orjson encoder when it is installed."""
+    try:
+        import orjson  # noqa: F401
+        pio.json.config.default_engine = 'orjson'
+    except ImportError:
+        pio.json.config.default_engine = 'json'
+    return pio.json.config.default_engine
+
+
+def _format_number(value: float, precision: int) -> str:
+    text = f"{value:.{precision}f}".rstrip('0').rstrip('.')
+    return '0' if text in ('', '-0') else text
+
+
+def _round_values(values: Any, precision: int) -> Any:
+    if hasattr(values, 'round'):  # NumPy arrays
+        return values.round(precision)
+    if isinstance(values, (list, tuple)):
+        return [round(v, precision) if isinstance(v, float) else v for v in values]
+    return values
+
+
+def _strip_defaults(element: Dict, defaults: Dict[str, Any]) -> None:
+    for key, default in defaults.items():
+        if element.get(key) == default:
+            del element[key]
+    line = element.get('line')
+    if isinstance(line, dict) and line.get('width') == DEFAULT_LINE_WIDTH:
+        del line['width']
+        if not line:
+            del element['line']
+
+
+def _hoist_shared_properties(elements: List[Dict]) -> Dict[str, Any]:
+    """Move properties that are identical on every element out of the elements and return them."""
+    if len(elements) < 2:
+        return {}
+    shared = {}
+    for key, value in elements[0].items():
+        if key in ELEMENT_DATA_KEYS:
+            continue
+        if all(key in element and element[key] == value for element in elements[1:]):
+            shared[key] = value
+    for element in elements:
+        for key in shared:
+            del element[key]
+    return shared
+
+
+def compact_figure(fig: Union[go.Figure, Dict], precision: int) -> Dict:
+    """Return a smaller but equivalent figure dict for sending to the browser.
+
+    Coordinates are rounded to `precision` decimal places, properties equal to plotly defaults are dropped and
+    the style repeated on every shape and every trace of a type is written once into the figure template.
+    """
+    fig_dict = fig.to_plotly_json() if isinstance(fig, go.Figure) else fig
+    data = [dict(trace) for trace in fig_dict.get('data', [])]
+    layout = dict(fig_dict.get('layout', {}))
+    template = layout.setdefault('template', {})
+    if not isinstance(template, dict):
+        template = layout['template'] = {}
+
+    traces_by_type: Dict[str, List[Dict]] = {}
+    for trace in data:
+        trace_type = trace.get('type', 'scatter')
+        for axis in ('x', 'y'):
+            if axis in trace:
+                trace[axis] = _round_values(trace[axis], precision)
+        _strip_defaults(trace, DEFAULT_TRACE_PROPERTIES.get(trace_type, {}))
+        traces_by_type.setdefault(trace_type, []).append(trace)
+
+    for trace_type, traces in traces_by_type.items():
+        if trace_type != 'scatter':
+            continue
+        shared = _hoist_shared_properties(traces)
+        shared.pop('type', None)
+        if shared:
+            template_data = template.setdefault('data', {})
+            existing = (template_data.get(trace_type) or [{}])[0]
+            template_data[trace_type] = [{**existing, **shared}]
+
+    shapes = [dict(shape) for shape in layout.get('shapes', [])]
+    for shape in shapes:
+        for coordinate in ('x0', 'x1', 'y0', 'y1'):
+            if isinstance(shape.get(coordinate), float):
+                shape[coordinate] = round(shape[coordinate], precision)
+        if 'path' in shape:
+            shape['path'] = NUMBER_PATTERN.sub(lambda match: _format_number(float(match.group()), precision), shape['path'])
+        _strip_defaults(shape, DEFAULT_SHAPE_PROPERTIES)
+    if shapes:
+        layout['shapes'] = shapes
+        shared = _hoist_shared_properties(shapes)
+        if shared:
+            template_layout = template.setdefault('layout', {})
+            template_layout['shapedefaults'] = {**template_layout.get('shapedefaults', {}), **shared}
+
+    if not template:
+        del layout['template']
+    return {'data': data, 'layout': layout}
+
+
+def mark_figure_ready() -> None:
+    """Record that the callback has finished building its figure, so the rest of the request is serialization."""
+    if has_request_context():
+        g.figure_ready_at = time.perf_counter()
+
+
+class PayloadStats:
+    """Running payload size and encode time totals per callback output."""
+
+    def __init__(self):
+        self.callbacks: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, callback: str, raw_bytes: int, sent_bytes: int, encode_seconds: float) -> Dict[str, float]:
+        with self._lock:
+            stats = self.callbacks.setdefault(callback, {'calls': 0, 'raw_bytes': 0, 'sent_bytes': 0, 'encode_seconds': 0.0})
+            stats['calls'] += 1
+            stats['raw_bytes'] += raw_bytes
+            stats['sent_bytes'] += sent_bytes
+            stats['encode_seconds'] += encode_seconds
+            return dict(stats)
+
+
+payload_stats = PayloadStats()
+
+
+def install_response_compression(server: Flask, min_bytes: int, level: int, report: bool = False) -> None:
+    """Gzip callback responses and record payload size and encode time for each callback."""
+
+    @server.after_request
+    def compress_and_measure(response):
+        if not request.path.endswith('/_dash-update-component') or response.direct_passthrough:
+            return response
+
+        encode_seconds = 0.0
+        if 'figure_ready_at' in g:
+            encode_seconds = time.perf_counter() - g.figure_ready_at
+
+        payload = response.get_data()
+        sent = payload
+        if (len(payload) >= min_bytes and 'gzip' in request.headers.get('Accept-Encoding', '')
+                and 'Content-Encoding' not in response.headers):
+            sent = gzip.compress(payload, compresslevel=level)
+            response.set_data(sent)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Content-Length'] = str(len(sent))
+            response.vary.add('Accept-Encoding')
+
+        body = request.get_json(silent=True) or {}
+        callback = body.get('output', request.path)
+        payload_stats.record(callback, len(payload), len(sent), encode_seconds)
+        if report:
+            print(f"{callback}: {len(payload) / 1000:.1f} kB -> {len(sent) / 1000:.1f} kB sent, encode {encode_seconds * 1000:.1f} ms")
+        return response
@@ -0,0 +1,107 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+import plotly.graph_objects as go
+
+from drawing_visuals import create_bezier_curve
+
+DETAIL_PRACTICE = 'practice'
+DETAIL_PROCESS = 'process'
+DETAIL_ARTIFACT = 'artifact'
+
+# (source practice id, destination practice id) -> {'interactions': n, 'artifacts': m}
+PracticeBundles = Dict[Tuple[str, str], Dict[str, int]]
+
+
+def visible_x_range(relayout_data: Optional[Dict], default: Tuple[float, float]) -> Tuple[float, float]:
+    """Read the visible x-range from a dcc.Graph relayoutData event, falling back to the default view."""
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return default
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return float(relayout_data['xaxis.range[0]']), float(relayout_data['xaxis.range[1]'])
+    # Dragging the range slider reports the whole range as a list
+    if 'xaxis.range' in relayout_data:
+        x0, x1 = relayout_data['xaxis.range']
+        return float(x0), float(x1)
+    return default
+
+
+def has_x_range_change(relayout_data: Optional[Dict]) -> bool:
+    """Whether a relayoutData event moved or reset the x-axis (as opposed to autosize, hover mode changes, ...)."""
+    return bool(relayout_data) and any(key.startswith('xaxis.range') or key == 'xaxis.autorange' for key in relayout_data)
+
+
+def choose_detail_level(visible_practices: int, visible_processes: int, visible_connections: int, element_budget: int) -> str:
+    """Pick the finest level whose element count for the visible window fits the budget.
+
+    Practices cost a box and a label, each process a box, a label and a curve to its practice, and each
+    connection one more trace.
+    """
+    practice_elements = visible_practices * 2
+    if practice_elements + visible_processes * 3 + visible_connections <= element_budget:
+        return DETAIL_ARTIFACT
+    if practice_elements + visible_processes * 3 <= element_budget:
+        return DETAIL_PROCESS
+    return DETAIL_PRACTICE
+
+
+def aggregate_practice_bundles(process_to_artifacts: Dict, process_top: Dict[str, Dict], process_bottom: Dict[str, Dict]) -> PracticeBundles:
+    """Collapse process-to-process interactions into one bundle per source/destination practice pair."""
+    bundles: PracticeBundles = {}
+    for (source_pid, dest_pid), artifacts in process_to_artifacts.items():
+        if source_pid not in process_top or dest_pid not in process_bottom:
+            continue
+        pair = (process_top[source_pid]['practice_id'], process_bottom[dest_pid]['practice_id'])
+        bundle = bundles.setdefault(pair, {'interactions': 0, 'artifacts': 0})
+        bundle['interactions'] += 1
+        bundle['artifacts'] += len(artifacts)
+    return bundles
+
+
+def create_bundle_elements(bundles: PracticeBundles,
+                           source_anchors: Dict[str, Tuple[float, float]],
+                           destination_anchors: Dict[str, Tuple[float, float]],
+                           practice_colors: Dict[str, str],
+                           window: Tuple[float, float],
+                           max_bundles: int,
+                           color_by_source: bool) -> Tuple[List[Dict], List[go.Scatter]]:
+    """Draw practice bundles as weighted bezier curves plus one trace labelling each bundle with its counts.
+
+    Only bundles with an end inside the window are drawn, heaviest first, up to max_bundles.
+    """
+    candidates = []
+    for (source_id, dest_id), counts in bundles.items():
+        if source_id not in source_anchors or dest_id not in destination_anchors:
+            continue
+        start, end = source_anchors[source_id], destination_anchors[dest_id]
+        if window[0] <= start[0] <= window[1] or window[0] <= end[0] <= window[1]:
+            candidates.append((counts['interactions'], source_id, dest_id, start, end, counts))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    candidates = candidates[:max_bundles]
+
+    shapes = []
+    label_x, label_y, label_text, hover_text = [], [], [], []
+    for interactions, source_id, dest_id, start, end, counts in candidates:
+        color = practice_colors[source_id] if color_by_source else practice_colors[dest_id]
+        curve = create_bezier_curve(start, end, color)
+        curve['line']['width'] = min(12, 1 + 2 * math.log2(interactions))
+        shapes.append(curve)
+        label_x.append((start[0] + end[0]) / 2)
+        label_y.append((start[1] + end[1]) / 2)
+        label_text.append(str(interactions))
+        hover_text.append(f"{interactions} interactions, {counts['artifacts']} artifacts")
+
+    traces = []
+    if candidates:
+        traces.append(go.Scatter(
+            x=label_x, y=label_y,
+            mode='markers+text',
+            text=label_text,
+            textposition='middle right',
+            marker=dict(color='#f5f5f5', size=6),
+            textfont=dict(color='#f5f5f5', size=10),
+            hovertext=hover_text,
+            hoverinfo='text',
+            showlegend=False,
+        ))
+    return shapes, traces
@@ -0,0 +1,331 @@
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Browser state a session starts with: the graph callback's inputs and state, keyed '<component id>.<property>'
+INITIAL_STATE = {
+    'url.search': '',
+    'practice-dropdown.value': [],
+    'filter-destination-toggle.value': [],
+    'toggle-artifact-names.value': [],
+    'toggle-practice-only.value': [],
+    'main-graph.relayoutData': None,
+}
+# Toggles a user flips, the property value when checked, and the step name it is reported under
+TOGGLES = (
+    ('toggle-artifact-names.value', 'show_names', 'names'),
+    ('filter-destination-toggle.value', 'filter_destination', 'filter'),
+    ('toggle-practice-only.value', 'practice_only', 'practice_only'),
+)
+# Steps sent without waiting for the previous response, as dash-renderer does while the user keeps picking
+BURST_STEPS = ('select',)
+# Percentiles reported per callback type
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+'''********************************** Transports *****************************************'''
+class TestClientTransport:
+    """Requests answered in this process by the app's Flask test client, one client per thread."""
+
+    def __init__(self, server):
+        self.server = server
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: Dict = None) -> Tuple[int, bytes]:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.server.test_client()
+        response = client.open(path, method=method, json=body, headers={'Accept-Encoding': 'gzip'})
+        return response.status_code, response.get_data()
+
+
+class HttpTransport:
+    """Requests to a running server, over one keep-alive connection per thread like a browser tab."""
+
+    def __init__(self, url: str, timeout: float = 60):
+        parts = urlsplit(url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: Dict = None) -> Tuple[int, bytes]:
+        headers = {'Accept-Encoding': 'gzip'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, self.prefix + path, payload, headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+def read_json(status: int, data: bytes):
+    if status != 200:
+        raise RuntimeError(f"Server answered {status}: {data[:200]!r}")
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+'''********************************** Sessions *****************************************'''
+def find_callback(dependencies: List[Dict], output: str) -> Dict:
+    for callback in dependencies:
+        if callback['output'] == output:
+            if callback.get('clientside_function'):
+                raise SystemExit(f"{output} is drawn in the browser (UM_CLIENTSIDE_FILTERING is on), so the server has no graph updates to load test")
+            return callback
+    raise SystemExit(f"The app has no callback for {output}")
+
+
+def callback_request(callback: Dict, state: Dict, changed: str) -> Dict:
+    """The body dash-renderer posts to /_dash-update-component when changed fires callback."""
+    output_id, output_property = callback['output'].rsplit('.', 1)
+    return {
+        'output': callback['output'],
+        'outputs': {'id': output_id, 'property': output_property},
+        'inputs': [dict(item, value=state.get(f"{item['id']}.{item['property']}")) for item in callback['inputs']],
+        'state': [dict(item, value=state.get(f"{item['id']}.{item['property']}")) for item in callback.get('state', [])],
+        'changedPropIds': [changed],
+    }
+
+
+def session_steps(rng: random.Random, practice_ids: List[str]) -> Iterator[Tuple[str, str, Optional[Dict], float]]:
+    """One browser session's interactions: (callback type, changed property, state changes, pause before it in s).
+
+    The page loads (the URL callback, the unfiltered full view and the autosize relayout), the user pans the
+    unfiltered view, picks a few practices in quick succession as in a dropdown (sent without waiting for the
+    earlier picks to be drawn), flips the toggles on and off, zooms the filtered view and finally clears the
+    selection. Pauses are fractions of the think time.
+    """
+    yield 'url', 'url.search', None, 0
+    yield 'load', 'practice-dropdown.value', None, 0
+    yield 'autosize', 'main-graph.relayoutData', {'main-graph.relayoutData': {'autosize': True}}, 0.1
+
+    for _ in range(rng.randint(1, 3)):
+        start = rng.uniform(0.2, 0.7)
+        yield 'zoom', 'main-graph.relayoutData', {'main-graph.relayoutData': {'xaxis.range[0]': start, 'xaxis.range[1]': start + rng.uniform(0.05, 0.2)}}, 1
+
+    selected: List[str] = []
+    for practice_id in rng.sample(practice_ids, min(len(practice_ids), rng.randint(1, 4))):
+        selected = selected + [practice_id]
+        yield 'select', 'practice-dropdown.value', {'practice-dropdown.value': selected, 'main-graph.relayoutData': None}, 0.3
+
+    for prop, value, name in rng.sample(TOGGLES, len(TOGGLES)):
+        yield name, prop, {prop: [value]}, 1
+        yield name, prop, {prop: []}, 1
+
+    yield 'zoom', 'main-graph.relayoutData', {'main-graph.relayoutData': {'xaxis.range[0]': 0.1, 'xaxis.range[1]': 0.6}}, 1
+    yield 'clear', 'practice-dropdown.value', {'practice-dropdown.value': [], 'main-graph.relayoutData': None}, 1
+
+
+class LoadResults:
+    """Latencies, statuses and bytes per callback type, shared by every simulated user."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+        self.bytes: Dict[str, int] = {}
+        self.failures: Dict[str, str] = {}
+        self.sessions = 0
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, status: int, seconds: float, size: int) -> None:
+        if status == 204:
+            # PreventUpdate: a burst pick dropped because a newer one arrived, or an event with nothing to redraw.
+            # Reported on its own row so quick refusals do not flatter the latency of updates that were drawn
+            kind += ' (superseded)' if kind.split(':')[-1] in BURST_STEPS else ' (no update)'
+        with self._lock:
+            statuses = self.statuses.setdefault(kind, {})
+            statuses[status] = statuses.get(status, 0) + 1
+            self.bytes[kind] = self.bytes.get(kind, 0) + size
+            if status in (200, 204):
+                self.latencies.setdefault(kind, []).append(seconds)
+
+    def finish_session(self) -> None:
+        with self._lock:
+            self.sessions += 1
+
+    def record_failure(self, kind: str, error: str) -> None:
+        with self._lock:
+            statuses = self.statuses.setdefault(kind, {})
+            statuses[0] = statuses.get(0, 0) + 1
+            self.failures.setdefault(kind, error)
+
+
+def send(transport, results: LoadResults, kind: str, body: Dict) -> None:
+    start = time.perf_counter()
+    try:
+        status, data = transport.request('POST', '/_dash-update-component', body)
+    except Exception as exc:
+        results.record_failure(kind, f"{type(exc).__name__}: {exc}")
+        return
+    results.record(kind, status, time.perf_counter() - start, len(data))
+
+
+def run_user(transport, callbacks: Dict[str, Dict], model_name: str, practice_ids: List[str], results: LoadResults,
+             deadline: float, think_seconds: float, seed: int) -> None:
+    """Replay sessions one after another as a single browser tab until the deadline.
+
+    Like dash-renderer, the tab sends each dropdown pick as soon as it is made, each on its own connection, while
+    the earlier picks are still being drawn; it waits for them all before the next kind of interaction.
+    """
+    rng = random.Random(seed)
+    burst: List[threading.Thread] = []
+    while time.perf_counter() < deadline:
+        state = dict(INITIAL_STATE, **{'model-dropdown.value': model_name, 'session-id.data': uuid.uuid4().hex})
+        for step, changed, changes, pause in session_steps(rng, practice_ids):
+            if time.perf_counter() >= deadline:
+                break
+            if step not in BURST_STEPS:
+                for thread in burst:
+                    thread.join()
+                burst = []
+            if pause and think_seconds:
+                time.sleep(rng.uniform(0.5, 1.5) * pause * think_seconds)
+            state.update(changes or {})
+            callback = callbacks['url' if step == 'url' else 'graph']
+            kind = f"{callback['output'].split('.')[0]}:{step}"
+            body = callback_request(callback, state, changed)
+            if step in BURST_STEPS:
+                thread = threading.Thread(target=send, args=(transport, results, kind, body), daemon=True)
+                thread.start()
+                burst.append(thread)
+            else:
+                send(transport, results, kind, body)
+        else:
+            results.finish_session()
+    for thread in burst:
+        thread.join()
+
+
+def run_load(transport, users: int, seconds: float, think_seconds: float, seed: int) -> Tuple[LoadResults, float]:
+    """Run users simulated browser tabs against the app for seconds; returns the results and the time taken."""
+    dependencies = read_json(*transport.request('GET', '/_dash-dependencies'))
+    callbacks = {'graph': find_callback(dependencies, 'main-graph.figure'), 'url': find_callback(dependencies, 'model-dropdown.value')}
+
+    # The practices to select come from the query API, a page at a time
+    practices = read_json(*transport.request('GET', '/api/v1/practices?limit=1000'))
+    model_name, practice_ids = practices['model'], [item['id'] for item in practices['items']]
+    while practices['next_offset'] is not None:
+        practices = read_json(*transport.request('GET', f"/api/v1/practices?limit=1000&offset={practices['next_offset']}"))
+        practice_ids.extend(item['id'] for item in practices['items'])
+
+    results = LoadResults()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_user, name=f'user-{user}', daemon=True,
+                                args=(transport, callbacks, model_name, practice_ids, results, start + seconds, think_seconds, seed + user))
+               for user in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def report(users: int, results: LoadResults, elapsed: float) -> None:
+    total = sum(sum(statuses.values()) for statuses in results.statuses.values())
+    superseded = sum(sum(statuses.values()) for kind, statuses in results.statuses.items() if kind.endswith('(superseded)'))
+    print(f"   {users} user(s): {total} requests in {elapsed:.1f}s = {total / elapsed:.1f} requests/s, {results.sessions} sessions completed, "
+          f"{superseded} superseded updates dropped")
+    print(f"      {'callback type':<34} {'requests':>8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'kB/req':>7}  statuses")
+    for kind in sorted(results.statuses):
+        latencies = sorted(results.latencies.get(kind, []))
+        count = sum(results.statuses[kind].values())
+        quantiles = ' '.join(f"{percentile(latencies, fraction) * 1000:>8.1f}" for fraction in PERCENTILES)
+        statuses = ', '.join(f"{status or 'failed'}: {number}" for status, number in sorted(results.statuses[kind].items()))
+        print(f"      {kind:<34} {count:>8} {count / elapsed:>7.1f} {quantiles} {results.bytes.get(kind, 0) / count / 1000:>7.1f}  {statuses}")
+    for kind, error in results.failures.items():
+        print(f"      {kind} failed: {error}")
+
+
+def wait_until_ready(transport, timeout: float) -> None:
+    """Wait for a server's /health to report its model loaded."""
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            status = read_json(*transport.request('GET', '/health'))
+            if status['status'] == 'ready':
+                return
+            if status['status'] == 'failed':
+                raise SystemExit(f"The server failed to load its model: {status['error']}")
+        except (OSError, RuntimeError, http.client.HTTPException):
+            pass
+        if time.perf_counter() > deadline:
+            raise SystemExit("The server did not become ready in time")
+        time.sleep(1)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay browser sessions against the app's callback endpoint and report "
+                                                 "throughput and latency percentiles per callback type.")
+    parser.add_argument("--url", help="Load test a running server (serve.py or wsgi.py) at this address instead of the app "
+                                      "in this process")
+    parser.add_argument("--workbook", help="Serve this Excel model in this process (default: a synthetic model, so no workbook is needed)")
+    parser.add_argument("--practices", type=int, default=60, help="Practices in the synthetic model (default: 60)")
+    parser.add_argument("--users", default="1,4,16",
+                        help="Comma separated numbers of concurrent users (browser tabs) to run one after another (default: 1,4,16)")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to run each number of users for (default: 20)")
+    parser.add_argument("--think-ms", type=float, default=200,
+                        help="Typical pause between a user's interactions in ms; dropdown picks come faster (default: 200)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the sessions replayed (default: 0)")
+    parser.add_argument("--render-cache", metavar="PATH",
+                        help="Render cache the in-process app uses (default: none, so views are drawn rather than read "
+                             "from an earlier run)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.url:
+        transport = HttpTransport(args.url)
+        print(f"1 - Waiting for {args.url}")
+        wait_until_ready(transport, timeout=300)
+    else:
+        # Settings are read when the app is imported, so the render cache has to be chosen first
+        os.environ['UM_RENDER_CACHE'] = args.render_cache or ''
+        import artifact_relationship_visual as visual
+        from synthetic_model import synthetic_graphics_data
+
+        print("1 - Loading Model")
+        if args.workbook:
+            graphics_data, name = visual.load_model(args.workbook), os.path.splitext(os.path.basename(args.workbook))[0]
+        else:
+            graphics_data, name = synthetic_graphics_data(args.practices), f"synthetic-{args.practices}"
+        visual.install_model(graphics_data, name, args.workbook)
+        transport = TestClientTransport(visual.app.server)
+
+    user_counts = [int(users) for users in args.users.split(",")]
+    print(f"2 - Replaying sessions for {args.duration:.0f}s with {', '.join(map(str, user_counts))} concurrent user(s)")
+    for users in user_counts:
+        results, elapsed = run_load(transport, users, args.duration, args.think_ms / 1000, args.seed)
+        report(users, results, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xls')
+
+# The model the current request is drawing (read through ModelProxy) and its name
+active_model: ContextVar[Optional[Dict]] = ContextVar('active_model', default=None)
+active_model_name: ContextVar[Optional[str]] = ContextVar('active_model_name', default=None)
+
+
+def model_size(data: Dict) -> int:
+    """Approximate memory held by a processed model: its pickled size."""
+    return len(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def find_workbooks(directory: str) -> Dict[str, str]:
+    """Workbooks in a directory by model name (file name without extension)."""
+    if not directory or not os.path.isdir(directory):
+        return {}
+    return {os.path.splitext(entry)[0]: os.path.join(directory, entry) for entry in sorted(os.listdir(directory))
+            if entry.lower().endswith(WORKBOOK_EXTENSIONS) and not entry.startswith('~$')}
+
+
+class ModelRegistry:
+    """Processed models by name, loaded on demand and kept in memory up to a byte budget.
+
+    When a load takes the total over max_bytes, the least recently used models are dropped (on_evict is told their
+    names so per-model caches can be cleared) until it fits again. The default model is never evicted. A model is
+    sized once, when it is added, so load should return it with any indexes kept in it already built.
+    """
+
+    def __init__(self, max_bytes: int, load: Callable[[str], Dict], on_evict: Callable[[str], None] = None):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self.default_name: Optional[str] = None
+        self._load = load
+        self._on_evict = on_evict
+        self._sources: Dict[str, str] = {}
+        # Name -> (model, size), least recently used first
+        self._models: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def add_sources(self, sources: Dict[str, str]) -> None:
+        """Make workbooks available by name without loading them yet."""
+        with self._lock:
+            self._sources.update(sources)
+
+    def set_default(self, name: str, data: Dict, source: str = None) -> None:
+        """Register an already processed model as the one served when no model is asked for."""
+        with self._lock:
+            if source:
+                self._sources[name] = source
+            if name in self._models:
+                self.size_bytes -= self._models.pop(name)[1]
+            size = model_size(data)
+            self._models[name] = (data, size)
+            self.size_bytes += size
+            self.default_name = name
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(set(self._sources) | set(self._models))
+
+    def active_name(self) -> Optional[str]:
+        """Name of the model the current request is using."""
+        return active_model_name.get() or self.default_name
+
+    def default(self) -> Optional[Dict]:
+        with self._lock:
+            entry = self._models.get(self.default_name)
+        return entry[0] if entry else None
+
+    def get(self, name: str) -> Dict:
+        """The named model, loading it from its workbook if it is not in memory; KeyError for unknown names."""
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name][0]
+            if name not in self._sources:
+                raise KeyError(name)
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # One load per model at a time; other requests for it wait for that load instead of starting their own
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name][0]
+                source = self._sources[name]
+            data = self._load(source)
+            size = model_size(data)
+            with self._lock:
+                self._models[name] = (data, size)
+                self.size_bytes += size
+                self.loads += 1
+                evicted = self._evict(keep=name)
+        for evicted_name in evicted:
+            if self._on_evict:
+                self._on_evict(evicted_name)
+        return data
+
+    def _evict(self, keep: str) -> List[str]:
+        evicted = []
+        for name in list(self._models):
+            if self.size_bytes <= self.max_bytes:
+                break
+            if name in (keep, self.default_name):
+                continue
+            self.size_bytes -= self._models.pop(name)[1]
+            self.evictions += 1
+            evicted.append(name)
+        return evicted
+
+    @contextmanager
+    def use(self, name: Optional[str]) -> Iterator[Dict]:
+        """Route reads of the model through ModelProxy to the named model (the default when name is empty)."""
+        data = self.get(name) if name else self.default()
+        token = active_model.set(data)
+        name_token = active_model_name.set(name or self.default_name)
+        try:
+            yield data
+        finally:
+            active_model_name.reset(name_token)
+            active_model.reset(token)
+
+
+class ModelProxy(MutableMapping):
+    """Stands in for a module-level model dict, resolving to the current request's model or the registry default."""
+
+    def __init__(self, registry: ModelRegistry):
+        self._registry = registry
+
+    def _model(self) -> Dict:
+        data = active_model.get()
+        if data is None:
+            data = self._registry.default()
+            if data is None:
+                raise RuntimeError("No model has been loaded")
+        return data
+
+    def __getitem__(self, key):
+        return self._model()[key]
+
+    def __setitem__(self, key, value) -> None:
+        self._model()[key] = value
+
+    def __delitem__(self, key) -> None:
+        del self._model()[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._model()
+
+    def __iter__(self):
+        return iter(self._model())
+
+    def __len__(self) -> int:
+        return len(self._model())
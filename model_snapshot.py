@@ -0,0 +1,131 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from render_cache import source_fingerprint
+
+SNAPSHOT_VERSION = 2
+# Snapshots of models processed by other code are rebuilt rather than trusted
+MODEL_CODE_VERSION = source_fingerprint(os.path.join(os.path.dirname(os.path.abspath(__file__)), module)
+                                        for module in ('data_processing.py', 'model_snapshot.py'))
+
+
+def workbook_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as workbook_file:
+        for block in iter(lambda: workbook_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _check_owner(path: str) -> None:
+    """Refuse snapshots someone else could have planted: unpickling one runs whatever code it names."""
+    if hasattr(os, 'getuid') and os.stat(path).st_uid != os.getuid():
+        raise ValueError(f"{path} is not owned by the current user; refusing to load it")
+
+
+def snapshot_path(snapshot_dir: str, workbook: str, digest: str) -> str:
+    """Where the snapshot of one version of a workbook lives: named after the workbook and keyed by its content hash."""
+    return os.path.join(snapshot_dir, f"{os.path.splitext(os.path.basename(workbook))[0]}-{digest[:16]}.snapshot")
+
+
+def write_model_snapshot(path: str, graphics_data: Dict, source: str, analysis: Dict = None, workbook_digest: str = None,
+                         derive_version: str = None) -> int:
+    """Publish a processed model for servers and exporters to map; returns the snapshot's size in bytes.
+
+    The model (with any derived indexes already kept in it, built by code of derive_version) and its consistency
+    analysis are pickled to path, and a small JSON metadata file (path + '.json') records what they were built
+    from. Both are written to temporary files and renamed into place, metadata last, so a reader never maps half a
+    snapshot.
+    """
+    payload = pickle.dumps({'graphics_data': graphics_data, 'analysis': analysis or {}}, protocol=pickle.HIGHEST_PROTOCOL)
+    metadata = {
+        'version': SNAPSHOT_VERSION,
+        'code_version': MODEL_CODE_VERSION,
+        'derive_version': derive_version,
+        'source': source,
+        'workbook_sha256': workbook_digest,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'payload_bytes': len(payload),
+        'practices': len(graphics_data.get('practice_top', {})),
+        'processes': len(graphics_data.get('process_top', {})),
+    }
+    for target, data in ((path, payload), (path + '.json', json.dumps(metadata, indent=1).encode('utf-8'))):
+        temp_path = target + '.tmp'
+        with open(temp_path, 'wb') as snapshot_file:
+            snapshot_file.write(data)
+        os.replace(temp_path, target)
+    return len(payload)
+
+
+def read_snapshot_metadata(path: str) -> Optional[Dict]:
+    """A snapshot's metadata, or None when there is no usable snapshot at path."""
+    try:
+        with open(path + '.json', encoding='utf-8') as metadata_file:
+            metadata = json.load(metadata_file)
+    except (OSError, ValueError):
+        return None
+    return metadata if isinstance(metadata, dict) else None
+
+
+def load_snapshot(path: str, derive_version: str = None) -> Tuple[Dict, Dict]:
+    """Map a snapshot read-only and rebuild the processed model and its analysis from it, without touching the workbook.
+
+    Given a derive_version, the indexes kept in the snapshot must have been built by that version of their code.
+    """
+    _check_owner(path)
+    metadata = read_snapshot_metadata(path) or {}
+    if metadata.get('version') != SNAPSHOT_VERSION or metadata.get('code_version') != MODEL_CODE_VERSION:
+        raise ValueError(f"{path} was written by a different version of the model code")
+    if derive_version is not None and metadata.get('derive_version') != derive_version:
+        raise ValueError(f"{path} holds indexes built by a different version of their code")
+    with open(path, 'rb') as snapshot_file:
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if len(mapped) != metadata.get('payload_bytes'):
+                raise ValueError(f"{path} does not match its metadata")
+            snapshot = pickle.loads(mapped)
+    return snapshot['graphics_data'], snapshot['analysis']
+
+
+def load_model_snapshot(path: str, derive_version: str = None) -> Dict:
+    return load_snapshot(path, derive_version)[0]
+
+
+def load_or_build_model(workbook: str, snapshot_dir: Optional[str], build: Callable[[str], Tuple[Dict, Dict]],
+                        derive: Callable[[Dict], None] = None, derive_version: str = None) -> Tuple[Dict, Dict, bool]:
+    """A workbook's processed model and analysis, from its snapshot when one matches, otherwise built and snapshotted.
+
+    A snapshot matches when it was made from a workbook with the same content hash by the same model code, and,
+    with derive, its indexes were built by the same derive_version (a hash of the code derive runs). build loads
+    and processes the workbook; derive, if given, adds indexes to a freshly built model before it is saved, so they
+    are mapped with it next time. Snapshots the current user does not own are never loaded, and snapshot_dir is
+    created private to the user. Returns the model, its analysis and whether it came from a snapshot. Without a
+    snapshot_dir this is just build (and derive).
+    """
+    path = None
+    digest = None
+    if snapshot_dir:
+        digest = workbook_hash(workbook)
+        path = snapshot_path(snapshot_dir, workbook, digest)
+        metadata = read_snapshot_metadata(path)
+        if metadata and metadata.get('workbook_sha256') == digest:
+            try:
+                graphics_data, analysis = load_snapshot(path, derive_version if derive else None)
+                return graphics_data, analysis, True
+            except (OSError, ValueError, pickle.UnpicklingError, EOFError, KeyError) as exc:
+                print(f"   Rebuilding model snapshot: {exc}")
+
+    graphics_data, analysis = build(workbook)
+    if derive:
+        derive(graphics_data)
+    if path:
+        try:
+            os.makedirs(snapshot_dir, mode=0o700, exist_ok=True)
+            write_model_snapshot(path, graphics_data, os.path.abspath(workbook), analysis, digest, derive_version if derive else None)
+        except OSError as exc:
+            print(f"   Could not write model snapshot {path}: {exc}")
+    return graphics_data, analysis, False
@@ -0,0 +1,79 @@
+import io
+from typing import Dict
+
+from matplotlib import font_manager
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.patches import PathPatch, Rectangle
+from matplotlib.path import Path
+
+NATIVE_FORMATS = ('png', 'svg', 'pdf')
+
+# Plotly lays out at 96 px per inch, so a scene keeps its pixel size and font sizes in both backends
+PIXELS_PER_INCH = 96
+POINTS_PER_PIXEL = 72 / PIXELS_PER_INCH
+
+# Plotly's label font when the system has it, matplotlib's bundled sans otherwise (no missing-font warnings)
+LABEL_FONT = 'Arial' if any(font.name == 'Arial' for font in font_manager.fontManager.ttflist) else 'DejaVu Sans'
+
+# Draw order matching the plotly figure: curves and boxes below, labels on top
+CURVE_ZORDER = 1
+BOX_ZORDER = 2
+LABEL_ZORDER = 3
+
+
+def bezier_path(start, end) -> Path:
+    """Same control points as drawing_visuals.create_bezier_curve."""
+    middle_y = start[1] + (end[1] - start[1]) * 0.5
+    return Path([start, (start[0], middle_y), (end[0], middle_y), end],
+                [Path.MOVETO, Path.CURVE4, Path.CURVE4, Path.CURVE4])
+
+
+def render_scene(scene: Dict, fmt: str = 'png', scale: float = 2) -> bytes:
+    """Draw a practice scene (boxes, bezier curves and labels) straight to PNG, SVG or PDF bytes with Agg.
+
+    The scene carries its own size, margins and colours; see build_practice_scene in the image generator.
+    """
+    if fmt not in NATIVE_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}', expected one of {', '.join(NATIVE_FORMATS)}")
+    fig = draw_scene(scene)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=PIXELS_PER_INCH * scale, facecolor=scene['background'])
+    return buffer.getvalue()
+
+
+def draw_scene(scene: Dict) -> Figure:
+    """A matplotlib figure of the scene, for callers that save it themselves (such as one page of a PDF)."""
+    width, height, margin = scene['width'], scene['height'], scene['margin']
+
+    fig = Figure(figsize=(width / PIXELS_PER_INCH, height / PIXELS_PER_INCH), dpi=PIXELS_PER_INCH,
+                 facecolor=scene['background'])
+    FigureCanvasAgg(fig)
+    # Plot area placed by the margins, like plotly's, with the same 0..1 ranges on both axes
+    ax = fig.add_axes((margin['l'] / width, margin['b'] / height,
+                       1 - (margin['l'] + margin['r']) / width, 1 - (margin['t'] + margin['b']) / height))
+    ax.set_facecolor(scene['background'])
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    ax.set_axis_off()
+
+    for start, end, color in scene['curves']:
+        ax.add_patch(PathPatch(bezier_path(start, end), facecolor='none', edgecolor=color,
+                               linewidth=2 * POINTS_PER_PIXEL, zorder=CURVE_ZORDER))
+
+    x_spacing = scene['x_spacing']
+    for box in scene['boxes']:
+        ax.add_patch(Rectangle((box['x'] - x_spacing / 2, box['y']), x_spacing, box['draw_height'],
+                               facecolor=box['color'], edgecolor='#f5f5f5', linewidth=2 * POINTS_PER_PIXEL,
+                               zorder=BOX_ZORDER))
+
+    for x, y, text in scene['labels']:
+        ax.text(x, y, text.replace('<br>', '\n'), ha='center', va='center', multialignment='center', color='#000000',
+                fontsize=12 * POINTS_PER_PIXEL, fontweight='bold', family=LABEL_FONT,
+                zorder=LABEL_ZORDER, clip_on=True)
+
+    # Title sits in the top margin, left aligned like plotly's default template
+    fig.text(0.05, 1 - (margin['t'] / 2) / height, scene['title'], ha='left', va='center',
+             color=scene['font_color'], fontsize=17 * POINTS_PER_PIXEL)
+
+    return fig
@@ -1,15 +1,28 @@
+import argparse
 import os
+import sys
+import tempfile
 import textwrap
+import time
 import tkinter as tk
 from tkinter import filedialog
-from typing import List, Dict, Tuple
+from typing import List, Dict, NamedTuple, Optional, Tuple
 
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
 import plotly.graph_objects as go
-from data_processing import load_data, process_data, find_processes_with_no_destination, find_artifacts_with_no_source
+from data_processing import load_and_process, write_analysis_report
 from drawing_visuals import create_boxes, create_bezier_curve, create_text_element, wrap_text
+from export_bundle import BUNDLE_FORMATS, write_pdf_bundle, write_svg_bundle
+from export_manifest import MANIFEST_FILE, is_up_to_date, load_manifest, prune_manifest, save_manifest, scene_fingerprint
+from export_service import EXPORT_FORMATS, RENDER_BACKENDS, RenderResult, RenderService
+from export_sharding import ExportModel, load_job, merge_shards, parse_shard, select_shard, shard_manifest_file
+from model_snapshot import load_or_build_model
+from profiling import RequestProfiler
+from render_cache import RenderCache, cache_key, source_fingerprint
+from settings import MODEL_SNAPSHOT_DIR, PROFILE_DIR, PROFILE_SAMPLE_MS, PROFILE_MIN_MS, RENDER_CACHE_PATH, RENDER_CACHE_MB
+from synthetic_model import synthetic_graphics_data
 
 BOX_HEIGHT = 100
 PRACTICE_Y_TOP = 0.9
@@ -17,6 +30,21 @@ PROCESS_Y_TOP = 0.65
 PROCESS_Y_BOTTOM = 0.2
 PRACTICE_Y_BOTTOM = 0.05
 
+# Exported image style, shared by every rendering backend
+FIGURE_WIDTH = 1200
+FIGURE_HEIGHT = 800
+FIGURE_MARGIN = dict(l=40, r=40, t=100, b=40)
+FIGURE_BACKGROUND = 'black'
+FIGURE_FONT_COLOR = '#00FF00'
+IMAGE_SCALE = 2
+
+# Processed model, set by main()
+graphics_data: Dict = None
+
+# Images in the render cache are only reused by the drawing code that rendered them
+RENDER_CODE_VERSION = source_fingerprint(os.path.join(os.path.dirname(os.path.abspath(__file__)), module)
+                                         for module in ('practice_to_practice_image_generator.py', 'native_renderer.py', 'export_service.py'))
+
 '''********************************** Filter Functions ******************************************'''
 def filter_bottom_practices(selected_practices: List[str]) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
     # Filter destination practices
@@ -84,6 +112,43 @@ def analyze_reverse_practice_relationships(filtered_practices_bottom: Dict[str,
 
     return filtered_practices_top
 
+class PracticeNeighborhood(NamedTuple):
+    top: Dict[str, Dict]
+    bottom: Dict[str, Dict]
+    relationships: List[Tuple[str, str]]
+
+def compute_practice_neighborhoods() -> Dict[Tuple[str, bool], PracticeNeighborhood]:
+    """Source and destination neighborhoods of every practice from a single pass over the interactions.
+
+    Keyed by (practice id, filter_destination). Each one holds exactly what filter_practices_only /
+    filter_bottom_practices and analyze_practice_relationships give for that practice alone, in the same order,
+    without rescanning process_to_artifacts per practice.
+    """
+    practice_top = graphics_data['practice_top']
+    practice_bottom = graphics_data['practice_bottom']
+    outgoing: Dict[str, List[str]] = {}
+    incoming: Dict[str, List[str]] = {}
+    for (source_pid, dest_pid) in graphics_data.get('process_to_artifacts', {}):
+        source_practice_id = graphics_data['process_top'][source_pid]['practice_id']
+        dest_practice_id = graphics_data['process_bottom'][dest_pid]['practice_id']
+        outgoing.setdefault(source_practice_id, []).append(dest_practice_id)
+        incoming.setdefault(dest_practice_id, []).append(source_practice_id)
+
+    neighborhoods = {}
+    for practice_id in practice_top:
+        destinations = [dest_id for dest_id in outgoing.get(practice_id, []) if dest_id in practice_bottom]
+        neighborhoods[(practice_id, False)] = PracticeNeighborhood(
+            {practice_id: practice_top[practice_id]},
+            {dest_id: practice_bottom[dest_id] for dest_id in destinations},
+            [(practice_id, dest_id) for dest_id in destinations])
+    for practice_id in practice_bottom:
+        sources = incoming.get(practice_id, [])
+        neighborhoods[(practice_id, True)] = PracticeNeighborhood(
+            {source_id: practice_top[source_id] for source_id in sources},
+            {practice_id: practice_bottom[practice_id]},
+            [(source_id, practice_id) for source_id in sources])
+    return neighborhoods
+
 def collect_related_processes(filtered_practices_top: dict, filtered_practices_bottom: dict) -> Tuple[List[dict], List[dict]]:
     """Collect processes related to the selected practices for use in the artifact table."""
     related_processes_top = []
@@ -111,6 +176,8 @@ def center_positions(data: Dict[str, Dict], y_position: float, x_spacing: float)
     start_x = 0.5 - ((num_elements - 1) * x_spacing / 2)
 
     for i, (item_id, item_data) in enumerate(data.items()):
+        # Position a copy so a scene still queued for rendering is not moved by the next one
+        item_data = dict(item_data)
         item_data['x'] = start_x + i * x_spacing
         item_data['y'] = y_position
         item_data['draw_height'] = item_data['height'] / 1000
@@ -122,21 +189,28 @@ def center_positions(data: Dict[str, Dict], y_position: float, x_spacing: float)
 '''************************************************************************************************
    * MAIN DRAWING FUNCTION                                                                        *
    ************************************************************************************************'''
-def create_practice_only_figure(selected_practices: List[str], filter_destination: bool = False, save_dir: str = ".") -> go.Figure:
-    fig = go.Figure()
-
-    # Filter practices only and identify relationships
-    if filter_destination:
-        # New logic: Filtering based on destination practices
-        filtered_practices_top, filtered_practices_bottom = filter_bottom_practices(selected_practices)
+def practice_figure_title(practice_name: str, filter_destination: bool) -> str:
+    role_str = "Destination" if filter_destination else "Source"
+    return f"{practice_name} - AS - {role_str}"
+
+def build_practice_scene(selected_practices: List[str], filter_destination: bool = False,
+                         neighborhood: Optional[PracticeNeighborhood] = None) -> Dict:
+    """Lay out a practice to practice figure as plain boxes, bezier curves and labels that any backend can draw.
+
+    Batch exports pass the practice's precomputed neighborhood instead of filtering the whole model again.
+    """
+    if neighborhood is not None:
+        filtered_practices_top, filtered_practices_bottom, practice_relationships = neighborhood
     else:
-        # Original logic: Filtering based on source practices
-        filtered_practices_top, filtered_practices_bottom = filter_practices_only(selected_practices)
-
-    practice_relationships = analyze_practice_relationships(filtered_practices_top, filtered_practices_bottom)
+        # Filter practices only and identify relationships
+        if filter_destination:
+            # New logic: Filtering based on destination practices
+            filtered_practices_top, filtered_practices_bottom = filter_bottom_practices(selected_practices)
+        else:
+            # Original logic: Filtering based on source practices
+            filtered_practices_top, filtered_practices_bottom = filter_practices_only(selected_practices)
 
-    # Set range to full extent since it's filtered
-    x_range = [0, 1]
+        practice_relationships = analyze_practice_relationships(filtered_practices_top, filtered_practices_bottom)
 
     # Calculate x_spacing based on the maximum number of elements in any row
     max_elements = max(len(filtered_practices_top), len(filtered_practices_bottom))
@@ -145,62 +219,62 @@ def create_practice_only_figure(selected_practices: List[str], filter_destinatio
     centered_practice_top = center_positions(filtered_practices_top, PRACTICE_Y_TOP, x_spacing)
     centered_practice_bottom = center_positions(filtered_practices_bottom, PRACTICE_Y_BOTTOM, x_spacing)
 
-    # Collect the process data for the artifact table
-    filtered_processes_top, filtered_processes_bottom = collect_related_processes(filtered_practices_top, filtered_practices_bottom)
-
-    '''print("*** Practice TOP ***")
-    print(centered_practice_top)
-    print("*** Practice Bottom ***")
-    print(centered_practice_bottom)
-
-    print("*** Process Top ***")
-    print(filtered_processes_top)
-    print("*** Process Bottom ***")
-    print(filtered_processes_bottom)'''
-
-    shapes = []
-    traces = []
-
     # Create connections between practices based on the relationships
+    practice_top_lookup = {p['id']: p for p in centered_practice_top}
+    practice_bottom_lookup = {p['id']: p for p in centered_practice_bottom}
+    curves = []
     for (source_practice_id, dest_practice_id) in practice_relationships:
-        source_practice = next((p for p in centered_practice_top if p['id'] == source_practice_id), None)
-        dest_practice = next((p for p in centered_practice_bottom if p['id'] == dest_practice_id), None)
+        source_practice = practice_top_lookup.get(source_practice_id)
+        dest_practice = practice_bottom_lookup.get(dest_practice_id)
         if source_practice and dest_practice:
-            shapes.append(create_bezier_curve(
+            curves.append((
                 (source_practice['x'], source_practice['y']),
                 (dest_practice['x'], dest_practice['y'] + dest_practice['draw_height']),
                 source_practice['color']
             ))
 
+    # Set the title dynamically based on practice name and role
+    practice_name = filtered_practices_top[selected_practices[0]]['name'] if not filter_destination else filtered_practices_bottom[selected_practices[0]]['name']
+
+    boxes = centered_practice_top + centered_practice_bottom
+    return {
+        'title': practice_figure_title(practice_name, filter_destination),
+        'role': "dest" if filter_destination else "src",
+        'x_spacing': x_spacing,
+        'boxes': boxes,
+        'curves': curves,
+        'labels': [(box['x'], box['y'] + box['draw_height'] / 2, wrap_text(box['name'], 15)) for box in boxes],
+        'width': FIGURE_WIDTH,
+        'height': FIGURE_HEIGHT,
+        'margin': FIGURE_MARGIN,
+        'background': FIGURE_BACKGROUND,
+        'font_color': FIGURE_FONT_COLOR,
+    }
+
+def create_scene_figure(scene: Dict) -> go.Figure:
+    """Draw a practice scene with plotly."""
+    fig = go.Figure()
+
+    shapes = [create_bezier_curve(start, end, color) for start, end, color in scene['curves']]
     # Add boxes for practices
-    shapes.extend(create_boxes(centered_practice_top + centered_practice_bottom, x_spacing))
+    shapes.extend(create_boxes(scene['boxes'], scene['x_spacing']))
 
     # Add text labels for practices
-    for data in centered_practice_top:
-        traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
-    for data in centered_practice_bottom:
-        traces.append(create_text_element(data['x'], data['y'], data['draw_height'], data['name']))
+    traces = [create_text_element(data['x'], data['y'], data['draw_height'], data['name']) for data in scene['boxes']]
 
     fig.update_layout(shapes=shapes)
     fig.add_traces(traces)
 
-    # Determine whether this is for source or destination
-    role = "dest" if filter_destination else "src"
-    role_str = "Destination" if role == "dest" else "Source"
-    # Set the title dynamically based on practice name and role
-    practice_name = filtered_practices_top[selected_practices[0]]['name'] if not filter_destination else filtered_practices_bottom[selected_practices[0]]['name']
-    title_text = f"{practice_name} - AS - {role_str}"
-
     # Final layout update
     fig.update_layout(
-        title=title_text,
-        plot_bgcolor='black',
-        paper_bgcolor='black',
+        title=scene['title'],
+        plot_bgcolor=FIGURE_BACKGROUND,
+        paper_bgcolor=FIGURE_BACKGROUND,
         xaxis=dict(
             showgrid=False,
             zeroline=False,
             showticklabels=False,
-            range=x_range,
+            range=[0, 1],  # Full extent since it's filtered
         ),
         yaxis=dict(
             showgrid=False,
@@ -209,94 +283,416 @@ def create_practice_only_figure(selected_practices: List[str], filter_destinatio
             range=[0, 1],
         ),
         hovermode='closest',
-        margin=dict(l=40, r=40, t=100, b=40),
-        height=800,  # Adjust this as needed for your layout
-        width=1200,  # Adjust this as needed for your layout
+        margin=FIGURE_MARGIN,
+        height=FIGURE_HEIGHT,
+        width=FIGURE_WIDTH,
         showlegend=False,
         dragmode='zoom',
-        font=dict(color='#00FF00')
+        font=dict(color=FIGURE_FONT_COLOR)
     )
+    return fig
 
+def create_practice_only_figure(selected_practices: List[str], filter_destination: bool = False, save_dir: Optional[str] = ".") -> go.Figure:
+    scene = build_practice_scene(selected_practices, filter_destination)
+    fig = create_scene_figure(scene)
 
-    # Save the figure as a PNG file in the selected directory
-    save_path = os.path.join(save_dir, f"{selected_practices[0]}_{role}.png")
-    fig.write_image(save_path, scale=2)
-   #fig.show()
+    # Save the figure as a PNG file in the selected directory (batch exports hand the figure to the render service instead)
+    if save_dir:
+        save_path = os.path.join(save_dir, f"{selected_practices[0]}_{scene['role']}.png")
+        fig.write_image(save_path, scale=IMAGE_SCALE)
     return fig
 
 
 
-def main() -> None:
+'''************************************************************************************************
+   * PARALLEL EXPORT                                                                              *
+   ************************************************************************************************'''
+def export_practice_images(practice_ids: List[str], save_dir: str, workers: int, formats: List[str] = ("png",),
+                           backend: str = 'plotly', force: bool = False, manifest_file: str = MANIFEST_FILE,
+                           profiler: RequestProfiler = None, render_cache: RenderCache = None) -> Tuple[int, int, int, float]:
+    """Export the source and destination figure of every practice in each format through a warm render service.
+
+    Scenes are laid out here and handed to long-lived renderer processes while the next ones are laid out; the
+    renderers build the plotly figure (or matplotlib drawing) from each scene themselves. Images whose scene
+    fingerprint matches the manifest (manifest_file in save_dir) are skipped unless force is set. Progress is printed in order as
+    results arrive. Given an enabled profiler, each scene layout and each render is profiled, tagged with its practice
+    and role. With a render_cache, images any earlier run on this host has rendered from an identical scene are copied
+    from it instead of rendered (unless force is set), and new renders are added to it. Returns the number of images written, the number
+    skipped, the number that failed and the elapsed time.
+    """
+    profiler = profiler or RequestProfiler(None)
+    total = len(practice_ids) * 2 * len(formats)
+    manifest = {} if force else load_manifest(save_dir, manifest_file)
+    # Practices removed from the workbook leave the manifest, and their images the output directory
+    manifest, removed = prune_manifest(manifest, save_dir, expected_images(practice_ids, formats), formats)
+    if removed:
+        print(f"Removed {removed} images of practices no longer in the model")
+    rendered_manifest = dict(manifest)
+    jobs = []
+    failed: List[str] = []
+    written = 0
+    skipped = 0
+    from_cache = 0
+    to_render = 0
+    start = time.perf_counter()
+    finished: Dict[int, RenderResult] = {}
+    next_to_report = 0
+
+    def report_finished() -> None:
+        nonlocal written, next_to_report
+        while next_to_report in finished:
+            result = finished.pop(next_to_report)
+            file_name, fingerprint = jobs[next_to_report]
+            next_to_report += 1
+            if result.error:
+                failed.append(file_name)
+                rendered_manifest.pop(file_name, None)
+                print(f"[{next_to_report}/{to_render}] {file_name} FAILED: {result.error}")
+            else:
+                written += 1
+                rendered_manifest[file_name] = fingerprint
+                if render_cache is not None:
+                    with open(result.path, 'rb') as image_file:
+                        render_cache.put('image', cache_key(fingerprint, RENDER_CODE_VERSION), image_file.read())
+                print(f"[{next_to_report}/{to_render}] {file_name} ({result.render_seconds:.2f}s render, {result.total_seconds:.2f}s total)")
+
+    # Work out which images are stale before starting any renderer, so an up-to-date export costs only the hashing
+    stale = []
+    neighborhoods = compute_practice_neighborhoods()
+    for practice_id in practice_ids:
+        for filter_destination in (False, True):
+            role = "dest" if filter_destination else "src"
+            profile_tags = {'label': f"{practice_id}_{role}", 'practice': practice_id, 'role': role}
+            with profiler.profile('scene', profile_tags):
+                scene = build_practice_scene([practice_id], filter_destination, neighborhoods[(practice_id, filter_destination)])
+            stale_formats = []
+            for fmt in formats:
+                file_name = f"{practice_id}_{role}.{fmt}"
+                fingerprint = scene_fingerprint(scene, fmt, IMAGE_SCALE, backend)
+                if is_up_to_date(manifest, save_dir, file_name, fingerprint):
+                    skipped += 1
+                    continue
+                image = render_cache.get('image', cache_key(fingerprint, RENDER_CODE_VERSION)) if render_cache is not None and not force else None
+                if image is None:
+                    stale_formats.append((fmt, file_name, fingerprint))
+                    continue
+                with open(os.path.join(save_dir, file_name), 'wb') as image_file:
+                    image_file.write(image)
+                written += 1
+                from_cache += 1
+                rendered_manifest[file_name] = fingerprint
+            if stale_formats:
+                stale.append((scene, stale_formats, profile_tags))
+
+    if not stale:
+        if from_cache or removed:
+            save_manifest(save_dir, rendered_manifest, manifest_file)
+        print(f"Rebuilt {written}{cache_note(from_cache)} and skipped {skipped} unchanged of {total} images")
+        return written, skipped, 0, time.perf_counter() - start
+
+    # Progress is out of every image to render, known before the first one is submitted
+    to_render = sum(len(stale_formats) for _, stale_formats, _ in stale)
+    try:
+        with RenderService(workers, backend=backend, profiler=profiler, scenes=True) as service:
+            job_ids = {}
+            for scene, stale_formats, profile_tags in stale:
+                for fmt, file_name, fingerprint in stale_formats:
+                    job_ids[service.submit(scene, os.path.join(save_dir, file_name), fmt, scale=IMAGE_SCALE,
+                                           tags=profile_tags)] = len(jobs)
+                    jobs.append((file_name, fingerprint))
+
+                    # Collect whatever has finished so results never pile up behind the submissions
+                    while service.pending > service.workers * 4:
+                        result = service.get_result()
+                        finished[job_ids[result.job_id]] = result
+                        report_finished()
+
+            while service.pending:
+                result = service.get_result()
+                finished[job_ids[result.job_id]] = result
+                report_finished()
+
+            latency = service.latency_summary()
+    finally:
+        # Record what was rendered even when the export is interrupted, so a re-run resumes where this one stopped
+        save_manifest(save_dir, rendered_manifest, manifest_file)
+
+    print(f"Rebuilt {written}{cache_note(from_cache)} and skipped {skipped} unchanged of {total} images")
+    if failed:
+        print(f"{len(failed)} images failed: {', '.join(failed)}")
+    if latency['images']:
+        print(f"Per-image latency: render p50 {latency['render_p50']:.2f}s, p95 {latency['render_p95']:.2f}s, max {latency['render_max']:.2f}s; "
+              f"submit to done p50 {latency['total_p50']:.2f}s, p95 {latency['total_p95']:.2f}s")
+    return written, skipped, len(failed), time.perf_counter() - start
+
+def cache_note(from_cache: int) -> str:
+    return f" ({from_cache} from the render cache)" if from_cache else ""
+
+def run_export_benchmark(practice_ids: List[str], worker_counts: List[int], formats: List[str], backends: List[str]) -> None:
+    """Export the same practices with each backend and worker count into a scratch directory and report images per second."""
+    print(f"Benchmarking export of {len(practice_ids)} practices ({len(practice_ids) * 2 * len(formats)} images)")
+    results = []
+    for backend in backends:
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as scratch_dir:
+                written, _, _, elapsed = export_practice_images(practice_ids, scratch_dir, workers, formats, backend, force=True)
+            results.append((backend, workers, written, elapsed))
+
+    for backend, workers, written, elapsed in results:
+        print(f"   {backend:<10} {workers} worker(s): {written} images in {elapsed:.1f}s = {written / elapsed:.2f} images/s")
+
+def export_practice_bundles(practice_ids: List[str], save_dir: str, bundle_formats: List[str], name: str) -> Tuple[List[str], int]:
+    """Stream every practice's source and destination figure into one PDF and/or one zip of SVGs, with contents.
+
+    Scenes are laid out one at a time as each page is written, so memory stays flat however many practices there
+    are. Bundles are drawn with the matplotlib backend. A bundle that fails is reported and the next format still
+    written. Returns the paths written and the number of bundles that failed.
+    """
+    neighborhoods = compute_practice_neighborhoods()
+    order = [(practice_id, filter_destination) for practice_id in practice_ids for filter_destination in (False, True)]
+    # Named from the row the figure is filtered on, as build_practice_scene titles it
+    titles = [practice_figure_title(graphics_data['practice_bottom' if filter_destination else 'practice_top'][practice_id]['name'], filter_destination)
+              for practice_id, filter_destination in order]
+    style = {'width': FIGURE_WIDTH, 'height': FIGURE_HEIGHT, 'background': FIGURE_BACKGROUND, 'font_color': FIGURE_FONT_COLOR}
+
+    def scenes():
+        for practice_id, filter_destination in order:
+            yield build_practice_scene([practice_id], filter_destination, neighborhoods[(practice_id, filter_destination)])
+
+    paths = []
+    failed = 0
+    for bundle_format in bundle_formats:
+        start = time.perf_counter()
+        path = os.path.join(save_dir, f"{name}.pdf" if bundle_format == 'pdf' else f"{name}_svg.zip")
+        try:
+            if bundle_format == 'pdf':
+                count = write_pdf_bundle(path, titles, scenes(), style, name)
+                print(f"   {path}: {count} pages in {time.perf_counter() - start:.1f}s")
+            else:
+                entries = [(title, f"{practice_id}_{'dest' if filter_destination else 'src'}.svg")
+                           for title, (practice_id, filter_destination) in zip(titles, order)]
+                count = write_svg_bundle(path, entries, scenes(), name)
+                print(f"   {path}: {count} SVGs in {time.perf_counter() - start:.1f}s")
+        except Exception as error:
+            failed += 1
+            print(f"   {path} FAILED: {type(error).__name__}: {error}")
+            continue
+        paths.append(path)
+    return paths, failed
+
+def lay_out_all_practice_scenes(practice_ids: List[str], one_pass: bool = True) -> int:
+    """The pre-render phase of an export: every practice's source and destination scene. Returns the scene count."""
+    neighborhoods = compute_practice_neighborhoods() if one_pass else {}
+    scenes = 0
+    for practice_id in practice_ids:
+        for filter_destination in (False, True):
+            build_practice_scene([practice_id], filter_destination, neighborhoods.get((practice_id, filter_destination)))
+            scenes += 1
+    return scenes
+
+def run_layout_benchmark(sizes: List[int], per_practice_limit: int = 500) -> None:
+    """Time the pre-render phase on synthetic models of growing size, one pass vs per-practice filtering.
+
+    Per-practice filtering rescans every interaction for each practice, so it is only timed up to
+    per_practice_limit practices.
+    """
     global graphics_data
+    print("Benchmarking the pre-render phase on synthetic models")
+    previous = None
+    for size in sorted(sizes):
+        graphics_data = synthetic_graphics_data(size)
+        practice_ids = list(graphics_data['practice_top'])
+        interactions = len(graphics_data['process_to_artifacts'])
+
+        start = time.perf_counter()
+        lay_out_all_practice_scenes(practice_ids, one_pass=True)
+        one_pass_seconds = time.perf_counter() - start
+
+        per_practice = "skipped"
+        if size <= per_practice_limit:
+            start = time.perf_counter()
+            lay_out_all_practice_scenes(practice_ids, one_pass=False)
+            per_practice = f"{time.perf_counter() - start:.2f}s"
+
+        scaling = ""
+        if previous:
+            scaling = f", x{size / previous[0]:.1f} practices -> x{one_pass_seconds / previous[1]:.1f} time"
+        print(f"   {size} practices, {interactions} interactions: one pass {one_pass_seconds:.2f}s "
+              f"({one_pass_seconds / size * 1e6:.0f}us/practice{scaling}); per practice {per_practice}")
+        previous = (size, one_pass_seconds)
+
+def expected_images(practice_ids: List[str], formats: List[str]) -> Dict[str, str]:
+    """Every image file a complete export writes, mapped to its practice."""
+    return {f"{practice_id}_{role}.{fmt}": practice_id
+            for practice_id in practice_ids for role in ("src", "dest") for fmt in formats}
+
+def prepare_model(file_name: str, analysis_path: str, snapshot_dir: Optional[str] = None) -> Dict:
+    """Load and process a workbook, writing its consistency report to analysis_path.
+
+    An unchanged workbook is mapped from its snapshot in snapshot_dir rather than loaded and processed again.
+    """
+    start = time.perf_counter()
+    graphics, analysis, from_snapshot = load_or_build_model(file_name, snapshot_dir, lambda workbook: load_and_process(workbook, print))
+    if from_snapshot:
+        print(f"1 - Loaded Model Snapshot ({time.perf_counter() - start:.2f}s, workbook unchanged)")
+    write_analysis_report(analysis_path, analysis)
+    return graphics
+
+def parse_formats(value: str) -> List[str]:
+    """--formats as a list, rejecting unknown formats before any image is drawn."""
+    formats = [fmt.strip() for fmt in value.split(",") if fmt.strip()]
+    unknown = sorted(set(formats) - set(EXPORT_FORMATS))
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unsupported format(s) {', '.join(unknown)}, expected {', '.join(EXPORT_FORMATS)}")
+    return formats
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export practice to practice relationship images for every practice.")
+    parser.add_argument("--workbook", help="Excel model to export (a file dialog opens if omitted)")
+    parser.add_argument("--output-dir", help="Directory to write the images to (a folder dialog opens if omitted)")
+    parser.add_argument("--job", metavar="JOB.json",
+                        help="Job manifest listing the models (workbook and output directory each) to export, "
+                             "instead of --workbook/--output-dir")
+    parser.add_argument("--shard", metavar="i/N",
+                        help="Only export the practices of shard i of N (0-based, by stable hash of practice id) so "
+                             "independent hosts can split the batch")
+    parser.add_argument("--merge", type=int, metavar="SHARDS",
+                        help="Instead of exporting, merge the manifests of SHARDS shards in each output directory and "
+                             "check every expected image is present (exits non-zero when any is missing)")
+    parser.add_argument("--bundle", metavar="FORMATS",
+                        help=f"Instead of one file per image, stream every figure into a single bundle per format "
+                             f"({', '.join(BUNDLE_FORMATS)}: a multi-page PDF with bookmarks, or a zip of SVGs) with a table of contents")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Renderer processes (default: one per CPU)")
+    parser.add_argument("--formats", type=parse_formats, help=f"Comma separated image formats to write ({', '.join(EXPORT_FORMATS)}; "
+                                          "default: the job's, or png)")
+    parser.add_argument("--backend", choices=RENDER_BACKENDS,
+                        help="Draw with plotly and kaleido, or natively with matplotlib (no browser needed; "
+                             "default: the job's, or plotly)")
+    parser.add_argument("--force", action="store_true",
+                        help=f"Re-render every image, ignoring the {MANIFEST_FILE} of unchanged ones in the output directory")
+    parser.add_argument("--snapshot-dir", metavar="DIR", default=MODEL_SNAPSHOT_DIR,
+                        help="Directory of processed-model snapshots keyed by workbook hash; an unchanged workbook starts "
+                             "from its snapshot (default: UM_MODEL_SNAPSHOT_DIR or a directory in the user's cache; an "
+                             "empty value disables them)")
+    parser.add_argument("--render-cache", metavar="PATH", default=RENDER_CACHE_PATH,
+                        help="SQLite render cache shared with the web app and other export runs on this host; images of "
+                             "unchanged scenes are copied from it instead of rendered (default: UM_RENDER_CACHE; "
+                             "off when empty)")
+    parser.add_argument("--profile", metavar="DIR", default=PROFILE_DIR or None,
+                        help="Write a cProfile (.pstats) and sampled flame-graph stacks (.collapsed) of every scene layout "
+                             "and image render to DIR, each tagged with its practice (default: UM_PROFILE_DIR)")
+    parser.add_argument("--benchmark-layout", metavar="SIZES",
+                        help="Instead of exporting, time laying out every figure of synthetic models with these comma "
+                             "separated practice counts (no workbook needed)")
+    parser.add_argument("--benchmark", type=int, nargs="?", const=0, metavar="PRACTICES",
+                        help="Instead of exporting, time every backend with 1 worker and with --workers on the first "
+                             "PRACTICES practices (all of them when omitted or 0)")
+    return parser.parse_args()
 
-    # Create a Tk root widget, which will act as the file dialog's parent
-    root = tk.Tk()
-    root.withdraw()  # Hide the root window
-
-    # Open the file dialog to select an Excel file
-    file_name = filedialog.askopenfilename(
-        title="Select the Excel file",
-        filetypes=[("Excel files", "*.xlsx *.xls")]  # Allow only Excel files
-    )
-
-    if not file_name:
-        print("No file selected. Exiting.")
-        return
-
-    # Ask the user to select a directory for saving the PNG files
-    save_dir = filedialog.askdirectory(
-        title="Select Directory to Save PNG Files"
-    )
+def main() -> None:
+    global graphics_data
 
-    if not save_dir:
-        print("No directory selected. Exiting.")
+    args = parse_args()
+    profiler = RequestProfiler(args.profile, PROFILE_SAMPLE_MS / 1000, PROFILE_MIN_MS / 1000)
+    render_cache = RenderCache(args.render_cache, RENDER_CACHE_MB * 1_000_000) if args.render_cache else None
+    if args.benchmark_layout:
+        run_layout_benchmark([int(size) for size in args.benchmark_layout.split(",")])
         return
 
-
-    # Open a text file to write the output
-    output_file = open("process_and_artifact_analysis.txt", "w")
-
-    # Load and process the data
-    print("1 - Loading Data")
-    practices_df, processes_df, artifacts_df, artifact_interactions_df = load_data(file_name)
-
-    # Find and print processes with no destination
-    print("2 - Identifying Processes with No Destination")
-    output_file.write("Processes with No Destination:\n")
-    processes_no_destination = find_processes_with_no_destination(processes_df, artifact_interactions_df)
-    for process in processes_no_destination:
-        print(process)
-        output_file.write(process + "\n")
-
-    # Find and print artifacts with no source
-    print("3 - Identifying Artifacts with No Source")
-    output_file.write("\nArtifacts with No Source:\n")
-    artifacts_no_source = find_artifacts_with_no_source(artifact_interactions_df, artifacts_df)
-    for artifact in artifacts_no_source:
-        print(artifact)
-        output_file.write(artifact + "\n")
-
-    # Close the file after writing
-    output_file.close()
-
-    print("4 - Processing Data")
-    graphics_data = process_data(practices_df, processes_df, artifact_interactions_df, artifacts_df)
-
-    print("5 - Drawing Practice to Practice Images")
-    # Loop through each practice
-    # Modify the loop to only process the first practice
-    '''first_practice_id = next(iter(graphics_data['practice_top']))  # Get the first practice ID
-    print(f"Processing practice ID: {first_practice_id}")
-    create_practice_only_figure([first_practice_id], filter_destination=False, save_dir=save_dir)
-    print("\n")  # Add some spacing between outputs for readability
-    create_practice_only_figure([first_practice_id], filter_destination=True, save_dir=save_dir)'''
-
-    for practice_id in graphics_data['practice_top']:
-        print(f"***Processing practice ID: {practice_id}")
-        create_practice_only_figure([practice_id], filter_destination=False, save_dir=save_dir)
-        print("\n")  # Add some spacing between outputs for readability
-        create_practice_only_figure([practice_id], filter_destination=True, save_dir=save_dir)
-        print("\n")  # Add some spacing between outputs for readability
+    shard = parse_shard(args.shard) if args.shard else None
+    if args.job:
+        job = load_job(args.job)
+        models = job.models
+        formats = args.formats or job.formats
+        backend = args.backend or job.backend
+    else:
+        formats = args.formats or ["png"]
+        backend = args.backend or "plotly"
+        models = None
+    formats = [fmt.strip() for fmt in formats if fmt.strip()]
+
+    if models is None:
+        if not args.workbook or not (args.output_dir or args.benchmark is not None):
+            # Create a Tk root widget, which will act as the file dialog's parent
+            root = tk.Tk()
+            root.withdraw()  # Hide the root window
+
+        # Open the file dialog to select an Excel file
+        file_name = args.workbook or filedialog.askopenfilename(
+            title="Select the Excel file",
+            filetypes=[("Excel files", "*.xlsx *.xls")]  # Allow only Excel files
+        )
+
+        if not file_name:
+            print("No file selected. Exiting.")
+            return
+
+        # Ask the user to select a directory for saving the PNG files (benchmarks write to scratch directories)
+        save_dir = args.output_dir
+        if not save_dir and args.benchmark is None:
+            save_dir = filedialog.askdirectory(
+                title="Select Directory to Save PNG Files"
+            )
+
+            if not save_dir:
+                print("No directory selected. Exiting.")
+                return
+
+        models = [ExportModel(os.path.splitext(os.path.basename(file_name))[0], file_name, save_dir)]
+        analysis_paths = ["process_and_artifact_analysis.txt"]
+    else:
+        # Several models would overwrite one report, so each goes next to its images
+        analysis_paths = [os.path.join(model.output_dir, "process_and_artifact_analysis.txt") for model in models]
+
+    incomplete = False
+    failed = 0
+    for model, analysis_path in zip(models, analysis_paths):
+        if len(models) > 1:
+            print(f"=== {model.name} ({model.workbook}) ===")
+        if model.output_dir:
+            os.makedirs(model.output_dir, exist_ok=True)
+        graphics_data = prepare_model(model.workbook, analysis_path, args.snapshot_dir)
+        practice_ids = list(graphics_data['practice_top'])
+
+        if args.benchmark is not None:
+            run_export_benchmark(practice_ids[:args.benchmark or None], sorted({1, args.workers}), formats, list(RENDER_BACKENDS))
+            continue
+
+        if args.merge:
+            print(f"5 - Merging {args.merge} Shards")
+            expected = expected_images(practice_ids, formats)
+            missing = merge_shards(model.output_dir, expected, args.merge)
+            missing_count = sum(len(files) for files in missing.values())
+            for index, files in sorted(missing.items()):
+                print(f"   shard {index}/{args.merge}: {len(files)} missing, e.g. {', '.join(sorted(files)[:5])}")
+            print(f"{len(expected) - missing_count}/{len(expected)} expected images present")
+            incomplete = incomplete or bool(missing)
+            continue
+
+        practice_ids = select_shard(practice_ids, shard)
+        if args.bundle:
+            bundle_formats = [fmt.strip() for fmt in args.bundle.split(",") if fmt.strip()]
+            unknown = set(bundle_formats) - set(BUNDLE_FORMATS)
+            if unknown:
+                raise ValueError(f"Unsupported bundle format(s) {', '.join(sorted(unknown))}, expected {', '.join(BUNDLE_FORMATS)}")
+            shard_suffix = f"_shard-{shard[0]}-of-{shard[1]}" if shard else ""
+            print(f"5 - Writing Practice to Practice Bundles ({', '.join(bundle_formats)})")
+            _, bundles_failed = export_practice_bundles(practice_ids, model.output_dir, bundle_formats, f"{model.name}_practices{shard_suffix}")
+            failed += bundles_failed
+            continue
+
+        shard_note = f", shard {shard[0]}/{shard[1]}: {len(practice_ids)} practices" if shard else ""
+        print(f"5 - Drawing Practice to Practice Images ({args.workers} {backend} workers{shard_note})")
+        if profiler.enabled:
+            print(f"   Profiling each scene and render into {args.profile}")
+        written, skipped, images_failed, elapsed = export_practice_images(practice_ids, model.output_dir, args.workers, formats, backend,
+                                                           args.force, shard_manifest_file(shard), profiler, render_cache)
+        print(f"Exported {written}/{len(practice_ids) * 2 * len(formats) - skipped} changed images in {elapsed:.1f}s ({written / elapsed:.2f} images/s)")
+        failed += images_failed
+
+    # Failed images or bundles and incomplete merges exit non-zero so scripts and CI notice a broken export
+    if incomplete or failed:
+        sys.exit(1)
 
 
 
@@ -0,0 +1,111 @@
+import cProfile
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# cProfile can only run one profile at a time per process (on Python 3.12+ a second one raises ValueError), so
+# concurrent requests beyond the first are only stack-sampled
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into flame-graph collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self) -> str:
+        """One 'root;...;leaf count' line per distinct stack, as flamegraph.pl and speedscope read."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Profiles single requests or jobs into a directory, when one is configured.
+
+    Each profiled call writes <name>.pstats (deterministic, cProfile), <name>.collapsed (sampled stacks) and
+    <name>.json (its tags, such as the selection that triggered it, and its duration). Calls quicker than
+    min_seconds are not written, so a profiler left on only keeps the slow ones. While another call in the process
+    holds cProfile, a call is only sampled and writes no .pstats.
+    """
+
+    def __init__(self, directory: Optional[str], sample_interval: float = 0.002, min_seconds: float = 0.0):
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.min_seconds = min_seconds
+        self._sequence = itertools.count(1)
+
+    def __getstate__(self) -> Dict:
+        # Sent to renderer processes without the file sequence, which each process keeps for itself
+        return {key: value for key, value in self.__dict__.items() if key != '_sequence'}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._sequence = itertools.count(1)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    @contextmanager
+    def profile(self, kind: str, tags: Dict) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        profiler = cProfile.Profile() if _cprofile_lock.acquire(blocking=False) else None
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+            seconds = time.perf_counter() - start
+            sampler.stop()
+            if seconds >= self.min_seconds:
+                self._write(kind, tags, seconds, profiler, sampler)
+
+    def _write(self, kind: str, tags: Dict, seconds: float, profiler: Optional[cProfile.Profile], sampler: StackSampler) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        label = re.sub(r'[^A-Za-z0-9_.-]+', '-', str(tags.get('label', '')))[:60].strip('-')
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._sequence):04d}-{kind}" + (f"-{label}" if label else "")
+        path = os.path.join(self.directory, name)
+        if profiler is not None:
+            profiler.dump_stats(path + '.pstats')
+        with open(path + '.collapsed', 'w') as collapsed_file:
+            collapsed_file.write(sampler.collapsed())
+        with open(path + '.json', 'w') as tags_file:
+            json.dump({'kind': kind, 'seconds': round(seconds, 6), 'samples': sum(sampler.stacks.values()), 'cprofile': profiler is not None, **tags}, tags_file, indent=2, default=str)
@@ -0,0 +1,143 @@
+from typing import Dict, List, Tuple
+
+# downstream: where a practice's or process's artifacts go; upstream: where the artifacts it consumes come from
+DIRECTIONS = ('downstream', 'upstream')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class QueryError(ValueError):
+    """A query that cannot be answered, with the HTTP status to answer it with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def build_query_index(graphics_data: Dict) -> Dict:
+    """Adjacency lists for relationship queries, built once per model from its process interactions.
+
+    Processes are listed per practice, interactions per process in both directions (with the names of the artifacts
+    passed), and interaction and artifact counts per pair of practices in both directions.
+    """
+    practice_processes: Dict[str, List[str]] = {practice_id: [] for practice_id in graphics_data['practice_top']}
+    for process_id, process in graphics_data['process_top'].items():
+        practice_processes.setdefault(process['practice_id'], []).append(process_id)
+
+    process_links = {'downstream': {}, 'upstream': {}}
+    practice_links = {'downstream': {}, 'upstream': {}}
+    for (source_pid, dest_pid), artifacts in graphics_data.get('process_to_artifacts', {}).items():
+        # Interactions that reference unknown processes are never drawn, so they are not answered either
+        if source_pid not in graphics_data['process_top'] or dest_pid not in graphics_data['process_bottom']:
+            continue
+        artifact_names = [str(artifact['artifact_name']) for artifact in artifacts]
+        process_links['downstream'].setdefault(source_pid, []).append((dest_pid, artifact_names))
+        process_links['upstream'].setdefault(dest_pid, []).append((source_pid, artifact_names))
+
+        source_practice = graphics_data['process_top'][source_pid]['practice_id']
+        dest_practice = graphics_data['process_bottom'][dest_pid]['practice_id']
+        for direction, practice, other in (('downstream', source_practice, dest_practice), ('upstream', dest_practice, source_practice)):
+            counts = practice_links[direction].setdefault(practice, {}).setdefault(other, {'interactions': 0, 'artifacts': 0})
+            counts['interactions'] += 1
+            counts['artifacts'] += len(artifact_names)
+
+    return {'practice_processes': practice_processes, 'process_links': process_links, 'practice_links': practice_links}
+
+
+def parse_page(args: Dict) -> Tuple[int, int]:
+    """Offset and limit from query parameters, checked against MAX_PAGE_SIZE."""
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise QueryError("offset and limit must be whole numbers")
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise QueryError(f"offset must be 0 or more and limit between 1 and {MAX_PAGE_SIZE}")
+    return offset, limit
+
+
+def parse_direction(args: Dict) -> str:
+    direction = args.get('direction', 'downstream')
+    if direction not in DIRECTIONS:
+        raise QueryError(f"Unknown direction '{direction}', expected one of {', '.join(DIRECTIONS)}")
+    return direction
+
+
+def paginate(items: List, offset: int, limit: int) -> Dict:
+    next_offset = offset + limit if offset + limit < len(items) else None
+    return {'total': len(items), 'offset': offset, 'limit': limit, 'next_offset': next_offset, 'items': items[offset:offset + limit]}
+
+
+def _practice(graphics_data: Dict, practice_id: str) -> Dict:
+    if practice_id not in graphics_data['practice_top']:
+        raise QueryError(f"Unknown practice '{practice_id}'", status=404)
+    return {'id': practice_id, 'name': graphics_data['practice_top'][practice_id]['name']}
+
+
+def _process(graphics_data: Dict, process_id: str) -> Dict:
+    process = graphics_data['process_top'].get(process_id)
+    if process is None:
+        raise QueryError(f"Unknown process '{process_id}'", status=404)
+    return {'id': process_id, 'name': process['name'], 'practice_id': process['practice_id']}
+
+
+def list_practices(graphics_data: Dict, index: Dict) -> List[Dict]:
+    return [dict(_practice(graphics_data, practice_id), processes=len(index['practice_processes'].get(practice_id, [])))
+            for practice_id in graphics_data['practice_top']]
+
+
+def process_neighbors(graphics_data: Dict, index: Dict, process_id: str, direction: str) -> List[Dict]:
+    """Processes that consume a process's artifacts (downstream) or produce the artifacts it consumes (upstream)."""
+    _process(graphics_data, process_id)
+    return [{'process': process_id, 'neighbor': _process(graphics_data, other), 'artifacts': artifacts}
+            for other, artifacts in index['process_links'][direction].get(process_id, [])]
+
+
+def practice_neighbors(graphics_data: Dict, index: Dict, practice_id: str, direction: str) -> List[Dict]:
+    """The process neighbors of every process of a practice, one item per interaction."""
+    _practice(graphics_data, practice_id)
+    neighbors = []
+    for process_id in index['practice_processes'].get(practice_id, []):
+        neighbors.extend(process_neighbors(graphics_data, index, process_id, direction))
+    return neighbors
+
+
+def practice_relationships(graphics_data: Dict, index: Dict, practice_id: str, direction: str) -> List[Dict]:
+    """Practices fed by a practice (downstream) or feeding it (upstream), busiest first, with interaction counts."""
+    _practice(graphics_data, practice_id)
+    related = [dict(_practice(graphics_data, other), **counts) for other, counts in index['practice_links'][direction].get(practice_id, {}).items()]
+    return sorted(related, key=lambda item: (-item['interactions'], item['id']))
+
+
+def subgraph(graphics_data: Dict, index: Dict, practice_ids: List[str], direction: str) -> Tuple[Dict, List[Dict]]:
+    """What the full view draws for a selection: its source and destination practices and processes, and the connections.
+
+    downstream follows the selected practices' artifacts to their consumers (the default view); upstream follows the
+    selected practices' inputs back to their producers (the 'Filter Destination Practice' view). Returns the nodes
+    and the connections separately so the connections can be paged.
+    """
+    if not practice_ids:
+        raise QueryError("Select at least one practice")
+    practice_ids = list(dict.fromkeys(practice_ids))
+    for practice_id in practice_ids:
+        _practice(graphics_data, practice_id)
+
+    selected_processes = [process_id for practice_id in practice_ids for process_id in index['practice_processes'].get(practice_id, [])]
+    connections = []
+    linked_processes: Dict[str, None] = {}
+    for process_id in selected_processes:
+        for other, artifacts in index['process_links'][direction].get(process_id, []):
+            source, destination = (process_id, other) if direction == 'downstream' else (other, process_id)
+            connections.append({'source': source, 'destination': destination, 'artifacts': artifacts})
+            linked_processes[other] = None
+
+    selected_side, linked_side = ('source', 'destination') if direction == 'downstream' else ('destination', 'source')
+    nodes = {
+        f"{selected_side}_processes": [_process(graphics_data, process_id) for process_id in selected_processes],
+        f"{linked_side}_processes": [_process(graphics_data, process_id) for process_id in linked_processes],
+    }
+    nodes[f"{selected_side}_practices"] = [_practice(graphics_data, practice_id) for practice_id in practice_ids]
+    nodes[f"{linked_side}_practices"] = [_practice(graphics_data, practice_id) for practice_id in
+                                         dict.fromkeys(process['practice_id'] for process in nodes[f"{linked_side}_processes"])]
+    return nodes, connections
+
@@ -0,0 +1,67 @@
+from typing import Dict, List
+
+
+def build_relationship_index(graphics_data: Dict, row_positions: Dict[str, float]) -> Dict:
+    """Build a compact, JSON-friendly index of practices, processes and artifact interactions.
+
+    Practices, processes and artifact names are stored once in flat lists and every relationship refers
+    to them by list position, so the whole model can be shipped to the browser in a single dcc.Store.
+    """
+    practice_ids: List[str] = list(graphics_data['practice_top'])
+    practice_lookup = {practice_id: i for i, practice_id in enumerate(practice_ids)}
+
+    process_ids: List[str] = list(graphics_data['process_top'])
+    process_lookup = {process_id: i for i, process_id in enumerate(process_ids)}
+
+    practice_processes: List[List[int]] = [[] for _ in practice_ids]
+    process_practice: List[int] = []
+    for i, process_id in enumerate(process_ids):
+        practice_index = practice_lookup[graphics_data['process_top'][process_id]['practice_id']]
+        practice_processes[practice_index].append(i)
+        process_practice.append(practice_index)
+
+    artifact_names: List[str] = []
+    artifact_lookup: Dict[str, int] = {}
+    edge_sources: List[int] = []
+    edge_destinations: List[int] = []
+    edge_artifacts: List[List[int]] = []
+    for (source_pid, dest_pid), artifacts in graphics_data.get('process_to_artifacts', {}).items():
+        # Interactions that reference unknown processes can never be drawn, so leave them out of the index
+        if source_pid not in process_lookup or dest_pid not in process_lookup:
+            continue
+        artifact_indexes = []
+        for artifact in artifacts:
+            name = str(artifact['artifact_name'])
+            if name not in artifact_lookup:
+                artifact_lookup[name] = len(artifact_names)
+                artifact_names.append(name)
+            artifact_indexes.append(artifact_lookup[name])
+        edge_sources.append(process_lookup[source_pid])
+        edge_destinations.append(process_lookup[dest_pid])
+        edge_artifacts.append(artifact_indexes)
+
+    first_practice = next(iter(graphics_data['practice_top'].values()), {'height': 0})
+    first_process = next(iter(graphics_data['process_top'].values()), {'height': 0})
+
+    return {
+        'practices': {
+            'ids': practice_ids,
+            'names': [graphics_data['practice_top'][pid]['name'] for pid in practice_ids],
+            'colors': [graphics_data['practice_top'][pid]['color'] for pid in practice_ids],
+            'processes': practice_processes,
+            'draw_height': first_practice['height'] / 1000,
+        },
+        'processes': {
+            'ids': process_ids,
+            'names': [graphics_data['process_top'][pid]['name'] for pid in process_ids],
+            'practice': process_practice,
+            'draw_height': first_process['height'] / 1000,
+        },
+        'edges': {
+            'source': edge_sources,
+            'destination': edge_destinations,
+            'artifacts': edge_artifacts,
+        },
+        'artifact_names': artifact_names,
+        'rows': dict(row_positions),
+    }
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Model entries that decide what is drawn; anything else in a model dict is derived from them
+MODEL_KEYS = ('practice_top', 'practice_bottom', 'process_top', 'process_bottom', 'process_to_artifacts')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (kind TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL,
+                                    last_used REAL NOT NULL, PRIMARY KEY (kind, key));
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS stats (kind TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0,
+                                  stores INTEGER NOT NULL DEFAULT 0, evictions INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO usage VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM entries));
+"""
+# Lookups only write to the file this often: an entry's last use is refreshed once it is this old (s), and the
+# hit and miss counts kept in memory are added to the file's stats after this long (s)
+TOUCH_SECONDS = 300
+FLUSH_SECONDS = 10
+
+
+def model_fingerprint(data: Dict) -> str:
+    """Content hash of a processed model, the same in every process that loads the same workbook."""
+    content = {key: data.get(key) for key in MODEL_KEYS}
+    # Connection keys are (source, destination) tuples, which JSON objects cannot hold
+    content['process_to_artifacts'] = sorted([list(link), artifacts] for link, artifacts in (content['process_to_artifacts'] or {}).items())
+    encoded = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def source_fingerprint(paths: Iterable[str]) -> str:
+    """Hash of the drawing code, so cached renders are not reused after it changes."""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """Rendered figures, layouts and images shared by every server worker and export run on the host.
+
+    Entries live in one SQLite file (WAL mode, so readers never wait for a writer) keyed by kind and a content key,
+    normally built with cache_key() from the model fingerprint and the selection. Lookups are reads: an entry's
+    last use is only rewritten when it is older than TOUCH_SECONDS, and hits and misses are counted in memory and
+    added to the file every FLUSH_SECONDS (or with the next store). When the stored values, whose total is kept
+    up to date by every store and eviction, pass max_bytes, the least recently used are deleted until the cache is
+    back under 90% of it. Hits, misses, stores and evictions are counted per kind in the file, so stats() covers
+    the whole deployment. A cache that cannot be read or written behaves as empty rather than failing the render.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.errors = 0
+        self._local = threading.local()
+        # (kind, 'hits' or 'misses') -> lookups not yet added to the file, counted by process _counts_pid
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._counts_pid = os.getpid()
+        self._counts_flushed = time.monotonic()
+        self._counts_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process: SQLite connections must not cross threads or forks
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _write(self, connection: sqlite3.Connection) -> Iterator[None]:
+        """One write transaction, taking the write lock up front (the connection is in autocommit mode)."""
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _count(self, connection: sqlite3.Connection, kind: str, column: str, amount: int = 1) -> None:
+        connection.execute("INSERT OR IGNORE INTO stats (kind) VALUES (?)", (kind,))
+        connection.execute(f"UPDATE stats SET {column} = {column} + ? WHERE kind = ?", (amount, kind))
+
+    def get(self, kind: str, key: str) -> Optional[bytes]:
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value, last_used FROM entries WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+            now = time.time()
+            if row is not None and now - row[1] > TOUCH_SECONDS:
+                with self._write(connection):
+                    connection.execute("UPDATE entries SET last_used = ? WHERE kind = ? AND key = ?", (now, kind, key))
+            self._count_lookup(kind, 'misses' if row is None else 'hits')
+            return None if row is None else bytes(row[0])
+        except sqlite3.Error as exc:
+            self._report_error(exc)
+            return None
+
+    def put(self, kind: str, key: str, value: bytes) -> None:
+        try:
+            connection = self._connection()
+            with self._write(connection):
+                previous = connection.execute("SELECT size FROM entries WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+                connection.execute("INSERT OR REPLACE INTO entries (kind, key, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                                   (kind, key, sqlite3.Binary(value), len(value), time.time()))
+                connection.execute("UPDATE usage SET bytes = bytes + ? WHERE id = 0", (len(value) - (previous[0] if previous else 0),))
+                self._count(connection, kind, 'stores')
+                self._flush_counts(connection)
+            self._evict(connection)
+        except sqlite3.Error as exc:
+            self._report_error(exc)
+
+    def _count_lookup(self, kind: str, column: str) -> None:
+        with self._counts_lock:
+            if self._counts_pid != os.getpid():
+                # Counts inherited from the parent of a forked worker are the parent's to flush
+                self._counts = {}
+                self._counts_pid = os.getpid()
+            self._counts[(kind, column)] = self._counts.get((kind, column), 0) + 1
+            due = time.monotonic() - self._counts_flushed > FLUSH_SECONDS
+        if due:
+            connection = self._connection()
+            with self._write(connection):
+                self._flush_counts(connection)
+
+    def _flush_counts(self, connection: sqlite3.Connection) -> None:
+        """Add the lookups counted in memory to the file's stats, inside the caller's write transaction."""
+        with self._counts_lock:
+            counts = self._counts if self._counts_pid == os.getpid() else {}
+            self._counts = {}
+            self._counts_pid = os.getpid()
+            self._counts_flushed = time.monotonic()
+        for (kind, column), amount in counts.items():
+            self._count(connection, kind, column, amount)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        if connection.execute("SELECT bytes FROM usage WHERE id = 0").fetchone()[0] <= self.max_bytes:
+            return
+        with self._write(connection):
+            # Read again under the write lock, as another process may have evicted meanwhile
+            total = connection.execute("SELECT bytes FROM usage WHERE id = 0").fetchone()[0]
+            evicted: Dict[str, int] = {}
+            freed = 0
+            for kind, key, size in connection.execute("SELECT kind, key, size FROM entries ORDER BY last_used").fetchall():
+                if total - freed <= self.max_bytes * 0.9:
+                    break
+                connection.execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key))
+                freed += size
+                evicted[kind] = evicted.get(kind, 0) + 1
+            connection.execute("UPDATE usage SET bytes = bytes - ? WHERE id = 0", (freed,))
+            for kind, count in evicted.items():
+                self._count(connection, kind, 'evictions', count)
+
+    def _report_error(self, exc: sqlite3.Error) -> None:
+        self.errors += 1
+        if self.errors == 1:
+            print(f"Render cache {self.path} unavailable, rendering without it: {exc}")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per kind: entries, bytes, hits, misses, stores and evictions, across every process using the file."""
+        try:
+            connection = self._connection()
+            if self._counts:
+                with self._write(connection):
+                    self._flush_counts(connection)
+            stats = {kind: {'entries': 0, 'bytes': 0, 'hits': hits, 'misses': misses, 'stores': stores, 'evictions': evictions}
+                     for kind, hits, misses, stores, evictions in connection.execute("SELECT kind, hits, misses, stores, evictions FROM stats")}
+            for kind, entries, size in connection.execute("SELECT kind, COUNT(*), SUM(size) FROM entries GROUP BY kind"):
+                stats.setdefault(kind, {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}).update(entries=entries, bytes=size)
+            return stats
+        except sqlite3.Error as exc:
+            self._report_error(exc)
+            return {}
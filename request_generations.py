@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class StaleRequest(Exception):
+    """Raised inside a request once a newer request from the same session has started."""
+
+
+# The tracked request running on this thread: (generations, session, generation)
+current_request: ContextVar[Optional[Tuple['RequestGenerations', str, int]]] = ContextVar('current_request', default=None)
+
+
+class RequestGenerations:
+    """Latest request generation per browser session, so superseded requests can give up part way through.
+
+    Each tracked request bumps its session's generation; abandon_if_superseded() raises StaleRequest in any older
+    request of that session still running in this process. Only the most recent max_sessions sessions are kept.
+    """
+
+    def __init__(self, max_sessions: int = 10000):
+        self.max_sessions = max_sessions
+        # Where superseded requests stopped ('debounce' or the stage just finished) -> count
+        self.abandoned: Dict[str, int] = {}
+        self.started = 0
+        self._generations: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, session: str) -> int:
+        with self._lock:
+            generation = self._generations.pop(session, 0) + 1
+            self._generations[session] = generation
+            while len(self._generations) > self.max_sessions:
+                self._generations.popitem(last=False)
+            self.started += 1
+            return generation
+
+    def is_current(self, session: str, generation: int) -> bool:
+        with self._lock:
+            # A session dropped from the table has seen no request for a long while, so nothing has replaced this one
+            return self._generations.get(session, generation) == generation
+
+    def record_abandoned(self, where: str) -> None:
+        with self._lock:
+            self.abandoned[where] = self.abandoned.get(where, 0) + 1
+
+    @contextmanager
+    def track(self, session: Optional[str]) -> Iterator[None]:
+        """Make this the latest request of the session (untracked without one) for abandon_if_superseded()."""
+        if not session:
+            yield
+            return
+        token = current_request.set((self, session, self.begin(session)))
+        try:
+            yield
+        finally:
+            current_request.reset(token)
+
+
+def abandon_if_superseded(where: str) -> None:
+    """Raise StaleRequest when a newer request of the current request's session has started since it began."""
+    request = current_request.get()
+    if request is None:
+        return
+    generations, session, generation = request
+    if not generations.is_current(session, generation):
+        generations.record_abandoned(where)
+        raise StaleRequest(where)
+
+
+def debounce(seconds: float) -> None:
+    """In a tracked request, wait for the session to go quiet and raise StaleRequest if a newer request arrived meanwhile."""
+    if current_request.get() is None:
+        return
+    if seconds > 0:
+        time.sleep(seconds)
+    abandon_if_superseded('debounce')
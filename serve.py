@@ -0,0 +1,82 @@
+import argparse
+import gc
+import os
+import tkinter as tk
+from tkinter import filedialog
+from typing import Callable
+
+from artifact_relationship_visual import DERIVED_INDEX_VERSION, app, derive_model_indexes, install_model
+from data_processing import load_and_process
+from model_snapshot import load_or_build_model, workbook_hash, write_model_snapshot
+from settings import MODEL_SNAPSHOT, MODEL_SNAPSHOT_DIR, SERVE_BIND, SERVE_THREADS, SERVE_WORKERS
+
+
+def run_gunicorn(load_app: Callable, bind: str, workers: int, threads: int) -> None:
+    """Serve the app from gunicorn worker processes forked after load_app has run once in the master."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError as exc:
+        raise ImportError(f"Serving with several workers needs gunicorn installed ({exc}); "
+                          f"on Windows run wsgi.py under waitress instead") from exc
+
+    class UnifiedModelServer(BaseApplication):
+
+        def load_config(self) -> None:
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('preload_app', True)
+
+        def load(self):
+            return load_app()
+
+    UnifiedModelServer().run()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the unified model visual from several worker processes sharing one processed model.")
+    parser.add_argument("--workbook", help="Excel model to serve (asks with a file dialog when omitted)")
+    parser.add_argument("--snapshot", default=MODEL_SNAPSHOT or None,
+                        help="Also write the model snapshot to this path, for serving it with wsgi.py (default: "
+                             "UM_MODEL_SNAPSHOT; not written when empty)")
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS, help=f"Server worker processes (default: {SERVE_WORKERS})")
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS, help=f"Request threads per worker (default: {SERVE_THREADS})")
+    parser.add_argument("--bind", default=SERVE_BIND, help=f"Address to listen on (default: {SERVE_BIND})")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    file_name = args.workbook
+    if not file_name:
+        root = tk.Tk()
+        root.withdraw()
+        file_name = filedialog.askopenfilename(title="Select the Excel file", filetypes=[("Excel files", "*.xlsx *.xls")])
+        if not file_name:
+            print("No file selected. Exiting.")
+            return
+    print("1 - Loading Model")
+    graphics_data, analysis, from_snapshot = load_or_build_model(file_name, MODEL_SNAPSHOT_DIR, load_and_process, derive_model_indexes,
+                                                                 DERIVED_INDEX_VERSION)
+    print("   Workbook unchanged, mapped its snapshot" if from_snapshot else "   Loaded and processed the workbook")
+
+    if args.snapshot:
+        # The gunicorn workers below fork from this process; only wsgi.py needs a snapshot at a path of its own
+        print("2 - Writing Model Snapshot")
+        size = write_model_snapshot(args.snapshot, graphics_data, os.path.abspath(file_name), analysis, workbook_hash(file_name),
+                                    DERIVED_INDEX_VERSION)
+        print(f"Wrote {args.snapshot} ({size / 1e6:.1f} MB)")
+
+    def load_app():
+        # Runs once in the gunicorn master; the workers fork from it and share the model's pages
+        install_model(graphics_data, os.path.splitext(os.path.basename(file_name))[0], file_name)
+        gc.freeze()
+        return app.server
+
+    print(f"3 - Starting {args.workers} Server Workers on {args.bind}")
+    run_gunicorn(load_app, args.bind, args.workers, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Read an on/off switch from the environment."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+'''********************************** Dash App Settings *****************************************'''
+# Ship the relationship index to the browser once and filter the main graph in a clientside callback
+CLIENTSIDE_FILTERING: bool = _env_flag('UM_CLIENTSIDE_FILTERING')
+
+# Figure cache warm-up: comma separated view kinds to pre-render at startup ('practice_only', 'full')
+FIGURE_CACHE_WARM_SET: list[str] = [kind.strip() for kind in os.environ.get('UM_FIGURE_CACHE_WARM', '').split(',') if kind.strip()]
+FIGURE_CACHE_MAX_MB: int = int(os.environ.get('UM_FIGURE_CACHE_MAX_MB', '512'))
+FIGURE_CACHE_WORKERS: int = int(os.environ.get('UM_FIGURE_CACHE_WORKERS', str(os.cpu_count() or 1)))
+
+# Figure serialization: decimal places kept for coordinates, gzip threshold/level and per-callback payload reporting
+FIGURE_PRECISION: int = int(os.environ.get('UM_FIGURE_PRECISION', '5'))
+GZIP_MIN_BYTES: int = int(os.environ.get('UM_GZIP_MIN_BYTES', '1024'))
+GZIP_LEVEL: int = int(os.environ.get('UM_GZIP_LEVEL', '5'))
+REPORT_PAYLOAD_METRICS: bool = _env_flag('UM_PAYLOAD_METRICS')
+
+# Level of detail for the unfiltered full view: element budget per render and bundle cap
+LOD_ELEMENT_BUDGET: int = int(os.environ.get('UM_LOD_ELEMENT_BUDGET', '1500'))
+LOD_MAX_BUNDLES: int = int(os.environ.get('UM_LOD_MAX_BUNDLES', '300'))
+
+# Viewport culling: margin drawn either side of the visible x-range (fraction of its width) and laid-out views kept for panning
+VIEWPORT_MARGIN: float = float(os.environ.get('UM_VIEWPORT_MARGIN', os.environ.get('UM_LOD_WINDOW_MARGIN', '0.5')))
+VIEWPORT_LAYOUT_CACHE_SIZE: int = int(os.environ.get('UM_VIEWPORT_LAYOUT_CACHE_SIZE', '32'))
+
+# Export current view: background renderer processes, exports waiting or rendering at once, and how long unfetched results are kept (s)
+EXPORT_WORKERS: int = int(os.environ.get('UM_EXPORT_WORKERS', '2'))
+EXPORT_QUEUE_SIZE: int = int(os.environ.get('UM_EXPORT_QUEUE_SIZE', '8'))
+EXPORT_RESULT_TTL: float = float(os.environ.get('UM_EXPORT_RESULT_TTL', '300'))
+# Finished exports are handed between server worker processes through this directory
+EXPORT_DIR: str = os.environ.get('UM_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'unified_model_exports'))
+
+# Render cache shared by every server worker and export run on this host (SQLite file, off when empty) and its size cap
+RENDER_CACHE_PATH: str = os.environ.get('UM_RENDER_CACHE', '')
+RENDER_CACHE_MB: int = int(os.environ.get('UM_RENDER_CACHE_MB', '512'))
+
+# Model registry: directory of workbooks served by name (?model=<file name>) and memory budget for loaded models
+MODEL_DIR: str = os.environ.get('UM_MODEL_DIR', '')
+MODEL_CACHE_MB: int = int(os.environ.get('UM_MODEL_CACHE_MB', '1024'))
+# Processed-model snapshots keyed by workbook hash, so unchanged workbooks start without loading or processing (empty disables);
+# kept in the user's own cache directory, as loading a snapshot runs the code pickled in it
+MODEL_SNAPSHOT_DIR: str = os.environ.get('UM_MODEL_SNAPSHOT_DIR', os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'unified_model', 'snapshots'))
+
+# Wait this long (ms) before drawing a graph update, so a burst of dropdown changes only draws the last of them
+GRAPH_DEBOUNCE_MS: float = float(os.environ.get('UM_GRAPH_DEBOUNCE_MS', '100'))
+
+# Print one structured JSON line per figure built, with its stage timings and element counts (also served at /metrics)
+METRICS_JSON_LOG: bool = _env_flag('UM_METRICS_JSON_LOG')
+
+# Per-request profiling: directory for pstats/collapsed-stack profiles of each graph update and exported image (empty is off),
+# stack sampling interval (ms) and the shortest request kept (ms)
+PROFILE_DIR: str = os.environ.get('UM_PROFILE_DIR', '')
+PROFILE_SAMPLE_MS: float = float(os.environ.get('UM_PROFILE_SAMPLE_MS', '2'))
+PROFILE_MIN_MS: float = float(os.environ.get('UM_PROFILE_MIN_MS', '0'))
+
+'''********************************** Serving Settings *****************************************'''
+# Processed model snapshot that server workers map instead of loading the workbook (see serve.py and wsgi.py)
+MODEL_SNAPSHOT: str = os.environ.get('UM_MODEL_SNAPSHOT', '')
+# Server worker processes and the address they listen on
+SERVE_WORKERS: int = int(os.environ.get('UM_SERVE_WORKERS', str(os.cpu_count() or 1)))
+SERVE_THREADS: int = int(os.environ.get('UM_SERVE_THREADS', '4'))
+SERVE_BIND: str = os.environ.get('UM_SERVE_BIND', '127.0.0.1:8050')
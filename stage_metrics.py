@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from request_generations import StaleRequest
+
+# Histogram upper bounds: stage latencies in seconds, element counts per figure
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+# The figure being built on this thread/request: (view, stage seconds, element counts)
+current_figure: ContextVar[Optional[Tuple[str, Dict[str, float], Dict[str, int]]]] = ContextVar('current_figure', default=None)
+
+
+def _label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label set."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...], labels: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        # Label values -> (per-bucket counts with a final +Inf bucket, sum, count)
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, label_values: Tuple[str, ...], value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = ','.join(f'{label}="{_label_value(value)}"' for label, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class StageMetrics:
+    """Latency and element-count histograms for the stages of building a figure.
+
+    figure() wraps one figure build; stage() and count() inside it are labelled with that figure's view. With
+    json_log on, each finished figure is also printed as one JSON line with its stage timings and counts. A figure
+    abandoned with StaleRequest is not recorded (its completed stages are).
+    """
+
+    def __init__(self, json_log: bool = False):
+        self.json_log = json_log
+        self.figure_seconds = Histogram('um_figure_build_seconds', "Time to build a figure, by view.", LATENCY_BUCKETS, ('view',))
+        self.stage_seconds = Histogram('um_figure_stage_seconds', "Time spent in each figure building stage.", LATENCY_BUCKETS, ('view', 'stage'))
+        self.elements = Histogram('um_figure_elements', "Elements drawn per figure.", COUNT_BUCKETS, ('view', 'element'))
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def figure(self, view: str, **tags) -> Iterator[None]:
+        stages: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        token = current_figure.set((view, stages, counts))
+        start = time.perf_counter()
+        try:
+            yield
+        except StaleRequest:
+            # A build abandoned for a newer one is not a figure; timing it would skew the build latencies
+            current_figure.reset(token)
+            raise
+        except BaseException:
+            self._finish_figure(view, tags, stages, counts, time.perf_counter() - start, token)
+            raise
+        self._finish_figure(view, tags, stages, counts, time.perf_counter() - start, token)
+
+    def _finish_figure(self, view: str, tags: Dict, stages: Dict[str, float], counts: Dict[str, int], seconds: float, token) -> None:
+        current_figure.reset(token)
+        with self._lock:
+            self.figure_seconds.observe((view,), seconds)
+        if self.json_log:
+            print(json.dumps({'event': 'figure', 'view': view, 'ms': round(seconds * 1000, 2),
+                              'stages_ms': {stage: round(value * 1000, 2) for stage, value in stages.items()},
+                              'elements': counts, **tags}), flush=True)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def record_stage(self, name: str, seconds: float) -> None:
+        """Record a stage timed by the caller, for stages that are not a single block."""
+        view, stages, _ = current_figure.get() or ('other', {}, {})
+        stages[name] = stages.get(name, 0.0) + seconds
+        with self._lock:
+            self.stage_seconds.observe((view, name), seconds)
+
+    def count(self, element: str, value: int) -> None:
+        view, _, counts = current_figure.get() or ('other', {}, {})
+        counts[element] = counts.get(element, 0) + value
+        with self._lock:
+            self.elements.observe((view, element), value)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = self.figure_seconds.render() + self.stage_seconds.render() + self.elements.render()
+        return '\n'.join(lines) + '\n'
+
+
+def render_counters(name: str, help_text: str, metric_type: str, values: Dict[Tuple[Tuple[str, str], ...], float]) -> str:
+    """Prometheus text for a counter or gauge family given as {((label, value), ...): number}."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in sorted(values.items()):
+        label_text = ','.join(f'{label}="{_label_value(label_value)}"' for label, label_value in labels)
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,174 @@
+import argparse
+import base64
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+
+import plotly.offline
+
+import artifact_relationship_visual as visual
+from data_processing import load_and_process
+from drawing_visuals import wrap_text
+from model_snapshot import load_or_build_model
+from settings import FIGURE_PRECISION, MODEL_SNAPSHOT_DIR
+
+VIEWER_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static_filter_viewer.html')
+
+# Element layout of each view, in mask bit order: boxes, then curves, then connection lines
+#   box:   [x0, x1, y0, y1, color, label]
+#   curve: [start x, start y, end x, end y, color]
+#   line:  [start x, start y, end x, end y, source color, destination color, hover text]
+
+
+def _round(value: float) -> float:
+    return round(value, FIGURE_PRECISION)
+
+
+def _box(data: Dict, x_spacing: float) -> List:
+    return [_round(data['x'] - x_spacing / 2), _round(data['x'] + x_spacing / 2), _round(data['y']),
+            _round(data['y'] + data['draw_height']), data['color'], wrap_text(data['name'], 15)]
+
+
+def encode_mask(visible: List[bool]) -> str:
+    """Pack element visibility into a base64 bitset, least significant bit first."""
+    packed = bytearray((len(visible) + 7) // 8)
+    for i, shown in enumerate(visible):
+        if shown:
+            packed[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(packed)).decode('ascii')
+
+
+def build_full_view() -> Tuple[Dict, Dict[str, Dict[str, str]]]:
+    """The unfiltered full view's elements, and per-practice visibility masks for the source and destination filters."""
+    view = visual.lay_out_full_view(None, False)
+    x_spacing = view['x_spacing']
+    rows = {row: view[row].query(None) for row in ('practice_top', 'process_top', 'process_bottom', 'practice_bottom')}
+
+    box_keys = [(row, data['id']) for row in rows for data in rows[row]]
+    boxes = [_box(data, x_spacing) for row in rows for data in rows[row]]
+
+    link_keys, curves = [], []
+    for practice_data, process_data, top_row in view['practice_links'].query(None):
+        if top_row:
+            start = (practice_data['x'], practice_data['y'])
+            end = (process_data['x'], process_data['y'] + process_data['draw_height'])
+        else:
+            start = (practice_data['x'], practice_data['y'] + practice_data['draw_height'])
+            end = (process_data['x'], process_data['y'])
+        row_suffix = 'top' if top_row else 'bottom'
+        link_keys.append((('practice_' + row_suffix, practice_data['id']), ('process_' + row_suffix, process_data['id'])))
+        curves.append([_round(start[0]), _round(start[1]), _round(end[0]), _round(end[1]), practice_data['color']])
+
+    connection_keys, lines = [], []
+    for source_id, destination_id in view['connections'].query(None):
+        source = view['process_top_lookup'][source_id]
+        destination = view['process_bottom_lookup'][destination_id]
+        artifacts = visual.graphics_data['process_to_artifacts'][(source_id, destination_id)]
+        connection_keys.append((source_id, destination_id))
+        lines.append([_round(source['x']), _round(source['y']), _round(destination['x']),
+                      _round(destination['y'] + destination['draw_height']), source['color'], destination['color'],
+                      f"Artifacts: {', '.join(artifact['artifact_name'] for artifact in artifacts)}"])
+
+    masks: Dict[str, Dict[str, str]] = {'src': {}, 'dest': {}}
+    for practice_id in visual.graphics_data['practice_top']:
+        for role, filter_destination in (('src', False), ('dest', True)):
+            practices_top, practices_bottom, processes_top, processes_bottom = visual.filter_full_view([practice_id], filter_destination)
+            shown = {'practice_top': practices_top, 'practice_bottom': practices_bottom,
+                     'process_top': processes_top, 'process_bottom': processes_bottom}
+            visible = [key[1] in shown[key[0]] for key in box_keys]
+            visible += [practice[1] in shown[practice[0]] and process[1] in shown[process[0]] for practice, process in link_keys]
+            visible += [source_id in processes_top and destination_id in processes_bottom for source_id, destination_id in connection_keys]
+            masks[role][practice_id] = encode_mask(visible)
+
+    return {'title': "Interactive Process and Practice Visualization", 'boxes': boxes, 'curves': curves, 'lines': lines}, masks
+
+
+def build_practice_view() -> Tuple[Dict, Dict[str, Dict[str, str]]]:
+    """The practice-only view of every practice, and per-practice visibility masks for both filters."""
+    practices_top, practices_bottom = visual.filter_practices_only([])
+    # Every practice gets a bottom box, so filtering on the destination of one nothing points at still shows it
+    practices_bottom = {**practices_bottom, **{pid: pdata for pid, pdata in visual.graphics_data['practice_bottom'].items() if pid not in practices_bottom}}
+    relationships = list(dict.fromkeys(visual.analyze_practice_relationships(practices_top, practices_bottom)))
+
+    x_spacing = 1 / (max(len(practices_top), len(practices_bottom)) + 1)
+    centered_top = visual.center_positions(practices_top, visual.PRACTICE_Y_TOP, x_spacing)
+    centered_bottom = visual.center_positions(practices_bottom, visual.PRACTICE_Y_BOTTOM, x_spacing)
+    top_lookup = {p['id']: p for p in centered_top}
+    bottom_lookup = {p['id']: p for p in centered_bottom}
+
+    boxes = [_box(data, x_spacing) for data in centered_top + centered_bottom]
+    curves = []
+    for source_id, destination_id in relationships:
+        source, destination = top_lookup[source_id], bottom_lookup[destination_id]
+        curves.append([_round(source['x']), _round(source['y']), _round(destination['x']),
+                       _round(destination['y'] + destination['draw_height']), source['color']])
+
+    masks: Dict[str, Dict[str, str]] = {'src': {}, 'dest': {}}
+    for practice_id in visual.graphics_data['practice_top']:
+        for role, filter_destination in (('src', False), ('dest', True)):
+            if filter_destination:
+                shown_top, shown_bottom = visual.filter_bottom_practices([practice_id])
+            else:
+                shown_top, shown_bottom = visual.filter_practices_only([practice_id])
+            visible = [data['id'] in shown_top for data in centered_top] + [data['id'] in shown_bottom for data in centered_bottom]
+            visible += [source_id in shown_top and destination_id in shown_bottom for source_id, destination_id in relationships]
+            masks[role][practice_id] = encode_mask(visible)
+
+    return {'title': "Practice Relationship Visualization", 'boxes': boxes, 'curves': curves, 'lines': []}, masks
+
+
+def export_static_html(path: str, name: str) -> int:
+    """Write one self-contained HTML file (plotly.js inlined) with both views and every practice's filter masks.
+
+    Selecting practices ORs their masks, which gives the same elements as filtering on all of them at once.
+    Filtered views keep the unfiltered positions and zoom to the selection instead of re-centering it.
+    Returns the size of the file written.
+    """
+    full_view, full_masks = build_full_view()
+    practice_view, practice_masks = build_practice_view()
+    model = {
+        'name': name,
+        'practices': [[pid, pdata['name']] for pid, pdata in visual.graphics_data['practice_top'].items()],
+        'views': {'full': full_view, 'practice': practice_view},
+        'masks': {'full': full_masks, 'practice': practice_masks},
+    }
+    # Keep the data from closing its <script> element early
+    model_json = json.dumps(model, separators=(',', ':')).replace('</', '<\\/')
+
+    with open(VIEWER_TEMPLATE, encoding='utf-8') as template:
+        page = template.read()
+    page = page.replace('/*PLOTLY_JS*/', plotly.offline.get_plotlyjs()).replace('/*STATIC_MODEL*/null', model_json)
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(page)
+    return len(page.encode('utf-8'))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export the practice filtering view as a single offline HTML file.")
+    parser.add_argument("--workbook", required=True, help="Excel model to export")
+    parser.add_argument("--output", help="HTML file to write (default: the workbook's name with .html)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    name = os.path.splitext(os.path.basename(args.workbook))[0]
+    output = args.output or name + ".html"
+
+    # An unchanged workbook starts from its snapshot; the model is served to the drawing code through its registry
+    start = time.perf_counter()
+    graphics, _, from_snapshot = load_or_build_model(args.workbook, MODEL_SNAPSHOT_DIR, lambda workbook: load_and_process(workbook, print),
+                                                     visual.derive_model_indexes, visual.DERIVED_INDEX_VERSION)
+    if from_snapshot:
+        print(f"1 - Loaded Model Snapshot ({time.perf_counter() - start:.2f}s, workbook unchanged)")
+    visual.model_registry.set_default(name, graphics, args.workbook)
+
+    print("5 - Precomputing Filters and Writing HTML")
+    start = time.perf_counter()
+    size = export_static_html(output, name)
+    print(f"Wrote {output} ({size / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
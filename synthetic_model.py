@@ -0,0 +1,55 @@
+import random
+from typing import Dict
+
+import pandas as pd
+
+from data_processing import process_data
+
+VALUE_STREAMS = ['IT4ITVS01', 'IT4ITVS02', 'IT4ITVS03', 'IT4ITVS04', 'IT4ITVS05', 'IT4ITVS06', 'IT4ITVS07', 'MOZVS01']
+
+
+def synthetic_model_frames(practices: int, processes_per_practice: int = 6, interactions_per_process: int = 3,
+                           seed: int = 0):
+    """Workbook-shaped data frames (practices, processes, artifacts, interactions) for a model of the given size.
+
+    Each process hands a random artifact to interactions_per_process random processes, so the number of
+    interactions grows linearly with the number of practices.
+    """
+    rng = random.Random(seed)
+    practice_ids = [f"PR{i:05d}" for i in range(practices)]
+    practices_df = pd.DataFrame({'id': practice_ids, 'name': [f"Practice number {i}" for i in range(practices)]})
+
+    process_rows = []
+    for practice_index, practice_id in enumerate(practice_ids):
+        for j in range(processes_per_practice):
+            process_rows.append({
+                'id': f"{practice_id}-P{j:02d}",
+                'name': f"Process {j} of practice {practice_index}",
+                'practice_id': practice_id,
+                'value_stream_id': rng.choice(VALUE_STREAMS),
+            })
+    processes_df = pd.DataFrame(process_rows)
+
+    artifact_count = max(1, len(process_rows) // 2)
+    artifacts_df = pd.DataFrame({'id': [f"A{i:06d}" for i in range(artifact_count)],
+                                 'artifact_name': [f"Artifact {i}" for i in range(artifact_count)]})
+
+    process_ids = processes_df['id'].tolist()
+    interaction_rows = []
+    for source_id in process_ids:
+        for _ in range(interactions_per_process):
+            interaction_rows.append({
+                'artifact_id': f"A{rng.randrange(artifact_count):06d}",
+                'source_process_id': source_id,
+                'destination_process_id': rng.choice(process_ids),
+            })
+    artifact_interactions_df = pd.DataFrame(interaction_rows)
+    return practices_df, processes_df, artifacts_df, artifact_interactions_df
+
+
+def synthetic_graphics_data(practices: int, processes_per_practice: int = 6, interactions_per_process: int = 3,
+                            seed: int = 0) -> Dict:
+    """Processed model of the given size, built by the same process_data as a real workbook."""
+    practices_df, processes_df, artifacts_df, artifact_interactions_df = synthetic_model_frames(
+        practices, processes_per_practice, interactions_per_process, seed)
+    return process_data(practices_df, processes_df, artifact_interactions_df, artifacts_df)
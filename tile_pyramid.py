@@ -0,0 +1,295 @@
+import argparse
+import io
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PatchCollection, PathCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+from data_processing import load_and_process
+from drawing_visuals import wrap_text
+from model_snapshot import load_or_build_model
+from native_renderer import LABEL_FONT, PIXELS_PER_INCH, POINTS_PER_PIXEL, bezier_path
+from settings import MODEL_SNAPSHOT_DIR
+from viewport import ViewportIndex
+
+TILE_SIZE = 256
+TILE_FORMAT = 'png'
+# Width a box gets at the deepest level, enough for its wrapped bold label to be read
+BOX_PIXELS = 160
+PYRAMID_HEIGHT = 1600
+# Labels are only drawn on levels where their box is at least this wide
+MIN_LABEL_BOX_PIXELS = 90
+BACKGROUND = '#515151'
+# Strokes are 2px wide, so elements this close to a tile still mark it
+STROKE_PAD_PIXELS = 2
+VIEWER_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deep_zoom_viewer.html')
+
+# Primitives in world coordinates (x and y both 0..1, y up), each stored with its extent:
+#   ('curve', start, end, color)    practice to process bezier
+#   ('rect', x0, x1, y0, y1, color) practice or process box
+#   ('line', start, end, color)     artifact connection
+#   ('label', x, y, text, width)    box label, width being the box's
+Primitive = tuple
+# Draw order matching the full figure: shapes below, connection traces over them, labels on top
+DRAW_ORDER = {'curve': 0, 'rect': 1, 'line': 2, 'label': 3}
+
+
+class Pyramid(NamedTuple):
+    width: int
+    height: int
+    tile_size: int
+    max_level: int
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        scale = 2 ** (level - self.max_level)
+        return max(1, math.ceil(self.width * scale)), max(1, math.ceil(self.height * scale))
+
+    def tile_window(self, level: int, column: int, row: int) -> Tuple[Tuple[float, float], Tuple[float, float], Tuple[int, int]]:
+        """World x-range and y-range a tile covers, and its size in pixels (edge tiles are smaller)."""
+        level_width, level_height = self.level_size(level)
+        left, top = column * self.tile_size, row * self.tile_size
+        right, bottom = min(left + self.tile_size, level_width), min(top + self.tile_size, level_height)
+        x_range = (left / level_width, right / level_width)
+        y_range = (1 - bottom / level_height, 1 - top / level_height)
+        return x_range, y_range, (right - left, bottom - top)
+
+
+def plan_pyramid(x_spacing: float, tile_size: int = TILE_SIZE, box_pixels: int = BOX_PIXELS, height: int = PYRAMID_HEIGHT) -> Pyramid:
+    """Size the deepest level so each box is box_pixels wide; level 0 is a single pixel, as in DZI."""
+    width = max(tile_size, math.ceil(box_pixels / x_spacing))
+    return Pyramid(width, height, tile_size, math.ceil(math.log2(max(width, height))))
+
+
+def full_view_primitives(view: Dict, process_to_artifacts: Dict, filter_destination: bool = False) -> List[Tuple[float, float, Tuple[float, float, Primitive]]]:
+    """Flatten a laid-out full view (see lay_out_full_view) into drawing primitives with their x and y extents."""
+    x_spacing = view['x_spacing']
+    elements = []
+    for practice_data, process_data, top_row in view['practice_links'].query(None):
+        if top_row:
+            start = (practice_data['x'], practice_data['y'])
+            end = (process_data['x'], process_data['y'] + process_data['draw_height'])
+        else:
+            start = (practice_data['x'], practice_data['y'] + practice_data['draw_height'])
+            end = (process_data['x'], process_data['y'])
+        elements.append((start, end, ('curve', start, end, practice_data['color'])))
+
+    for row in ('practice_top', 'practice_bottom', 'process_top', 'process_bottom'):
+        for data in view[row].query(None):
+            x0, x1 = data['x'] - x_spacing / 2, data['x'] + x_spacing / 2
+            y0, y1 = data['y'], data['y'] + data['draw_height']
+            elements.append(((x0, y0), (x1, y1), ('rect', x0, x1, y0, y1, data['color'])))
+            elements.append(((x0, y0), (x1, y1), ('label', data['x'], (y0 + y1) / 2, wrap_text(data['name'], 15), x_spacing)))
+
+    for source_id, destination_id in view['connections'].query(None):
+        if (source_id, destination_id) not in process_to_artifacts:
+            continue
+        source = view['process_top_lookup'][source_id]
+        destination = view['process_bottom_lookup'][destination_id]
+        start = (source['x'], source['y'])
+        end = (destination['x'], destination['y'] + destination['draw_height'])
+        color = source['color'] if filter_destination else destination['color']
+        elements.append((start, end, ('line', start, end, color)))
+
+    # (x_min, x_max, (y_min, y_max, primitive)) entries for a ViewportIndex
+    return [(min(a[0], b[0]), max(a[0], b[0]), (min(a[1], b[1]), max(a[1], b[1]), primitive)) for a, b, primitive in elements]
+
+
+def padded_window(pyramid: 'Pyramid', level: int, x_range: Tuple[float, float], y_range: Tuple[float, float]) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """A tile's window grown by a few pixels, so strokes of elements just outside it are still drawn to its edge."""
+    level_width, level_height = pyramid.level_size(level)
+    x_pad, y_pad = STROKE_PAD_PIXELS / level_width, STROKE_PAD_PIXELS / level_height
+    return (x_range[0] - x_pad, x_range[1] + x_pad), (y_range[0] - y_pad, y_range[1] + y_pad)
+
+
+def primitives_in_tile(index: ViewportIndex, x_range: Tuple[float, float], y_range: Tuple[float, float]) -> List[Primitive]:
+    return [primitive for y_min, y_max, primitive in index.query(x_range) if y_max >= y_range[0] and y_min <= y_range[1]]
+
+
+def render_tile(primitives: List[Primitive], x_range: Tuple[float, float], y_range: Tuple[float, float], size: Tuple[int, int],
+                level_width: int) -> bytes:
+    """Draw the primitives of one tile with matplotlib Agg; lines keep their pixel width on every level."""
+    fig = Figure(figsize=(size[0] / PIXELS_PER_INCH, size[1] / PIXELS_PER_INCH), dpi=PIXELS_PER_INCH, facecolor=BACKGROUND)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_facecolor(BACKGROUND)
+    ax.set_xlim(*x_range)
+    ax.set_ylim(*y_range)
+    ax.set_axis_off()
+
+    by_kind: Dict[str, List[Primitive]] = {}
+    for primitive in primitives:
+        by_kind.setdefault(primitive[0], []).append(primitive)
+    line_width = 2 * POINTS_PER_PIXEL
+
+    curves = by_kind.get('curve', [])
+    if curves:
+        ax.add_collection(PathCollection([bezier_path(start, end) for _, start, end, _ in curves], facecolors='none',
+                                         edgecolors=[color for *_, color in curves], linewidths=line_width, zorder=DRAW_ORDER['curve']))
+    rects = by_kind.get('rect', [])
+    if rects:
+        ax.add_collection(PatchCollection([Rectangle((x0, y0), x1 - x0, y1 - y0) for _, x0, x1, y0, y1, _ in rects],
+                                          facecolors=[color for *_, color in rects], edgecolors='#f5f5f5',
+                                          linewidths=line_width, zorder=DRAW_ORDER['rect']))
+    lines = by_kind.get('line', [])
+    if lines:
+        ax.add_collection(LineCollection([(start, end) for _, start, end, _ in lines], colors=[color for *_, color in lines],
+                                         linewidths=line_width, zorder=DRAW_ORDER['line']))
+    for _, x, y, text, width in by_kind.get('label', []):
+        if width * level_width >= MIN_LABEL_BOX_PIXELS:
+            ax.text(x, y, text.replace('<br>', '\n'), ha='center', va='center', multialignment='center', color='#000000',
+                    fontsize=12 * POINTS_PER_PIXEL, fontweight='bold', family=LABEL_FONT, zorder=DRAW_ORDER['label'], clip_on=True)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=TILE_FORMAT, dpi=PIXELS_PER_INCH, facecolor=BACKGROUND)
+    return buffer.getvalue()
+
+
+'''****** TILE WORKERS ******'''
+_worker_index: Optional[ViewportIndex] = None
+_worker_pyramid: Optional[Pyramid] = None
+
+
+def init_tile_worker(elements: List, pyramid: Pyramid) -> None:
+    """Index the scene once per worker process; tiles then only carry their coordinates."""
+    global _worker_index, _worker_pyramid
+    _worker_index = ViewportIndex(elements)
+    _worker_pyramid = pyramid
+
+
+def render_tile_file(tile: Tuple[int, int, int], tiles_dir: str) -> str:
+    level, column, row = tile
+    x_range, y_range, size = _worker_pyramid.tile_window(level, column, row)
+    primitives = primitives_in_tile(_worker_index, *padded_window(_worker_pyramid, level, x_range, y_range))
+    image = render_tile(primitives, x_range, y_range, size, _worker_pyramid.level_size(level)[0])
+    path = os.path.join(tiles_dir, str(level), f"{column}_{row}.{TILE_FORMAT}")
+    with open(path, 'wb') as tile_file:
+        tile_file.write(image)
+    return path
+
+
+def non_empty_tiles(index: ViewportIndex, pyramid: Pyramid) -> List[Tuple[int, int, int]]:
+    """Every (level, column, row) whose window holds at least one element, coarsest level first."""
+    tiles = []
+    for level in range(pyramid.max_level + 1):
+        level_width, level_height = pyramid.level_size(level)
+        for column in range(math.ceil(level_width / pyramid.tile_size)):
+            x_range, y_range, _ = pyramid.tile_window(level, column, 0)
+            # One x query per column; rows only filter it by y
+            column_elements = index.query(padded_window(pyramid, level, x_range, y_range)[0])
+            if not column_elements:
+                continue
+            for row in range(math.ceil(level_height / pyramid.tile_size)):
+                x_range, y_range, _ = pyramid.tile_window(level, column, row)
+                y_range = padded_window(pyramid, level, x_range, y_range)[1]
+                if any(y_max >= y_range[0] and y_min <= y_range[1] for y_min, y_max, _ in column_elements):
+                    tiles.append((level, column, row))
+    return tiles
+
+
+def export_tile_pyramid(view: Dict, process_to_artifacts: Dict, output_dir: str, name: str = 'model', workers: int = None,
+                        pyramid: Optional[Pyramid] = None) -> Tuple[int, int, float]:
+    """Render a laid-out full view into a DZI tile pyramid plus a static viewer page in output_dir.
+
+    Only tiles containing elements are written; the viewer leaves the rest as background. Returns the tiles
+    written, the tiles in a complete pyramid and the elapsed time.
+    """
+    start = time.perf_counter()
+    pyramid = pyramid or plan_pyramid(view['x_spacing'])
+    elements = full_view_primitives(view, process_to_artifacts)
+    index = ViewportIndex(elements)
+    tiles = non_empty_tiles(index, pyramid)
+    all_tiles = sum(math.ceil(width / pyramid.tile_size) * math.ceil(height / pyramid.tile_size)
+                    for width, height in map(pyramid.level_size, range(pyramid.max_level + 1)))
+    print(f"   {pyramid.width}x{pyramid.height}px, {pyramid.max_level + 1} levels, {len(elements)} elements, "
+          f"{len(tiles)} of {all_tiles} tiles to render")
+
+    tiles_dir = os.path.join(output_dir, f"{name}_files")
+    for level in range(pyramid.max_level + 1):
+        os.makedirs(os.path.join(tiles_dir, str(level)), exist_ok=True)
+
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=init_tile_worker,
+                             initargs=(elements, pyramid)) as executor:
+        for _ in executor.map(render_tile_file, tiles, [tiles_dir] * len(tiles), chunksize=16):
+            written += 1
+            if written % 500 == 0 or written == len(tiles):
+                print(f"   {written}/{len(tiles)} tiles")
+
+    write_descriptor(output_dir, name, pyramid)
+    write_viewer(output_dir, name, pyramid, tiles)
+    return written, all_tiles, time.perf_counter() - start
+
+
+def write_descriptor(output_dir: str, name: str, pyramid: Pyramid) -> None:
+    with open(os.path.join(output_dir, f"{name}.dzi"), 'w', encoding='utf-8') as descriptor:
+        descriptor.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{pyramid.tile_size}" Overlap="0" Format="{TILE_FORMAT}">\n'
+            f'  <Size Width="{pyramid.width}" Height="{pyramid.height}"/>\n'
+            '</Image>\n')
+
+
+def write_viewer(output_dir: str, name: str, pyramid: Pyramid, tiles: List[Tuple[int, int, int]]) -> None:
+    """Copy the static viewer next to the pyramid, telling it which tiles exist so it never requests empty ones."""
+    config = {
+        'tilesUrl': f"{name}_files/",
+        'width': pyramid.width,
+        'height': pyramid.height,
+        'tileSize': pyramid.tile_size,
+        'maxLevel': pyramid.max_level,
+        'format': TILE_FORMAT,
+        'background': BACKGROUND,
+        'tiles': [f"{level}/{column}_{row}" for level, column, row in tiles],
+    }
+    with open(VIEWER_TEMPLATE, encoding='utf-8') as template:
+        page = template.read().replace('/*PYRAMID_CONFIG*/null', json.dumps(config, separators=(',', ':')))
+    with open(os.path.join(output_dir, f"{name}.html"), 'w', encoding='utf-8') as viewer:
+        viewer.write(page)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export the full practice/process/artifact diagram as a deep-zoom tile pyramid.")
+    parser.add_argument("--workbook", required=True, help="Excel model to export")
+    parser.add_argument("--output-dir", required=True, help="Directory to write the pyramid and viewer to")
+    parser.add_argument("--name", help="Base name of the .dzi, tile directory and viewer (default: the workbook's name)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Tile renderer processes (default: one per CPU)")
+    parser.add_argument("--box-pixels", type=int, default=BOX_PIXELS, help="Width of a box at full resolution")
+    parser.add_argument("--height", type=int, default=PYRAMID_HEIGHT, help="Height of the diagram at full resolution")
+    return parser.parse_args()
+
+
+def main() -> None:
+    # Imported here so tile workers started with spawn do not each build the Dash app
+    import artifact_relationship_visual as visual
+
+    args = parse_args()
+    name = args.name or os.path.splitext(os.path.basename(args.workbook))[0]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # An unchanged workbook starts from its snapshot; the model is served to the layout code through its registry
+    start = time.perf_counter()
+    graphics, _, from_snapshot = load_or_build_model(args.workbook, MODEL_SNAPSHOT_DIR, lambda workbook: load_and_process(workbook, print),
+                                                     visual.derive_model_indexes, visual.DERIVED_INDEX_VERSION)
+    if from_snapshot:
+        print(f"1 - Loaded Model Snapshot ({time.perf_counter() - start:.2f}s, workbook unchanged)")
+    visual.model_registry.set_default(name, graphics, args.workbook)
+
+    print("5 - Laying Out Full View")
+    view = visual.lay_out_full_view(None, False)
+
+    print(f"6 - Rendering Tile Pyramid ({args.workers} workers)")
+    pyramid = plan_pyramid(view['x_spacing'], box_pixels=args.box_pixels, height=args.height)
+    written, all_tiles, elapsed = export_tile_pyramid(view, visual.graphics_data['process_to_artifacts'], args.output_dir, name,
+                                                      args.workers, pyramid)
+    print(f"Wrote {written} tiles (skipped {all_tiles - written} empty) in {elapsed:.1f}s; open {os.path.join(args.output_dir, name + '.html')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import math
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class ViewportIndex:
+    """Elements of a laid-out figure sorted by the left edge of their x-extent, bucketed by the width of that extent.
+
+    Built once per layout so every pan or zoom only costs two binary searches per bucket plus the elements in view.
+    Each bucket holds elements within a factor of two of each other's width, so a few wide elements (a long
+    connection) only widen the search of their own bucket instead of turning every query into a scan.
+    Query results keep the order the elements were added in, which is the order they are drawn in.
+    """
+
+    def __init__(self, elements: Iterable[Tuple[float, float, Any]]):
+        buckets: Dict[int, List[Tuple[float, float, int, Any]]] = {}
+        for order, (x_min, x_max, element) in enumerate(elements):
+            buckets.setdefault(span_class(x_max - x_min), []).append((x_min, x_max, order, element))
+        self._buckets = []
+        for entries in buckets.values():
+            entries.sort(key=lambda entry: entry[0])
+            # The widest element of the bucket bounds how far left of the window an intersecting element can start
+            max_span = max(0.0, max(entry[1] - entry[0] for entry in entries))
+            self._buckets.append(([entry[0] for entry in entries], entries, max_span))
+        self._size = sum(len(entries) for _, entries, _ in self._buckets)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _candidates(self, window: Tuple[float, float]) -> Iterator[Tuple[List[Tuple], int, int, int]]:
+        """Per bucket: its entries, the first that may reach into the window, the first starting inside it, and the end."""
+        for starts, entries, max_span in self._buckets:
+            first = bisect_left(starts, window[0] - max_span)
+            inside = bisect_left(starts, window[0], first)
+            last = bisect_right(starts, window[1], inside)
+            yield entries, first, inside, last
+
+    def query(self, window: Optional[Tuple[float, float]]) -> List[Any]:
+        """Elements whose x-extent intersects the window; every element when the window is None."""
+        if window is None:
+            candidates = [entry for _, entries, _ in self._buckets for entry in entries]
+        else:
+            candidates = []
+            for entries, first, inside, last in self._candidates(window):
+                # Elements starting left of the window intersect it only if they reach into it
+                candidates.extend(entry for entry in entries[first:inside] if entry[1] >= window[0])
+                candidates.extend(entries[inside:last])
+        return [entry[3] for entry in sorted(candidates, key=lambda entry: entry[2])]
+
+    def count(self, window: Optional[Tuple[float, float]]) -> int:
+        """Number of elements query would return, without building the result."""
+        if window is None:
+            return self._size
+        return sum(last - inside + sum(1 for index in range(first, inside) if entries[index][1] >= window[0])
+                   for entries, first, inside, last in self._candidates(window))
+
+
+def span_class(span: float) -> int:
+    """Bucket of an element's width: widths within a factor of two share one, and zero-width elements have their own."""
+    return math.frexp(span)[1] if span > 0 else -2000
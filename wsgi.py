@@ -0,0 +1,21 @@
+import gc
+import os
+
+from artifact_relationship_visual import DERIVED_INDEX_VERSION, app, install_model
+from model_snapshot import load_model_snapshot
+from settings import MODEL_SNAPSHOT
+
+# WSGI entry point for multi-process servers, e.g.
+#   UM_MODEL_SNAPSHOT=model.snapshot gunicorn --workers 4 --threads 4 --preload wsgi:server
+# Every worker maps the snapshot written by serve.py --snapshot instead of loading the workbook. With --preload it is
+# loaded once in the master and the workers share its pages after forking.
+if not MODEL_SNAPSHOT:
+    raise RuntimeError("Set UM_MODEL_SNAPSHOT to a model snapshot written by serve.py --snapshot")
+
+install_model(load_model_snapshot(MODEL_SNAPSHOT, DERIVED_INDEX_VERSION), os.path.splitext(os.path.basename(MODEL_SNAPSHOT))[0])
+
+# The model is read-only from here on; keeping it out of garbage collection stops the collector writing to (and so
+# copying) the pages forked workers share
+gc.freeze()
+
+server = app.server